@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from recording import save_recording
+from rules import EXERCISES, load_program
+
+# Gap inserted between segments processed by the same worker so the detector's
+# timestamps stay strictly increasing (and it re-acquires the pose on a new segment)
+SEGMENT_GAP_MS = 1000
+
+_worker = {}
+
+
+def video_id(path):
+    """
+    Stable output folder name for a video: file stem plus a short hash of its absolute path.
+    """
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    return f"{os.path.splitext(os.path.basename(path))[0]}-{digest}"
+
+
+def probe_video(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {path}")
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    return frame_count, fps
+
+
+def plan_segments(frame_count, segment_frames):
+    return [(start, min(start + segment_frames, frame_count)) for start in range(0, frame_count, segment_frames)]
+
+
+def segment_path(out_dir, start, end):
+    return os.path.join(out_dir, f"seg_{start:08d}_{end:08d}.npz")
+
+
+def save_npz_atomic(path, **arrays):
+    """
+    Writes to a temporary file and renames it, so a crash never leaves a truncated result behind.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(model_path, min_detection_confidence, min_tracking_confidence):
+    """
+    Process pool initializer: one detector per worker process, reused for every segment it handles.
+    """
+    from pose_engine import PoseEngine
+    _worker["engine"] = PoseEngine(model_path=model_path,
+                                   min_detection_confidence=min_detection_confidence,
+                                   min_tracking_confidence=min_tracking_confidence,
+                                   timestamp_mode="realtime")
+    _worker["last_ts"] = 0
+
+
+def _analyze_segment(video_path, start, end, fps, mirror, out_path):
+    """
+    Runs pose detection over frames [start, end) of a video and saves the landmark arrays.
+    """
+    engine = _worker["engine"]
+    t0 = time.perf_counter()
+    n = end - start
+    landmarks = np.full((n, 33, 4), np.nan, dtype=np.float32)
+    timestamps = (np.arange(start, end) * 1000.0 / fps).astype(np.float64)
+
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    offset = _worker["last_ts"] + SEGMENT_GAP_MS - timestamps[0] if n else 0
+    read = 0
+    for i in range(n):
+        success, frame = cap.read()
+        if not success:
+            break
+        if mirror:
+            frame = cv2.flip(frame, 1)
+        ts = timestamps[i] + offset
+        results = engine.process_frame(frame, timestamp_ms=ts)
+        _worker["last_ts"] = ts
+        arr = engine.get_landmarks_array(results)
+        if arr is not None:
+            landmarks[i] = arr
+        read += 1
+    cap.release()
+
+    elapsed = time.perf_counter() - t0
+    save_npz_atomic(out_path, landmarks=landmarks[:read], timestamps_ms=timestamps[:read],
+                    elapsed=np.float64(elapsed))
+    return out_path, read, elapsed
+
+
+def score_sequence(landmarks, timestamps_ms, exercises):
+    """
+    Runs the compiled exercise rules over a landmark sequence, once per exercise with isolated state.
+    Returns per-exercise rep counts and per-frame form flags / depth / feedback message ids.
+    """
+    scores = {}
+    for ex in exercises:
+        result = load_program(ex).run_sequence(landmarks, timestamps_ms / 1000.0)
+        scores[ex] = {
+            "reps": result["reps"],
+            "form_ok": result["form_ok"],
+            "depth": result["depth"].astype(np.float32),
+            "feedback_ids": result["feedback_ids"],
+            "messages": result["messages"],
+        }
+    return scores
+
+
+def finalize_video(video_path, out_dir, segments, exercises):
+    """
+    Merges the segment outputs of one video into a landmark recording (see recording.py),
+    applies the exercise rules and writes the results.
+    """
+    parts = [np.load(segment_path(out_dir, s, e)) for s, e in segments]
+    landmarks = np.concatenate([p["landmarks"] for p in parts]) if parts else np.zeros((0, 33, 4), np.float32)
+    timestamps = np.concatenate([p["timestamps_ms"] for p in parts]) if parts else np.zeros(0)
+    worker_time = float(sum(p["elapsed"] for p in parts))
+
+    scores = score_sequence(landmarks, timestamps, exercises)
+    save_recording(os.path.join(out_dir, "landmarks"), landmarks, timestamps / 1000.0,
+                   source=os.path.abspath(video_path))
+    arrays = {"timestamps_ms": timestamps}
+    for ex, sc in scores.items():
+        arrays[f"{ex}_form_ok"] = sc["form_ok"]
+        arrays[f"{ex}_depth"] = sc["depth"]
+        arrays[f"{ex}_feedback_ids"] = sc["feedback_ids"]
+    save_npz_atomic(os.path.join(out_dir, "analysis.npz"), **arrays)
+
+    detected = int((~np.isnan(landmarks[:, 0, 0])).sum())
+    summary = {
+        "video": os.path.abspath(video_path),
+        "frames": int(len(landmarks)),
+        "frames_with_pose": detected,
+        "worker_seconds": worker_time,
+        "fps_per_core": (len(landmarks) / worker_time) if worker_time else 0.0,
+        "exercises": {
+            ex: {
+                "reps": sc["reps"],
+                "form_ok_ratio": float(sc["form_ok"].mean()) if len(sc["form_ok"]) else 0.0,
+                "feedback_messages": sc["messages"],
+            }
+            for ex, sc in scores.items()
+        },
+    }
+    write_json_atomic(os.path.join(out_dir, "summary.json"), summary)
+    return summary
+
+
+def run_batch(videos, out_root, model_path='pose_landmarker.task', workers=None, segment_seconds=60.0,
+              exercises=EXERCISES, mirror=True, min_detection_confidence=0.85, min_tracking_confidence=0.85,
+              force=False):
+    """
+    Analyzes a list of videos with a process pool. Finished segments and videos are skipped on rerun,
+    so an interrupted batch resumes where it stopped.
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_root, exist_ok=True)
+
+    jobs = {}
+    pending = []
+    for video in videos:
+        out_dir = os.path.join(out_root, video_id(video))
+        os.makedirs(out_dir, exist_ok=True)
+        if not force and os.path.exists(os.path.join(out_dir, "summary.json")):
+            print(f"[skip] {video} (already analyzed)")
+            continue
+        frame_count, fps = probe_video(video)
+        segments = plan_segments(frame_count, max(1, int(segment_seconds * fps)))
+        jobs[video] = {"out_dir": out_dir, "segments": segments, "remaining": 0}
+        for start, end in segments:
+            path = segment_path(out_dir, start, end)
+            if not force and os.path.exists(path):
+                continue
+            jobs[video]["remaining"] += 1
+            pending.append((video, start, end, fps, mirror, path))
+
+    summaries = []
+    frames_done = 0
+    wall_t0 = time.perf_counter()
+
+    def finish(video):
+        job = jobs[video]
+        summary = finalize_video(video, job["out_dir"], job["segments"], exercises)
+        reps = ", ".join(f"{ex}={s['reps']}" for ex, s in summary["exercises"].items())
+        print(f"[done] {video}: {summary['frames']} frames, {summary['fps_per_core']:.1f} FPS/core | reps: {reps}")
+        summaries.append(summary)
+
+    # Videos whose segments all survived a previous run only need the final scoring pass
+    for video, job in jobs.items():
+        if job["remaining"] == 0:
+            finish(video)
+
+    if pending:
+        print(f"Processing {len(pending)} segments from {len(jobs)} videos on {workers} workers...")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_path, min_detection_confidence, min_tracking_confidence)) as pool:
+            futures = {pool.submit(_analyze_segment, *task): task[0] for task in pending}
+            for future in as_completed(futures):
+                video = futures[future]
+                _, frames, elapsed = future.result()
+                frames_done += frames
+                jobs[video]["remaining"] -= 1
+                if jobs[video]["remaining"] == 0:
+                    finish(video)
+
+    wall = time.perf_counter() - wall_t0
+    if frames_done:
+        print(f"Throughput: {frames_done} frames in {wall:.1f}s = {frames_done / wall:.1f} FPS total, "
+              f"{frames_done / wall / workers:.1f} FPS per core ({workers} workers)")
+    return summaries
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless, parallel pose analysis of recorded sessions")
+    parser.add_argument("videos", nargs="+", help="Video files to analyze")
+    parser.add_argument("--out", default="analysis_out", help="Output folder (reused to resume)")
+    parser.add_argument("--model", default="pose_landmarker.task", help="Pose landmarker model file")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--segment-seconds", type=float, default=60.0, help="Length of each parallel segment")
+    parser.add_argument("--exercises", nargs="+", default=EXERCISES, choices=EXERCISES,
+                        help="Exercises to score the recordings against")
+    parser.add_argument("--no-mirror", action="store_true", help="Do not mirror frames like the live view does")
+    parser.add_argument("--force", action="store_true", help="Recompute everything instead of resuming")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    run_batch(args.videos, args.out, model_path=args.model, workers=args.workers,
+              segment_seconds=args.segment_seconds, exercises=args.exercises,
+              mirror=not args.no_mirror, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
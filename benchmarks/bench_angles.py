@@ -0,0 +1,46 @@
+"""
+Micro-benchmark: scalar calculate_angle calls vs. the vectorized angle table.
+
+    python benchmarks/bench_angles.py [--frames 2000] [--batch 1024]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from biomechanics import ANGLE_DEFINITIONS, calculate_angle, compute_angle_table
+
+
+def scalar_table(landmarks):
+    return [calculate_angle(landmarks[a][:2], landmarks[b][:2], landmarks[c][:2]) for _, a, b, c in ANGLE_DEFINITIONS]
+
+
+def run(frames=2000, batch=1024):
+    rng = np.random.default_rng(0)
+    seq = rng.random((frames, 33, 4))
+    k = len(ANGLE_DEFINITIONS)
+
+    # Sanity check: both paths agree
+    assert np.allclose(np.array([scalar_table(lm) for lm in seq[:50]]), compute_angle_table(seq[:50]))
+
+    scalar_s = min(timeit.repeat(lambda: [scalar_table(lm) for lm in seq], number=1, repeat=3))
+    vector_s = min(timeit.repeat(lambda: [compute_angle_table(lm) for lm in seq], number=1, repeat=3))
+    chunks = [seq[i:i + batch] for i in range(0, frames, batch)]
+    batch_s = min(timeit.repeat(lambda: [compute_angle_table(c) for c in chunks], number=1, repeat=3))
+
+    print(f"{k} angles x {frames} frames")
+    print(f"  scalar calculate_angle : {scalar_s / frames * 1e6:8.2f} us/frame")
+    print(f"  vectorized, per frame  : {vector_s / frames * 1e6:8.2f} us/frame  ({scalar_s / vector_s:5.1f}x)")
+    print(f"  vectorized, batch={batch:<5}: {batch_s / frames * 1e6:8.2f} us/frame  ({scalar_s / batch_s:5.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=1024)
+    args = parser.parse_args()
+    run(args.frames, args.batch)
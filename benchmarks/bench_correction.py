@@ -0,0 +1,74 @@
+"""
+CorrectionEngine: per-frame cost and allocations of the corrected ghost, equality of correct_batch()
+with frame-by-frame updates, and batch throughput for offline use.
+
+    python benchmarks/bench_correction.py [--seconds 60]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_rep_sweep import synthetic_session
+from correction_engine import CorrectionEngine
+from ghost_coach import GhostCoach, GhostSpriteCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60.0, help="Length of the synthetic session")
+    args = parser.parse_args()
+    landmarks, timestamps, _ = synthetic_session(args.seconds, seed=3)
+    stream = landmarks.astype(np.float64)
+    cache = GhostSpriteCache(GhostCoach())
+    bases = np.array([cache.get_animated_pose("squat", 0, user_progress=p) for p in np.linspace(0, 1, 64)])
+    phase = (np.arange(len(stream)) % 64)
+
+    print("Per frame:")
+    engine = CorrectionEngine()
+    times = np.empty(len(stream))
+    ghosts = np.empty((len(stream), 33, 4))
+    for i, lm in enumerate(stream):
+        t0 = time.perf_counter()
+        ghost = engine.get_corrected_ghost(bases[phase[i]], None if np.isnan(lm[0, 0]) else lm)
+        times[i] = time.perf_counter() - t0
+        ghosts[i] = ghost
+    print(f"  get_corrected_ghost p50 {np.median(times) * 1e6:.1f} us  p99 {np.percentile(times, 99) * 1e6:.1f} us "
+          f"({np.median(times) * 30 * 100:.3f}% of a 30 FPS frame)")
+    engine.reset()
+    tracemalloc.start()
+    for i in range(200):
+        engine.get_corrected_ghost(bases[phase[i]], stream[i])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  peak temporary allocation over 200 frames: {peak} bytes (field and ghost live in preallocated buffers)")
+
+    panel = np.zeros((480, 640, 3), dtype=np.uint8)
+    cache.render(panel, "squat", 0, user_progress=0.5)
+    for label, draw in (("cached sprite", lambda i: cache.render(panel, "squat", 0, user_progress=phase[i] / 63)),
+                        ("corrected ghost", lambda i: cache.render_pose(panel, ghosts[i]))):
+        t = np.empty(300)
+        for i in range(300):
+            t0 = time.perf_counter()
+            draw(i)
+            t[i] = time.perf_counter() - t0
+        print(f"  coach panel via {label:<16} p50 {np.median(t) * 1e3:.2f} ms")
+
+    print("Batch:")
+    t0 = time.perf_counter()
+    fields, batch_ghosts = CorrectionEngine().correct_batch(stream, bases[phase])
+    elapsed = time.perf_counter() - t0
+    same = np.allclose(batch_ghosts, ghosts, atol=1e-12)
+    print(f"  {len(stream)} frames in {elapsed * 1e3:.1f} ms ({len(stream) / elapsed:,.0f} frames/s); "
+          f"matches frame by frame: {same}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
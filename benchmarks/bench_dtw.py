@@ -0,0 +1,161 @@
+"""
+DTW rep scoring (dtw_scoring.py): checks the banded row recurrence against a plain DTW, checks that
+batch scores equal the online ones, checks that exercises with a constant depth gauge are left out,
+and times the per-frame cost in the session and whole-recording
+scoring.
+
+    python benchmarks/bench_dtw.py [--seconds 120]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_rep_sweep import synthetic_session
+from dtw_scoring import BandedDTW, BatchDTW, rep_scorer, save_reference, score_sequence
+from ghost_coach import GhostCoach
+from rules import TEMPLATE_DIR
+from session import ExerciseSession
+from template_registry import TemplateRegistry
+
+
+def reference_rep(frames=60, depth=0.8):
+    """
+    A synthetic squat rep with the same off-side camera as the synthetic sessions. Benchmark input
+    only: it is not a demonstrated rep and is never shipped as a template reference.
+    """
+    coach = GhostCoach()
+    rep = []
+    for p in depth * (1 - np.cos(np.linspace(0, 2 * np.pi, frames))) / 2:
+        pose = coach.get_animated_pose("squat", 0, user_progress=p)
+        pose[25:27, 0] += 0.08 * p
+        rep.append(pose)
+    return np.array(rep)
+
+
+def plain_dtw(query, reference, stretch):
+    """Textbook O(n L) DTW with the same band, cost and normalization (end cell only)."""
+    n, length = len(query), len(reference)
+    d = np.full((n, length), np.inf)
+    for i in range(n):
+        lo = max(0, int(np.ceil((i + 1) / stretch)) - 1)
+        hi = min(length - 1, int(np.floor((i + 1) * stretch)) - 1)
+        for j in range(lo, hi + 1):
+            c = np.abs(query[i] - reference[j]).mean()
+            if i == 0 and j == 0:
+                d[i, j] = c
+                continue
+            best = min(d[i - 1, j] if i else np.inf, d[i - 1, j - 1] if i and j else np.inf,
+                       d[i, j - 1] if j else np.inf)
+            d[i, j] = c + best
+    return 2 * d[-1, -1] / (n + length) if np.isfinite(d[-1, -1]) else None
+
+
+def check_recurrence(trials=200, seed=0):
+    rng = np.random.default_rng(seed)
+    worst = 0.0
+    for _ in range(trials):
+        length, n = int(rng.integers(5, 40)), int(rng.integers(2, 80))
+        reference = rng.uniform(60, 180, (length, 4))
+        query = rng.uniform(60, 180, (n, 4))
+        dtw = BandedDTW(reference, stretch=2.5)
+        for q in query:
+            dtw.update(q)
+        expected = plain_dtw(query, reference, 2.5) if n <= dtw.max_frames else None
+        got = dtw.distance() if n <= dtw.max_frames else None
+        if (expected is None) != (got is None):
+            worst = np.inf
+        elif expected is not None:
+            worst = max(worst, abs(expected - got))
+    print(f"  {trials} random queries vs. a plain DTW: max difference {worst:.2e}")
+    return worst < 1e-9
+
+
+def check_constant_depth(template_dir):
+    """An exercise with a constant depth gauge (torso_twist) is not scored even with an ideal pose."""
+    path = os.path.join(template_dir, "torso_twist.json")
+    with open(path) as f:
+        spec = json.load(f)
+    spec["ideal_pose_path"] = "templates/torso_twist_ideal.npy"
+    with open(path, "w") as f:
+        json.dump(spec, f)
+    save_reference(os.path.join(template_dir, "torso_twist_ideal.npy"), reference_rep())
+    templates = TemplateRegistry(template_dir)
+    try:
+        score_sequence("torso_twist", np.zeros((2, 33, 4)), np.arange(2.0), templates)
+        raised = False
+    except ValueError:
+        raised = True
+    excluded = rep_scorer("torso_twist", templates) is None
+    print(f"  torso_twist with an ideal pose: online scorer disabled: {excluded}, batch refused: {raised}")
+    return excluded and raised
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=120.0, help="Length of the synthetic session")
+    args = parser.parse_args()
+    print("Recurrence:")
+    ok = check_recurrence()
+    print("Constant depth gauge:")
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copytree(TEMPLATE_DIR, os.path.join(tmp, "templates"))
+        ok &= check_constant_depth(os.path.join(tmp, "templates"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copytree(TEMPLATE_DIR, os.path.join(tmp, "templates"))
+        save_reference(os.path.join(tmp, "templates", "squat_ideal.npy"), reference_rep())
+        templates = TemplateRegistry(os.path.join(tmp, "templates"))
+        landmarks, timestamps, reps = synthetic_session(args.seconds, seed=7)
+        stream = landmarks.astype(np.float64)
+
+        print("Online (ExerciseSession.update per frame):")
+        timings = {}
+        for label, scored in (("rules only", False), ("rules + DTW", True)):
+            session = ExerciseSession(["squat"], templates=templates)
+            if not scored:
+                session.scorer = None
+            times = []
+            for lm, ts in zip(stream, timestamps):
+                if np.isnan(lm[0, 0]):
+                    continue
+                t0 = time.perf_counter()
+                session.update(lm, ts)
+                times.append(time.perf_counter() - t0)
+            timings[label] = np.array(times)
+            print(f"  {label:<12} p50 {np.median(times) * 1e6:6.1f} us  p99 {np.percentile(times, 99) * 1e6:6.1f} us  "
+                  f"max {np.max(times) * 1e6:6.0f} us")
+        online = np.array(session.rep_scores)
+        extra = np.median(timings["rules + DTW"]) - np.median(timings["rules only"])
+        print(f"  DTW adds ~{extra * 1e6:.0f} us per frame ({extra * 30 * 100:.2f}% of a 30 FPS frame budget); "
+              f"{len(online)} of {reps} reps scored, mean {online.mean():.0f}")
+
+        print("Batch (score_sequence):")
+        t0 = time.perf_counter()
+        result = score_sequence("squat", landmarks, timestamps, templates)
+        elapsed = time.perf_counter() - t0
+        batch = result["scores"]
+        same = len(batch) == len(online) and np.allclose(batch, online)
+        print(f"  {args.seconds:g}s recording scored in {elapsed * 1e3:.1f} ms ({args.seconds / elapsed:.0f}x real time); "
+              f"matches online scores: {same}")
+        ok &= same
+
+        dtw = BatchDTW(np.full((len(templates.get("squat").ideal_pose), 4), 90.0))
+        windows = np.array([[0, dtw.max_frames - 2]] * 200)
+        queries = np.full((dtw.max_frames, 4), 90.0)
+        t0 = time.perf_counter()
+        dtw.distances(queries, windows)
+        print(f"  200 longest-possible reps in one batch: {(time.perf_counter() - t0) * 1e3:.1f} ms")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
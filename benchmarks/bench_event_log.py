@@ -0,0 +1,141 @@
+"""
+Session event log: cost of record() on the frame loop thread, behaviour during a disk stall
+(another connection holding an exclusive lock), shutdown while the database stays locked (every
+event must end up written or counted as dropped) and indexed query time on a large log.
+
+    python benchmarks/bench_event_log.py [--events 200000] [--stall 2.0]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_log import EventLog, FORM_FAULT, REP, connect, query_events
+from rules import EXERCISES, compile_all
+from run_benchmarks import synthetic_stream
+from session import ExerciseSession
+
+
+def bench_session(path, frames=3000):
+    """ExerciseSession.update() with and without the event log on a squat stream with form faults."""
+    stream = synthetic_stream(frames)
+    # Every few seconds the knees cave in (KNEES OUT!)
+    bad = (np.arange(frames) // 90) % 4 == 3
+    stream[bad, 25, 0] = stream[bad, 26, 0] = 0.5
+    compile_all(EXERCISES)
+    log = EventLog(path)
+    for label, session in (("no log", ExerciseSession()), ("event log", ExerciseSession(event_log=log))):
+        times = np.empty(frames)
+        for i in range(frames):
+            t0 = time.perf_counter()
+            session.update(stream[i], i / 30.0)
+            times[i] = time.perf_counter() - t0
+        print(f"  update() {label:<10} p50 {np.median(times) * 1e6:6.1f} us  p99 {np.percentile(times, 99) * 1e6:6.1f} us")
+    log.close()
+    print(f"  logged {log.stats()}")
+
+
+def bench_stall(path, events=20000, stall=2.0):
+    log = EventLog(path, flush_interval=0.05)
+    release = threading.Event()
+    locked = threading.Event()
+
+    def hold_lock():
+        conn = sqlite3.connect(path, timeout=0)
+        conn.execute("BEGIN EXCLUSIVE")
+        locked.set()
+        release.wait()
+        conn.rollback()
+        conn.close()
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    locked.wait()
+    times = np.empty(events)
+    t_end = time.perf_counter() + stall
+    for i in range(events):
+        t0 = time.perf_counter()
+        log.record("stall", "p0", time.time(), REP, "squat", reps=i, depth=0.5)
+        times[i] = time.perf_counter() - t0
+        if i % 100 == 0 and time.perf_counter() < t_end:
+            time.sleep(stall / (events / 100))
+    buffered = log.stats()["buffered"]
+    release.set()
+    holder.join()
+    flushed = log.flush(timeout=10.0)
+    stats = log.stats()
+    log.close()
+    print(f"  record() during a {stall:.1f}s lock: p50 {np.median(times) * 1e6:.2f} us, "
+          f"p99 {np.percentile(times, 99) * 1e6:.2f} us, max {times.max() * 1e6:.0f} us")
+    print(f"  buffered while locked: {buffered}, flushed afterwards: {flushed} | {stats}")
+
+
+def bench_locked_shutdown(path, events=1000):
+    """close() while another connection never releases its lock: nothing may go missing from stats()."""
+    log = EventLog(path, flush_interval=0.05)
+    conn = sqlite3.connect(path, timeout=0)
+    conn.execute("BEGIN EXCLUSIVE")
+    for i in range(events):
+        log.record("locked", "p0", time.time(), REP, "squat", reps=i)
+    time.sleep(1.0)
+    t0 = time.perf_counter()
+    log.close(timeout=60.0)
+    conn.rollback()
+    conn.close()
+    stats = log.stats()
+    ok = stats["written"] + stats["dropped"] == stats["recorded"] and stats["buffered"] == 0
+    print(f"  gave up after {time.perf_counter() - t0:.1f}s: {stats} -> {'OK' if ok else 'events unaccounted for'}")
+    return ok
+
+
+def bench_query(path, events=200000, patients=100):
+    rng = np.random.default_rng(0)
+    t0 = 1.7e9
+    conn = connect(path)
+    rows = [(f"s{i // 500}", f"p{rng.integers(patients)}", t0 + i * 0.5, REP if i % 3 else FORM_FAULT,
+             EXERCISES[i % len(EXERCISES)], i % 20, 1, 0.8, None) for i in range(events)]
+    start = time.perf_counter()
+    with conn:
+        conn.executemany("INSERT INTO events (session, patient, ts, kind, exercise, reps, form_ok, depth, message) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    print(f"  inserted {events} events in {time.perf_counter() - start:.2f}s (one batch)")
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM events WHERE patient = ? AND exercise = ? "
+                        "AND ts >= ? AND ts < ?", ("p7", "squat", t0, t0 + 3600)).fetchall()
+    conn.close()
+    print(f"  plan: {plan[0][-1]}")
+    for label, kwargs in (("patient", {"patient": "p7"}),
+                          ("patient + exercise", {"patient": "p7", "exercise": "squat"}),
+                          ("patient + 1 h window", {"patient": "p7", "since": t0 + 3600, "until": t0 + 7200}),
+                          ("all patients, 1 h window", {"since": t0 + 3600, "until": t0 + 7200})):
+        start = time.perf_counter()
+        n = len(query_events(path, **kwargs))
+        print(f"  query {label:<26} {n:>6} rows in {(time.perf_counter() - start) * 1e3:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=200000, help="Events in the query benchmark")
+    parser.add_argument("--stall", type=float, default=2.0, help="Seconds the database stays locked")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Frame loop cost:")
+        bench_session(os.path.join(tmp, "session.db"))
+        print("Disk stall:")
+        bench_stall(os.path.join(tmp, "stall.db"), stall=args.stall)
+        print("Shutdown while locked:")
+        ok = bench_locked_shutdown(os.path.join(tmp, "locked.db"))
+        print("Queries:")
+        bench_query(os.path.join(tmp, "query.db"), args.events)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
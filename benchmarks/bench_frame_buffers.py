@@ -0,0 +1,185 @@
+"""
+Frame buffers (frame_buffers.py): per-frame memory churn and time of the capture -> detector input ->
+display canvas path, allocating per frame as before vs. the preallocated buffers, at 480p, 720p and
+1080p. Fails when the steady state still allocates frame-sized buffers, or when the pipelined loop
+with an inference much slower than the camera renders a frame whose pixels were overwritten.
+
+    python benchmarks/bench_frame_buffers.py [--frames 200]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main as frame_loop
+from clock import VirtualClock
+from frame_buffers import FrameBuffers, ScratchBuffers
+from ghost_coach import GhostCoach
+from pipeline import DROP_OLDEST, FramePipeline
+from pose_engine import prepare_input
+from run_benchmarks import RESOLUTIONS, ReplayEngine, as_results, synthetic_stream
+from ui_manager import UIManager
+
+# Steady-state allocation allowed per frame: landmark arrays and small drawing temporaries only
+MAX_STEADY_BYTES = 64 * 1024
+
+
+class FakeCapture:
+    """cv2.VideoCapture stand-in: decodes into the caller's image when given one, like the real read()."""
+    def __init__(self, h, w):
+        self.frame = np.random.default_rng(0).integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+    def read(self, image=None):
+        if image is None or image.shape != self.frame.shape:
+            return True, self.frame.copy()
+        np.copyto(image, self.frame)
+        return True, image
+
+
+def allocating_frame(cap, ctx, engine, coach, ui, result):
+    """The per-frame path before frame_buffers: every stage returns a new image."""
+    _, frame = cap.read()
+    frame = cv2.flip(frame, 1)
+    prepare_input(frame)
+    # A new canvas per frame, with the frame copied in, like the old np.zeros canvas
+    ctx["buffers"] = FrameBuffers(canvases=1)
+    return frame_loop.render_frame(frame, result, ctx, engine, coach, ui)
+
+
+def buffered_frame(cap, ctx, engine, coach, ui, result, scratch):
+    frame = ctx["buffers"].capture(cap)
+    prepare_input(frame, scratch=scratch)
+    return frame_loop.render_frame(frame, result, ctx, engine, coach, ui)
+
+
+def measure(step, frames, warmup=20):
+    """(p50 seconds, mean peak bytes allocated during one frame)."""
+    for i in range(warmup):
+        step(i)
+    times = np.empty(frames)
+    for i in range(frames):
+        t0 = time.perf_counter()
+        step(i)
+        times[i] = time.perf_counter() - t0
+    tracemalloc.start()
+    peaks = np.empty(min(frames, 50))
+    for i in range(len(peaks)):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        step(i)
+        peaks[i] = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return float(np.median(times)), float(peaks.mean())
+
+
+def check_mirror(h, w):
+    """The mirrored frame in the canvas equals cv2.flip of the captured one."""
+    cap = FakeCapture(h, w)
+    buffers = FrameBuffers()
+    frame = buffers.capture(cap)
+    return frame.base is buffers.canvas and np.array_equal(buffers.compose(frame)[:, :w], cv2.flip(cap.frame, 1))
+
+
+class StampedCapture:
+    """Camera at ~500 FPS whose n-th frame is filled with n % 251, so a frame's pixels identify it."""
+    def __init__(self, h, w):
+        self.shape = (h, w, 3)
+        self.count = 0
+
+    def read(self, image=None):
+        time.sleep(0.002)
+        self.count += 1
+        if image is None or image.shape != self.shape:
+            image = np.empty(self.shape, dtype=np.uint8)
+        image.fill(self.count % 251)
+        return True, image
+
+    def isOpened(self):
+        return True
+
+
+class SlowEngine:
+    """Inference that takes ~15 camera intervals; returns the stamp it saw when it started."""
+    def process_frame(self, frame, timestamp_ms=None):
+        stamp = int(frame[0, 0, 0])
+        time.sleep(0.03)
+        return stamp
+
+
+def check_pipeline_integrity(h, w, seconds=1.5, queue_size=2):
+    """
+    Pipelined loop with drop_oldest and slow inference: every rendered frame must still hold the
+    pixels it was captured with (uniformly its own stamp) and match the stamp inference saw.
+    """
+    buffers = FrameBuffers(frames=queue_size + 4)
+    pipeline = FramePipeline(StampedCapture(h, w), SlowEngine(), queue_size=queue_size, drop_policy=DROP_OLDEST,
+                             buffers=buffers)
+    bad, rendered = [], [0]
+    deadline = time.perf_counter() + seconds
+
+    def render(frame_id, capture_ts, frame, stamp):
+        expected = frame_id % 251
+        if stamp != expected or frame.min() != expected or frame.max() != expected:
+            bad.append(frame_id)
+        time.sleep(0.005)
+        # The frame must also survive the whole render
+        if frame.min() != expected or frame.max() != expected:
+            bad.append(frame_id)
+        rendered[0] += 1
+        return time.perf_counter() < deadline
+
+    pipeline.run(render)
+    captured = pipeline.frame_id
+    print(f"  pipelined {h}p, inference 30 ms vs 2 ms frames: {captured} captured, {rendered[0]} rendered, "
+          f"{len(bad)} torn or mismatched, {buffers.frames.count} pooled frames")
+    return not bad and rendered[0] > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+    stream = synthetic_stream(120)
+    results = [as_results(lm) for lm in stream]
+    engine, coach = ReplayEngine(), GhostCoach()
+    ok = True
+    print(f"{'':>6} {'allocating p50':>15} {'buffered p50':>13} {'allocating /frame':>18} {'buffered /frame':>16} "
+          f"{'churn at 30 FPS':>16}")
+    for name, (h, w) in RESOLUTIONS.items():
+        row = {}
+        for label in ("allocating", "buffered"):
+            cap, ui, scratch = FakeCapture(h, w), UIManager(), ScratchBuffers()
+            ctx = frame_loop.create_context()
+            ctx["clock"] = VirtualClock()
+
+            def step(i):
+                ctx["clock"].set(i / 30.0)
+                if label == "allocating":
+                    allocating_frame(cap, ctx, engine, coach, ui, results[i % len(results)])
+                else:
+                    buffered_frame(cap, ctx, engine, coach, ui, results[i % len(results)], scratch)
+            row[label] = measure(step, args.frames)
+            if label == "buffered":
+                allocations = ctx["buffers"].allocations + scratch.allocations
+        (t_alloc, b_alloc), (t_buf, b_buf) = row["allocating"], row["buffered"]
+        print(f"{name:>6} {t_alloc * 1e3:12.2f} ms {t_buf * 1e3:10.2f} ms {b_alloc / 1024:14.0f} KiB "
+              f"{b_buf / 1024:12.1f} KiB {b_alloc * 30 / 2 ** 20:6.0f} -> {b_buf * 30 / 2 ** 20:.1f} MB/s")
+        mirrored = check_mirror(h, w)
+        if b_buf > MAX_STEADY_BYTES or allocations != 3 or not mirrored:
+            print(f"  FAIL: {b_buf:.0f} bytes per frame, {allocations} buffer allocations "
+                  f"(expected 2 canvases and 1 RGB input), mirror ok: {mirrored}")
+            ok = False
+    print("Pipelined frame ownership:")
+    ok &= check_pipeline_integrity(*RESOLUTIONS["480p"])
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+HUD cost per frame: immediate-mode drawing vs. the retained-mode layer cache, across resolutions.
+The full-width header band's tint has to be blended with the live pixels every frame, so its cost
+is timed on its own: it may grow with the canvas width, at most linearly (within --max-ratio).
+Fails unless retained mode is faster than immediate mode at every resolution and the retained p50
+without the band stays within --max-ratio from 480p to 1080p.
+
+    python benchmarks/bench_hud.py [--frames 300] [--max-ratio 1.3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ui_manager import UIManager
+
+# Side-by-side canvas sizes (camera frame + ghost panel)
+RESOLUTIONS = {"480p": (480, 1280), "720p": (720, 2560), "1080p": (1080, 3840)}
+
+
+def hud_states(frames):
+    """A plausible session: depth moves every frame, form flips now and then, a rep every 60 frames."""
+    t = np.arange(frames)
+    depth = 0.5 - 0.5 * np.cos(t * 2 * np.pi / 60)
+    return [("squat", int(i // 60), bool(d < 0.8), float(d)) for i, d in zip(t, depth)]
+
+
+def time_hud(ui, canvas, states):
+    samples = []
+    for state in states:
+        t0 = time.perf_counter()
+        ui.render_hud(canvas, *state)
+        samples.append(time.perf_counter() - t0)
+    return np.median(samples) * 1e6, np.percentile(samples, 99) * 1e6
+
+
+def time_band(ui, canvas, repeats=300):
+    """p50 of compositing the cached header band layer alone (its per-frame tint pass)."""
+    layer = ui._get_layer("band", None, lambda: ui._band_ops(canvas.shape[1]), canvas.shape)
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        layer.composite(canvas)
+        samples.append(time.perf_counter() - t0)
+    return np.median(samples) * 1e6
+
+
+def run(frames=300, max_ratio=1.3):
+    states = hud_states(frames)
+    retained_p50, band_p50 = {}, {}
+    ok = True
+    print(f"{'canvas':>12} {'immediate p50/p99 (us)':>24} {'retained p50/p99 (us)':>24} {'band p50 (us)':>14} "
+          f"{'max diff':>9}")
+    for name, (h, w) in RESOLUTIONS.items():
+        canvas = np.random.default_rng(0).integers(0, 256, (h, w, 3), dtype=np.uint8)
+        immediate, retained = UIManager(retained=False), UIManager()
+        a = immediate.render_hud(canvas.copy(), *states[7])
+        b = retained.render_hud(canvas.copy(), *states[7])
+        max_diff = int(np.abs(a.astype(np.int16) - b).max())
+        # Warm the layer cache once, like a session that has been running for a while
+        for state in states:
+            retained.render_hud(canvas.copy(), *state)
+        i50, i99 = time_hud(immediate, canvas.copy(), states)
+        r50, r99 = time_hud(retained, canvas.copy(), states)
+        band = time_band(retained, canvas.copy())
+        print(f"{name:>5} {w}x{h} {i50:11.1f} / {i99:9.1f} {r50:11.1f} / {r99:9.1f} {band:14.1f} {max_diff:>9}")
+        retained_p50[name] = r50 - band
+        band_p50[name] = (band, w)
+        ok &= r50 < i50
+    print(f"retained cache: {retained.stats()}")
+    ratio = retained_p50["1080p"] / retained_p50["480p"]
+    ok &= ratio <= max_ratio
+    print(f"retained without the band, 1080p / 480p p50: {ratio:.2f} (limit {max_ratio:g})")
+    (band_hi, w_hi), (band_lo, w_lo) = band_p50["1080p"], band_p50["480p"]
+    band_ratio = band_hi / band_lo
+    ok &= band_ratio <= max_ratio * w_hi / w_lo
+    print(f"header band, 1080p / 480p p50: {band_ratio:.2f} for {w_hi / w_lo:.0f}x the width "
+          f"({band_hi / w_hi * 1e3:.0f} ns per column at 1080p) -> {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--max-ratio", type=float, default=1.3, help="Allowed retained p50 growth from 480p to 1080p (per unit of width for the band)")
+    args = parser.parse_args()
+    if not run(args.frames, args.max_ratio):
+        sys.exit(1)
@@ -0,0 +1,109 @@
+"""
+Landmark codec (landmark_codec.py): bytes per frame, encode / decode speed and round-trip error
+of archives and stream packets on synthetic squat sessions. Fails if the joint angles from
+biomechanics move by more than --max-angle-error degrees, a rep count changes, or the archive
+and the stream decode differently.
+
+    python benchmarks/bench_landmark_codec.py [--seconds 120] [--max-angle-error 0.05]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_rep_sweep import synthetic_session
+from biomechanics import compute_angle_table
+from landmark_codec import KEYFRAME, STEP, ArchiveWriter, LandmarkStreamDecoder, LandmarkStreamEncoder, read_archive
+from recording import FRAME_BYTES
+from rules import load_program
+
+
+def angle_error(original, decoded):
+    """Max absolute difference (degrees) of every biomechanics angle over frames with a body."""
+    a, b = compute_angle_table(original.astype(np.float64)), compute_angle_table(decoded.astype(np.float64))
+    both = ~np.isnan(a) & ~np.isnan(b)
+    return float(np.abs(a - b)[both].max())
+
+
+def bench_archive(tmp, landmarks, timestamps):
+    path = os.path.join(tmp, "session.lmk")
+    t0 = time.perf_counter()
+    with ArchiveWriter(path) as writer:
+        writer.extend(landmarks, timestamps)
+    encode = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    decoded, ts, _, meta = read_archive(path)
+    decode = time.perf_counter() - t0
+    # Random access: one second from the middle, only its blocks are decompressed
+    mid = len(landmarks) // 2
+    t0 = time.perf_counter()
+    part = read_archive(path, mid, mid + 30)[0]
+    seek = time.perf_counter() - t0
+    n = len(landmarks)
+    print(f"  archive: {os.path.getsize(path) / n:6.1f} B/frame, encode {encode / n * 1e6:5.1f} us/frame, "
+          f"decode {decode / n * 1e6:5.1f} us/frame, 30 frames from the middle in {seek * 1e3:.2f} ms")
+    ok = np.array_equal(part, decoded[mid:mid + 30], equal_nan=True) and meta["frames"] == n
+    return decoded, ts, ok
+
+
+def bench_stream(landmarks, timestamps):
+    encoder, decoder = LandmarkStreamEncoder(), LandmarkStreamDecoder()
+    t0 = time.perf_counter()
+    packets = [encoder.encode(landmarks[i], timestamps[i]) for i in range(len(landmarks))]
+    encode = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    frames = [decoder.decode(p) for p in packets]
+    decode = time.perf_counter() - t0
+    n = len(packets)
+    print(f"  stream:  {sum(map(len, packets)) / n:6.1f} B/frame, encode {encode / n * 1e6:5.1f} us/frame, "
+          f"decode {decode / n * 1e6:5.1f} us/frame")
+    decoded = np.stack([np.full((33, 4), np.nan, dtype=np.float32) if f[0] is None else f[0] for f in frames])
+
+    # A receiver joining mid-stream outputs nothing until the next keyframe, then the same frames
+    late = LandmarkStreamDecoder()
+    joined = [late.decode(p) for p in packets[n // 2 + 1:]]
+    key = next(i for i, p in enumerate(packets[n // 2 + 1:]) if p[0] & KEYFRAME)
+    waited = all(f is None or f[0] is None for f in joined[:key])
+    caught_up = all((f[0] is None) == np.isnan(decoded[n // 2 + 1 + i, 0, 0]) and
+                    (f[0] is None or np.array_equal(f[0], decoded[n // 2 + 1 + i]))
+                    for i, f in enumerate(joined[key:], key))
+    return decoded, waited and caught_up
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=120.0, help="Length of each synthetic session")
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--max-angle-error", type=float, default=0.05, help="Allowed angle change in degrees")
+    args = parser.parse_args()
+    program = load_program("squat")
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for seed in range(args.sessions):
+            landmarks, timestamps, _ = synthetic_session(args.seconds, seed=seed)
+            print(f"Session {seed}: {len(landmarks)} frames (float32 recording {FRAME_BYTES + 9} B/frame)")
+            archived, ts, seek_ok = bench_archive(tmp, landmarks, timestamps)
+            streamed, join_ok = bench_stream(landmarks, timestamps)
+
+            coord = float(np.nanmax(np.abs(archived[..., :3] - landmarks[..., :3]) / STEP))
+            angles = angle_error(landmarks, archived)
+            reps = program.run_sequence(landmarks, timestamps)["reps"], program.run_sequence(archived, ts)["reps"]
+            same = np.array_equal(archived, streamed, equal_nan=True)
+            print(f"  max coordinate error {coord:.2f} steps, max angle error {angles:.4f} deg, "
+                  f"max timestamp error {np.abs(ts - timestamps).max() * 1e6:.2f} us, reps {reps[0]} -> {reps[1]}, "
+                  f"stream == archive: {same}")
+            # Half a quantization step, plus the float32 rounding of the decoded values
+            ok &= coord <= 0.51 and angles <= args.max_angle_error and reps[0] == reps[1]
+            ok &= same and seek_ok and join_ok
+    print("OK" if ok else "FAILED")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
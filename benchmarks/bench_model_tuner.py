@@ -0,0 +1,70 @@
+"""
+Model tier calibration (model_tuner.py): the pick rejects candidates that do not find the pose,
+and - with model files present - the built-in synthetic clip is actually detected by every tier,
+so its timings include the tier's landmark network. Fails otherwise.
+
+    python benchmarks/bench_model_tuner.py [--model-dir .] [--frame-size 480 640]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_tuner import MIN_DETECTION_RATE, available_models, measure, pick, synthetic_clip
+
+
+def entry(tier, fps, detection_rate):
+    return {"tier": tier, "max_input_side": None, "fps": fps, "detection_rate": detection_rate}
+
+
+def check_pick():
+    """Measured reports with known answers, most accurate tier first."""
+    cases = [
+        # The accurate tier is "fast" only because its landmark network never ran
+        ([entry("heavy", 40, 0.0), entry("full", 30, 1.0), entry("lite", 60, 1.0)], 25, "full"),
+        ([entry("heavy", 20, 0.9), entry("full", 30, 0.5), entry("lite", 60, 0.95)], 25, "lite"),
+        # Nothing meets the target: the fastest that detects the pose
+        ([entry("heavy", 10, 1.0), entry("full", 15, 1.0), entry("lite", 50, 0.1)], 25, "full"),
+        ([entry("heavy", 40, 0.0), entry("lite", 60, 0.2)], 25, None),
+    ]
+    ok = True
+    for report, target, expected in cases:
+        choice = pick(report, target)
+        got = choice and choice["tier"]
+        ok &= got == expected
+        print(f"  {[(e['tier'], e['fps'], e['detection_rate']) for e in report]} @ {target} FPS -> {got} "
+              f"({'ok' if got == expected else f'expected {expected}'})")
+    return ok
+
+
+def check_synthetic_clip(model_dir, frame_size):
+    models = available_models(model_dir)
+    if not models:
+        print(f"  no pose landmarker models in {os.path.abspath(model_dir)}: synthetic clip detection not checked")
+        return True
+    clip = synthetic_clip(frame_size=frame_size)
+    ok = True
+    for tier, path in models:
+        rate = measure(path, None, clip)["detection_rate"]
+        ok &= rate >= MIN_DETECTION_RATE
+        print(f"  {tier:<8} finds the synthetic figure in {rate:.0%} of frames (need {MIN_DETECTION_RATE:.0%})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=".")
+    parser.add_argument("--frame-size", type=int, nargs=2, default=(480, 640), metavar=("H", "W"))
+    args = parser.parse_args()
+    print("Candidate pick:")
+    ok = check_pick()
+    print("Synthetic calibration clip:")
+    ok &= check_synthetic_clip(args.model_dir, tuple(args.frame_size))
+    print("OK" if ok else "FAILED")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
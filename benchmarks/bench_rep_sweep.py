@@ -0,0 +1,153 @@
+"""
+Rep threshold sweep (rep_sweep.py): checks that the vectorized hysteresis counts exactly what the
+compiled rules count frame by frame, then times a full grid sweep over synthetic labeled sessions.
+
+    python benchmarks/bench_rep_sweep.py [--sessions 200] [--seconds 60] [--workers 4]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ghost_coach import GhostCoach
+from recording import save_recording
+from replay import _replay_batch
+from rules import RuleProgram, TEMPLATE_DIR, create_state, load_program
+from rep_sweep import default_grid, load_labels, rep_trace, run_sweep, score, sweep_counts
+
+
+def synthetic_session(seconds, seed, fps=30.0):
+    """
+    A labeled squat session: reps of random depth and speed with pauses, detector jitter, short
+    tracking losses and visibility dips. Returns (landmarks, timestamps, completed reps).
+    """
+    rng = np.random.default_rng(seed)
+    coach = GhostCoach()
+    frames = int(seconds * fps)
+    progress = np.zeros(frames)
+    i, reps = int(rng.integers(0, 30)), 0
+    while True:
+        length = int(rng.uniform(1.2, 3.5) * fps)
+        if i + length > frames:
+            break
+        progress[i:i + length] = rng.uniform(0.55, 0.85) * (1 - np.cos(np.linspace(0, 2 * np.pi, length))) / 2
+        i += length + int(rng.exponential(0.5) * fps)
+        reps += 1
+    # The coach's squat only drops the hips; pushing the knees sideways (a camera slightly off to the
+    # side) makes the 2D knee angle go from 180 at the top to ~100 at full depth
+    poses = {}
+    stream = np.empty((frames, 33, 4))
+    for f in range(frames):
+        key = round(progress[f] * 50)
+        if key not in poses:
+            poses[key] = coach.get_animated_pose("squat", 0, user_progress=key / 50)
+            poses[key][25:27, 0] += 0.08 * key / 50
+        stream[f] = poses[key]
+    stream[:, :, :3] += rng.normal(0, 0.004, (frames, 33, 3))
+    stream[:, :, 3] = rng.uniform(0.7, 1.0, (frames, 33))
+    for start in rng.integers(0, frames, size=3):
+        stream[start:start + int(rng.integers(3, 20)), :, :2] = np.nan
+    for start in rng.integers(0, frames, size=3):
+        stream[start:start + int(rng.integers(2, 10)), 25:29, 3] = 0.3
+    return stream.astype(np.float32), np.arange(frames) / fps, reps
+
+
+def spec_with(ex, enter, exit_, cooldown):
+    with open(os.path.join(TEMPLATE_DIR, f"{ex}.json")) as f:
+        spec = json.load(f)["rules"]
+    rep = dict(spec["rep"], enter=[spec["rep"]["enter"][0], float(enter)], exit=[spec["rep"]["exit"][0], float(exit_)],
+               cooldown=float(cooldown))
+    return dict(spec, rep=rep)
+
+
+def check_equivalence(sessions=8, combos=40, seed=0):
+    """Random grid points vs. RuleProgram.run_sequence, and exercise-tagged recordings vs. replay.py."""
+    rng = np.random.default_rng(seed)
+    program = load_program("squat")
+    grid = default_grid(program)
+    bad = checked = 0
+    for s in range(sessions):
+        landmarks, timestamps, _ = synthetic_session(40, seed=s)
+        counts = sweep_counts(program, rep_trace(program, landmarks, timestamps), *grid)
+        for _ in range(combos):
+            i, j, c = (rng.integers(len(g)) for g in grid)
+            expected = RuleProgram("squat", spec_with("squat", grid[0][i], grid[1][j], grid[2][c])).run_sequence(
+                landmarks, timestamps)["reps"]
+            bad += counts[i, j, c] != expected
+            checked += 1
+
+        # Alternate squat / lunge sections, scored through the live replay path
+        ids = ((np.arange(len(landmarks)) // int(rng.integers(150, 400))) % 2).astype(np.uint8)
+        state = create_state(["squat", "lunge"])
+        _replay_batch(state, landmarks, timestamps, ids, ["squat", "lunge"])
+        trace = rep_trace(program, landmarks, timestamps, ids, 0)
+        enter, exit_, cooldown = (np.array([v]) for v in (program.atom_thr[program.enter_atom],
+                                                          program.atom_thr[program.exit_atom], program.cooldown))
+        bad += sweep_counts(program, trace, enter, exit_, cooldown)[0, 0, 0] != state["state_tracker"]["squat"]["counter"]
+        checked += 1
+    print(f"  {checked} rep counts compared with the frame-by-frame rules: {bad} mismatches")
+    return bad == 0
+
+
+def bench_sweep(sessions, seconds, workers):
+    program = load_program("squat")
+    grid = default_grid(program)
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        labels, paths = {}, []
+        for s in range(sessions):
+            landmarks, timestamps, reps = synthetic_session(seconds, seed=1000 + s)
+            path = os.path.join(tmp, f"s{s:04d}")
+            save_recording(path, landmarks, timestamps, rep_labels={"squat": reps})
+            paths.append(path)
+        print(f"  generated {sessions} sessions of {seconds:g}s in {time.perf_counter() - t0:.1f}s")
+        labels = load_labels(paths)
+
+        # One recording, one core: frame-by-frame rules per combination vs. the whole grid at once
+        landmarks, timestamps, _ = synthetic_session(seconds, seed=1000)
+        t0 = time.perf_counter()
+        RuleProgram("squat", spec_with("squat", *(g[len(g) // 2] for g in grid))).run_sequence(landmarks, timestamps)
+        per_combo = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        sweep_counts(program, rep_trace(program, landmarks, timestamps), *grid)
+        whole = time.perf_counter() - t0
+        n = np.prod([len(g) for g in grid])
+        print(f"  one {seconds:g}s session, {n} combinations: {whole * 1e3:.0f} ms vectorized vs. "
+              f"~{per_combo * n:.1f} s re-running the rules per combination")
+
+        for w in sorted({1, workers}):
+            t0 = time.perf_counter()
+            counts, ex_labels = run_sweep(paths, labels, {"squat": grid}, workers=w)["squat"]
+            elapsed = time.perf_counter() - t0
+            print(f"  {sessions} sessions x {n} combinations on {w} worker(s): {elapsed:.2f}s "
+                  f"({sessions / elapsed:.0f} sessions/s)")
+
+        scores = score(counts, ex_labels)
+        best = np.unravel_index(np.argmax(scores["f1"]), scores["f1"].shape)
+        mid = tuple(len(g) // 2 for g in grid)
+        print(f"  template {tuple(float(g[k]) for g, k in zip(grid, mid))}: f1 {scores['f1'][mid]:.3f}; "
+              f"best {tuple(round(float(g[k]), 2) for g, k in zip(grid, best))}: f1 {scores['f1'][best]:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=60.0, help="Length of each synthetic session")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    print("Equivalence:")
+    ok = check_equivalence()
+    print("Sweep:")
+    bench_sweep(args.sessions, args.seconds, args.workers)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Live -> record -> replay equivalence: synthetic squat sessions go through main.render_frame with
+a clock that runs a variable render latency behind the capture time (as in the live pipeline),
+are recorded, and replayed with replay.py. The replay must count the same reps after every frame.
+Sessions are also played faster (--speeds) so many reps land near the rep cooldown, where a
+timestamp that differs from the one the live rules saw changes the count.
+
+    python benchmarks/bench_replay.py [--sessions 6] [--seconds 60]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main as frame_loop
+import replay
+from bench_rep_sweep import synthetic_session
+from clock import VirtualClock
+from ghost_coach import GhostCoach
+from recording import LandmarkRecorder
+from rules import evaluate_exercise
+from session_recorder import _RecordedEngine
+from ui_manager import UIManager
+
+
+def run_live(path, landmarks, timestamps, seed):
+    """render_frame over the session; the wall clock reads 5-150 ms after each frame's capture."""
+    rng = np.random.default_rng(seed)
+    ctx = frame_loop.create_context()
+    ctx["clock"] = VirtualClock()
+    ctx["recorder"] = LandmarkRecorder(path, exercises=[ctx["session"].exercise])
+    engine, coach, ui = _RecordedEngine(), GhostCoach(), UIManager()
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    wall = 1_700_000_000.0  # the live clock is epoch time, capture times are monotonic
+    counts = np.empty(len(landmarks), dtype=np.int64)
+    for i in range(len(landmarks)):
+        capture_ts = 1000.0 + timestamps[i]
+        ctx["clock"].set(wall + capture_ts + rng.uniform(0.005, 0.15))
+        lm = None if np.isnan(landmarks[i, 0, 0]) else landmarks[i].astype(np.float64)
+        frame_loop.render_frame(frame, lm, ctx, engine, coach, ui, capture_ts)
+        counts[i] = ctx["session"].reps
+    ctx["recorder"].close()
+    return counts
+
+
+def run_replay(path):
+    """replay.py frame by frame, noting the rep count after every evaluate_exercise() call."""
+    counts = []
+
+    def evaluate(state, ex, lm, now=None):
+        result = evaluate_exercise(state, ex, lm, now=now)
+        counts.append(state["state_tracker"][ex]["counter"])
+        return result
+
+    replay.evaluate_exercise = evaluate
+    try:
+        result = replay.replay_recording(path)
+    finally:
+        replay.evaluate_exercise = evaluate_exercise
+    return np.asarray(counts), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=6)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--speeds", type=float, nargs="+", default=[1.0, 1.5, 2.0])
+    args = parser.parse_args()
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for seed, speed in ((s, v) for s in range(args.sessions) for v in args.speeds):
+            landmarks, timestamps, _ = synthetic_session(args.seconds, seed=seed)
+            timestamps = timestamps / speed
+            path = os.path.join(tmp, f"session{seed}_{speed:g}")
+            t0 = time.perf_counter()
+            live = run_live(path, landmarks, timestamps, seed)
+            live_s = time.perf_counter() - t0
+            replayed, result = run_replay(path)
+            same = len(replayed) == len(live) and np.array_equal(replayed, live)
+            first = int(np.argmax(replayed != live)) if not same and len(replayed) == len(live) else None
+            print(f"  session {seed} x{speed:g}: live reps {live[-1]}, replay reps {result['reps'].get('squat', 0)} "
+                  f"({len(live) / live_s:.0f} FPS live, {result['speedup']:.0f}x replay) | per-frame counts "
+                  f"{'identical' if same else f'differ from frame {first}'}")
+            ok &= same
+    print("OK" if ok else "FAILED")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Input preparation cost (crop / downscale / cvtColor) for full-frame vs. ROI inference, and,
+given a model and a video with a person in it, end-to-end detection time in both modes.
+
+    python benchmarks/bench_roi.py [--model pose_landmarker.task --video clip.mp4] [--max-input-side 480]
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pose_engine import prepare_input
+
+RESOLUTIONS = {"720p": (720, 1280), "1080p": (1080, 1920)}
+
+
+def bench_prepare(max_input_side, number=200):
+    print(f"{'input prep (ms)':>16} {'full':>8} {'roi':>8} {'roi+scale':>10}")
+    for name, (h, w) in RESOLUTIONS.items():
+        frame = np.random.default_rng(0).integers(0, 256, (h, w, 3), dtype=np.uint8)
+        # A person standing in the middle of the frame, with margin
+        roi = (int(w * 0.35), int(h * 0.05), int(w * 0.65), int(h * 0.98))
+        full = timeit.timeit(lambda: prepare_input(frame), number=number) / number * 1e3
+        cropped = timeit.timeit(lambda: prepare_input(frame, roi), number=number) / number * 1e3
+        scaled = timeit.timeit(lambda: prepare_input(frame, roi, max_input_side), number=number) / number * 1e3
+        print(f"{name:>16} {full:8.3f} {cropped:8.3f} {scaled:10.3f}")
+
+
+def bench_inference(model, video, max_input_side, frames=300):
+    import cv2
+    from pose_engine import PoseEngine
+
+    for label, kwargs in (("full frame", {}), ("roi", {"roi_mode": True, "max_input_side": max_input_side})):
+        engine = PoseEngine(model_path=model, **kwargs)
+        cap = cv2.VideoCapture(video)
+        elapsed, n, detected = 0.0, 0, 0
+        while n < frames:
+            success, frame = cap.read()
+            if not success:
+                break
+            t0 = time.perf_counter()
+            results = engine.process_frame(frame)
+            elapsed += time.perf_counter() - t0
+            detected += bool(results and results.pose_landmarks)
+            n += 1
+        cap.release()
+        engine.close()
+        print(f"{label:>10}: {elapsed / max(n, 1) * 1e3:6.2f} ms/frame over {n} frames, pose in {detected} | "
+              f"{engine.roi_stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=None, help="Pose landmarker model for the end-to-end run")
+    parser.add_argument("--video", default=None, help="Video with a person in it for the end-to-end run")
+    parser.add_argument("--max-input-side", type=int, default=480)
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+    bench_prepare(args.max_input_side)
+    if args.model and args.video:
+        bench_inference(args.model, args.video, args.max_input_side, args.frames)
@@ -0,0 +1,98 @@
+"""
+Session video export (session_recorder.py): render-thread cost of SessionRecorder.submit() vs.
+calling cv2.VideoWriter.write inline, and a run where the encoder cannot keep up, which must
+show up as dropped frames while submit() stays fast.
+
+    python benchmarks/bench_session_recorder.py [--seconds 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_benchmarks import RESOLUTIONS
+from session_recorder import SessionRecorder
+
+# Render work between two submits in the overload run
+FRAME_WORK_S = 0.02
+
+
+def composite(h, w, seed=0):
+    """A camera-like canvas (smooth noise) so the encoder does realistic work."""
+    rng = np.random.default_rng(seed)
+    return cv2.GaussianBlur(rng.integers(0, 256, (h, 2 * w, 3), dtype=np.uint8), (0, 0), 3)
+
+
+def bench_submit(tmp, seconds):
+    print(f"{'':>6} {'inline write p50':>17} {'submit p50':>11} {'submit p99':>11} {'written':>8} {'dropped':>8}")
+    for name, (h, w) in RESOLUTIONS.items():
+        frames = [composite(h, w, seed) for seed in range(4)]
+        size = (w, h // 2)
+        writer = cv2.VideoWriter(os.path.join(tmp, f"inline_{name}.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), 15.0, size)
+        small = np.empty((h // 2, w, 3), dtype=np.uint8)
+        inline = []
+        for i in range(30):
+            t0 = time.perf_counter()
+            cv2.resize(frames[i % 4], size, dst=small, interpolation=cv2.INTER_AREA)
+            writer.write(small)
+            inline.append(time.perf_counter() - t0)
+        writer.release()
+
+        # Frames 1/30 s apart on the capture clock, rendered back to back
+        recorder = SessionRecorder(os.path.join(tmp, f"async_{name}.mp4"), fps=15.0, scale=0.5)
+        times = []
+        for i in range(int(seconds * 30)):
+            t0 = time.perf_counter()
+            recorder.submit(frames[i % 4], i / 30.0)
+            times.append(time.perf_counter() - t0)
+            time.sleep(FRAME_WORK_S / 4)
+        recorder.close()
+        stats = recorder.stats()
+        print(f"{name:>6} {np.median(inline) * 1e3:14.2f} ms {np.median(times) * 1e3:8.2f} ms "
+              f"{np.percentile(times, 99) * 1e3:8.2f} ms {stats['written']:8d} {stats['dropped']:8d}")
+
+
+def bench_overload(tmp, seconds):
+    """Full-size 1080p composite in MJPEG at 30 FPS: far more than one core encodes in real time."""
+    h, w = RESOLUTIONS["1080p"]
+    frames = [composite(h, w, seed) for seed in range(4)]
+    recorder = SessionRecorder(os.path.join(tmp, "overload.avi"), fps=30.0, scale=1.0, fourcc="MJPG")
+    times = []
+    t_start = time.perf_counter()
+    i = 0
+    while time.perf_counter() - t_start < seconds:
+        t0 = time.perf_counter()
+        recorder.submit(frames[i % 4], t0 - t_start)
+        times.append(time.perf_counter() - t0)
+        time.sleep(FRAME_WORK_S)
+        i += 1
+    t0 = time.perf_counter()
+    recorder.close()
+    stats = recorder.stats()
+    print(f"  {i} frames offered: {stats['dropped']} dropped, {stats['written']} video frames written "
+          f"(encode {stats['avg_encode_ms']:.0f} ms each); submit p50 {np.median(times) * 1e3:.2f} ms, "
+          f"max {np.max(times) * 1e3:.1f} ms; close {time.perf_counter() - t0:.2f}s")
+    return stats["dropped"] > 0 and np.max(times) < 0.05
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=4.0)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Composite at half size, 15 FPS:")
+        bench_submit(tmp, args.seconds)
+        print("Encoder overload:")
+        ok = bench_overload(tmp, args.seconds)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Startup cost: import time of the app with mediapipe deferred to the loader thread vs. mediapipe
+itself (fresh interpreters), and with --model the model load, a cold first inference and the
+first inference after PoseEngine.warm_up().
+
+    python benchmarks/bench_startup.py [--model pose_landmarker.task] [--repeats 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def import_seconds(statement, repeats):
+    """Best wall time of 'statement' in a fresh interpreter (cold module state, warm disk cache)."""
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    runs = [float(subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                                 check=True).stdout) for _ in range(repeats)]
+    return min(runs)
+
+
+def bench_imports(repeats):
+    app = import_seconds("import main", repeats)
+    mp = import_seconds("import pose_engine; pose_engine.load_mediapipe()", repeats)
+    print(f"  import main.py: {app:.2f}s (mediapipe deferred); mediapipe on the loader thread: {mp:.2f}s")
+
+
+def bench_engine(model, frame_shape=(720, 1280, 3)):
+    from pose_engine import PoseEngine, load_mediapipe
+
+    load_mediapipe()
+    frame = np.random.default_rng(0).integers(0, 256, frame_shape, dtype=np.uint8)
+    for warm in (False, True):
+        t0 = time.perf_counter()
+        engine = PoseEngine(model_path=model)
+        load = time.perf_counter() - t0
+        warm_ms = engine.warm_up(frame_shape) if warm else 0.0
+        t0 = time.perf_counter()
+        engine.process_frame(frame)
+        first = (time.perf_counter() - t0) * 1e3
+        t0 = time.perf_counter()
+        engine.process_frame(frame)
+        second = (time.perf_counter() - t0) * 1e3
+        engine.close()
+        label = f"after warm-up ({warm_ms:.0f} ms, while the camera opens)" if warm else "cold"
+        print(f"  model load {load * 1e3:5.0f} ms | first inference {first:6.1f} ms {label}, next {second:6.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=None, help="Pose landmarker model for the load / warm-up timings")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    print("Imports:")
+    bench_imports(args.repeats)
+    if args.model:
+        print("Engine:")
+        bench_engine(args.model)
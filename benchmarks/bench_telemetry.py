@@ -0,0 +1,180 @@
+"""
+Load test for the dashboard telemetry server: a simulated 30 FPS frame loop publishes session
+state while many WebSocket subscribers (some of them deliberately slow) listen from separate
+processes. Reports the frame loop's own timing with and without subscribers, the server's
+send/coalesce counters and what the subscribers received.
+
+    python benchmarks/bench_telemetry.py --clients 200 --slow 0.1 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rules import EXERCISES
+from telemetry import TelemetryHub, TelemetryServer
+
+FPS = 30.0
+# Simulated per-frame engine work (inference + rules + drawing), in seconds
+WORK_S = 0.010
+
+
+def state_at(i):
+    """Session state the frame loop would publish on frame i: a 2 s squat cycle."""
+    reps = i // 60
+    depth = round((1 - np.cos(i / 60 * 2 * np.pi)) / 2, 2)
+    form_ok = (i // 45) % 4 != 3
+    return {
+        "exercise": "squat",
+        "reps": reps,
+        "counters": {ex: (reps if ex == "squat" else 0) for ex in EXERCISES},
+        "body": True,
+        "form_ok": form_ok,
+        "depth": depth,
+        "feedback": "" if form_ok else "KEEP YOUR BACK STRAIGHT",
+    }
+
+
+def merge(state, delta):
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            merge(state.setdefault(key, {}), value)
+        else:
+            state[key] = value
+
+
+def run_frame_loop(hub, frames):
+    """Returns per-frame publish cost (us) and per-frame loop time (ms)."""
+    publish_us = np.empty(frames)
+    frame_ms = np.empty(frames)
+    commands = 0
+    next_t = time.perf_counter()
+    for i in range(frames):
+        t0 = time.perf_counter()
+        commands += len(hub.poll_commands())
+        busy_until = t0 + WORK_S
+        while time.perf_counter() < busy_until:
+            pass
+        state = state_at(i)
+        t1 = time.perf_counter()
+        hub.publish(state)
+        t2 = time.perf_counter()
+        publish_us[i] = (t2 - t1) * 1e6
+        frame_ms[i] = (t2 - t0) * 1e3
+        next_t += 1.0 / FPS
+        time.sleep(max(0.0, next_t - time.perf_counter()))
+    return publish_us, frame_ms, commands
+
+
+async def subscriber(url, fps, slow, deadline, send_select):
+    from websockets.asyncio.client import connect
+
+    state, messages, nbytes = {}, 0, 0
+    async with connect(url, compression=None) as ws:
+        await ws.send(json.dumps({"type": "hello", "fps": fps}))
+        if send_select:
+            await ws.send(json.dumps({"type": "select", "exercise": "squat"}))
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                raw = await asyncio.wait_for(ws.recv(), remaining)
+            except asyncio.TimeoutError:
+                break
+            msg = json.loads(raw)
+            kind = msg.pop("type")
+            if kind == "state":
+                state = msg
+            else:
+                merge(state, msg)
+            messages += 1
+            nbytes += len(raw)
+            if slow:
+                # A background tab: reads one message per second
+                await asyncio.sleep(1.0)
+    return {"slow": slow, "messages": messages, "bytes": nbytes, "state": state}
+
+
+def subscriber_process(url, count, slow_count, fps, deadline, first, out):
+    async def run():
+        tasks = [subscriber(url, fps, i < slow_count, deadline, first and i == slow_count) for i in range(count)]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    results = asyncio.run(run())
+    out.put([r if isinstance(r, dict) else {"error": repr(r)} for r in results])
+
+
+def run(clients, slow_fraction, seconds, fps, procs):
+    hub = TelemetryHub()
+    server = TelemetryServer(hub, port=0).start()
+    host, port = server.address
+    url = f"ws://{host}:{port}"
+    frames = int(seconds * FPS)
+
+    workers, out = [], mp.Queue()
+    if clients:
+        deadline = time.time() + 2.0 + seconds + 1.0
+        per_proc = [clients // procs + (i < clients % procs) for i in range(procs)]
+        for i, count in enumerate(per_proc):
+            slow = int(round(count * slow_fraction))
+            p = mp.Process(target=subscriber_process, args=(url, count, slow, fps, deadline, i == 0, out))
+            p.start()
+            workers.append(p)
+        # Let everyone connect before the frame loop starts
+        time.sleep(2.0)
+
+    publish_us, frame_ms, commands = run_frame_loop(hub, frames)
+    results = []
+    for _ in workers:
+        results += out.get()
+    for p in workers:
+        p.join()
+    stats = server.stats()
+    server.stop()
+    return publish_us, frame_ms, commands, stats, results, state_at(frames - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--slow", type=float, default=0.1, help="Fraction of subscribers that read 1 msg/s")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--fps", type=float, default=30.0, help="Refresh rate the subscribers ask for")
+    parser.add_argument("--procs", type=int, default=2, help="Subscriber processes")
+    args = parser.parse_args()
+
+    for clients in (0, args.clients):
+        publish_us, frame_ms, commands, stats, results, final = run(clients, args.slow, args.seconds,
+                                                                     args.fps, args.procs)
+        print(f"--- {clients} subscribers ---")
+        print(f"frame loop: {np.median(frame_ms):.2f} ms p50, {np.percentile(frame_ms, 99):.2f} ms p99, "
+              f"{frame_ms.max():.2f} ms max (work {WORK_S * 1e3:.0f} ms) | publish "
+              f"{np.median(publish_us):.1f} us p50, {np.percentile(publish_us, 99):.1f} us p99")
+        if not clients:
+            continue
+        errors = [r for r in results if "error" in r]
+        fast = [r for r in results if "error" not in r and not r["slow"]]
+        slow = [r for r in results if "error" not in r and r["slow"]]
+        in_sync = sum(r["state"] == final for r in fast)
+        print(f"server: {stats}")
+        print(f"commands received by the frame loop: {commands}")
+        if fast:
+            msgs = np.array([r["messages"] for r in fast])
+            print(f"fast subscribers: {len(fast)}, {msgs.mean() / args.seconds:.1f} msg/s each, "
+                  f"{np.mean([r['bytes'] / max(r['messages'], 1) for r in fast]):.0f} B/msg, "
+                  f"final state correct on {in_sync}/{len(fast)}")
+        if slow:
+            print(f"slow subscribers: {len(slow)}, {np.mean([r['messages'] for r in slow]):.1f} msgs each")
+        if errors:
+            print(f"{len(errors)} subscriber(s) failed, e.g. {errors[0]['error']}")
+
+
+if __name__ == "__main__":
+    main()
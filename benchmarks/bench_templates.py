@@ -0,0 +1,148 @@
+"""
+Template registry: exercise switch cost (registry lookup vs. re-reading and parsing the JSON file)
+hot reload of an edited template, including an invalid edit, and concurrent installs from several
+threads (none may be lost). Also checks that a malformed template is rejected by the offline rule
+loader (rules.load_program, used by replay and batch analysis) exactly as by the live registry.
+
+    python benchmarks/bench_templates.py
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rules import EXERCISES, TEMPLATE_DIR, load_program
+from template_registry import TemplateError, TemplateRegistry
+
+
+def read_template(name):
+    # What every exercise switch used to do
+    try:
+        with open(os.path.join(TEMPLATE_DIR, f"{name}.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"target_angles": {"knee_angle": 100}, "tolerance": 20}
+
+
+def bench_switch(rounds=2000):
+    start = time.perf_counter()
+    registry = TemplateRegistry()
+    print(f"  startup: {len(registry.keys())} templates loaded and validated in "
+          f"{(time.perf_counter() - start) * 1e3:.1f} ms")
+    for key, warnings in registry.warnings().items():
+        print(f"    {key}: {'; '.join(warnings)}")
+    for label, fn in (("re-read JSON", read_template), ("registry.get", registry.get)):
+        times = np.empty(rounds)
+        for i in range(rounds):
+            t0 = time.perf_counter()
+            fn(EXERCISES[i % len(EXERCISES)])
+            times[i] = time.perf_counter() - t0
+        print(f"  switch via {label:<13} p50 {np.median(times) * 1e6:8.2f} us  p99 {np.percentile(times, 99) * 1e6:8.2f} us")
+
+
+def check_reload():
+    with tempfile.TemporaryDirectory() as tmp:
+        template_dir = os.path.join(tmp, "templates")
+        shutil.copytree(TEMPLATE_DIR, template_dir)
+        registry = TemplateRegistry(template_dir)
+        path = os.path.join(template_dir, "squat.json")
+        old = registry.get("squat")
+
+        def edit(change):
+            with open(path, "r") as f:
+                data = json.load(f)
+            change(data)
+            with open(path, "w") as f:
+                json.dump(data, f)
+            # Make the change visible on filesystems with coarse mtimes
+            os.utime(path, (time.time(), old.mtime + 10 + registry.reloads))
+            return registry.check_for_changes()
+
+        reloaded = edit(lambda d: d.update(tolerance=25))
+        print(f"  valid edit:   reloaded {reloaded}, tolerance {old.tolerance:g} -> {registry.get('squat').tolerance:g}")
+        good = registry.get("squat")
+        reloaded = edit(lambda d: d.update(tolerance="wide"))
+        kept = registry.get("squat") is good
+        print(f"  invalid edit: reloaded {reloaded}, previous version kept: {kept}")
+        print(f"  unchanged:    reloaded {registry.check_for_changes()}")
+
+
+def check_concurrent_installs(threads=4, keys=300):
+    """Threads installing different keys at once, as the watcher and get() can: every key must survive."""
+    registry = TemplateRegistry()
+    template = registry.get("squat")
+    batches = [[template._replace(key=f"custom_{t}_{i}") for i in range(keys)] for t in range(threads)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible to provoke interleaving
+    try:
+        workers = [threading.Thread(target=lambda batch=batch: [registry._install(t) for t in batch])
+                   for batch in batches]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    finally:
+        sys.setswitchinterval(interval)
+    lost = threads * keys - sum(key.startswith("custom_") for key in registry.keys())
+    print(f"  {threads} threads x {keys} installs: {lost} lost")
+    return lost == 0
+
+
+MALFORMED = {
+    "tolerance": lambda d: d.update(tolerance="wide"),
+    "rep metric": lambda d: d["rules"]["rep"].update(metric="no_such_angle"),
+    "unparsable": None,
+}
+
+
+def check_offline_validation():
+    """Each malformed squat.json must be refused both live (registry) and offline (load_program)."""
+    ok = True
+    for label, change in MALFORMED.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            template_dir = os.path.join(tmp, "templates")
+            shutil.copytree(TEMPLATE_DIR, template_dir)
+            path = os.path.join(template_dir, "squat.json")
+            with open(path, "r") as f:
+                data = json.load(f)
+            with open(path, "w") as f:
+                if change is None:
+                    f.write(json.dumps(data)[:-10])
+                else:
+                    change(data)
+                    json.dump(data, f)
+            refused = {}
+            for side, load in (("offline", lambda: load_program("squat", template_dir)),
+                               ("live", lambda: TemplateRegistry(template_dir))):
+                try:
+                    load()
+                    refused[side] = False
+                except TemplateError:
+                    refused[side] = True
+            print(f"  {label:<11} refused offline: {refused['offline']}, live: {refused['live']}")
+            ok &= refused["offline"] and refused["live"]
+    return ok
+
+
+def main():
+    print("Exercise switch:")
+    bench_switch()
+    print("Hot reload:")
+    check_reload()
+    print("Concurrent installs:")
+    ok = check_concurrent_installs()
+    print("Malformed templates:")
+    ok &= check_offline_validation()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
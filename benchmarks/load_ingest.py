@@ -0,0 +1,179 @@
+"""
+Load generator for ingest_server.py: replays synthetic landmark streams from many simulated
+devices and reports sessions per core and tail latency.
+
+    python benchmarks/load_ingest.py --table-only                  # batched tick cost vs. one Python pass per session
+    python benchmarks/load_ingest.py --sessions 1000 --seconds 10  # end to end over WebSockets (starts a server)
+    python benchmarks/load_ingest.py --url ws://host:8766 --sessions 2000 --procs 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest_server import IngestServer, SessionTable, encode_frame
+from rules import EXERCISES
+from run_benchmarks import synthetic_stream
+from session import ExerciseSession
+
+
+def bench_table(sizes=(100, 1000, 4000), fps=30.0, ticks=60):
+    """Rule evaluation alone: one batched tick vs. ExerciseSession.update() per session."""
+    stream = synthetic_stream(600).astype(np.float32)
+    print(f"{'sessions':>9} {'batched ms/tick':>16} {'per-session ms':>15} {'speedup':>8} {'sessions/core @%g FPS':>22}"
+          % fps)
+    for n in sizes:
+        table = SessionTable(n)
+        sessions = []
+        for i in range(n):
+            table.open(EXERCISES[i % len(EXERCISES)])
+            sessions.append(ExerciseSession())
+            sessions[-1].select(EXERCISES[i % len(EXERCISES)])
+        offsets = np.arange(n) * 7 % len(stream)
+
+        batched = np.empty(ticks)
+        for t in range(ticks):
+            frames = stream[(offsets + t) % len(stream)]
+            for slot in range(n):
+                table.push(slot, frames[slot], t / fps, 0.0)
+            t0 = time.perf_counter()
+            table.tick()
+            batched[t] = time.perf_counter() - t0
+
+        loop_ticks = max(3, ticks // 10)
+        looped = np.empty(loop_ticks)
+        for t in range(loop_ticks):
+            frames = stream[(offsets + t) % len(stream)].astype(np.float64)
+            t0 = time.perf_counter()
+            for i, s in enumerate(sessions):
+                s.update(frames[i], t / fps)
+            looped[t] = time.perf_counter() - t0
+
+        b, l = np.median(batched), np.median(looped)
+        print(f"{n:>9} {b * 1e3:16.2f} {l * 1e3:15.2f} {l / b:7.1f}x {n / (b * fps):22.0f}")
+
+
+async def device(url, stream, offset, exercise, fps, deadline, latencies, counts):
+    from websockets.asyncio.client import connect
+
+    async with connect(url, compression=None, max_queue=None) as ws:
+        await ws.send(json.dumps({"type": "hello", "exercise": exercise}))
+
+        async def reader():
+            async for raw in ws:
+                msg = json.loads(raw)
+                if "ts" in msg:
+                    latencies.append(time.time() - msg["ts"])
+                counts["received"] += 1
+
+        read_task = asyncio.create_task(reader())
+        loop = asyncio.get_running_loop()
+        i, next_t = offset, loop.time()
+        while time.time() < deadline:
+            await ws.send(encode_frame(stream[i % len(stream)], time.time()))
+            counts["sent"] += 1
+            i += 1
+            next_t += 1.0 / fps
+            await asyncio.sleep(max(0.0, next_t - loop.time()))
+        await asyncio.sleep(0.2)
+        read_task.cancel()
+
+
+def device_process(url, first, count, fps, deadline, out):
+    stream = synthetic_stream(600, seed=first).astype(np.float32)
+    latencies, counts = [], {"sent": 0, "received": 0}
+
+    async def run():
+        tasks = [device(url, stream, (first + i) * 7, EXERCISES[(first + i) % len(EXERCISES)], fps, deadline,
+                        latencies, counts) for i in range(count)]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    errors = [repr(r) for r in asyncio.run(run()) if isinstance(r, BaseException)]
+    out.put({"latencies": latencies, "errors": errors, **counts})
+
+
+def server_process(port, capacity, tick_hz, ready):
+    asyncio.run(IngestServer(port=port, capacity=capacity, tick_hz=tick_hz).serve(ready=ready.put))
+
+
+async def fetch_stats(url):
+    from websockets.asyncio.client import connect
+
+    async with connect(url) as ws:
+        await ws.recv()  # initial state
+        await ws.send(json.dumps({"type": "stats"}))
+        while True:
+            msg = json.loads(await ws.recv())
+            if msg.get("type") == "stats":
+                return msg
+
+
+def bench_network(url, sessions, fps, seconds, procs, tick_hz):
+    server = None
+    if url is None:
+        ready = mp.Queue()
+        server = mp.Process(target=server_process, args=(0, max(sessions + 16, 64), tick_hz, ready), daemon=True)
+        server.start()
+        url = f"ws://127.0.0.1:{ready.get(timeout=30)}"
+
+    # Devices start together after a connect grace period
+    deadline = time.time() + 3.0 + seconds
+    out = mp.Queue()
+    per_proc = [sessions // procs + (i < sessions % procs) for i in range(procs)]
+    workers, first = [], 0
+    for count in per_proc:
+        workers.append(mp.Process(target=device_process, args=(url, first, count, fps, deadline, out)))
+        first += count
+    for p in workers:
+        p.start()
+    results = [out.get() for _ in workers]
+    for p in workers:
+        p.join()
+    stats = asyncio.run(fetch_stats(url))
+    if server is not None:
+        server.terminate()
+
+    latencies = np.concatenate([r["latencies"] for r in results] or [[]]) * 1000
+    sent = sum(r["sent"] for r in results)
+    errors = [e for r in results for e in r["errors"]]
+    print(f"{sessions} devices at {fps:g} FPS for ~{seconds:g}s -> {url}")
+    print(f"  sent {sent} frames ({sent / (seconds + 3.0):.0f}/s), received {sum(r['received'] for r in results)} results")
+    if len(latencies):
+        print(f"  device round trip (frame sent -> result received): p50 {np.percentile(latencies, 50):.1f} ms, "
+              f"p99 {np.percentile(latencies, 99):.1f} ms, max {latencies.max():.1f} ms")
+    print(f"  server: {stats}")
+    # One worker process does all the rule evaluation and result encoding: its busy share of a tick
+    # bounds sessions per core (on a machine shared with the device simulators this is pessimistic)
+    busy = stats["tick_ms_p50"] / (1000.0 / tick_hz)
+    if busy > 0:
+        print(f"  tick p50 {stats['tick_ms_p50']:.2f} ms = {busy:.1%} of a {1000 / tick_hz:.1f} ms tick "
+              f"(~{sessions / busy:.0f} sessions/core)")
+    if errors:
+        print(f"  {len(errors)} device(s) failed, e.g. {errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table-only", action="store_true", help="Only time the batched rule evaluation")
+    parser.add_argument("--url", default=None, help="Running ingest server (default: start one locally)")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--fps", type=float, default=30.0, help="Frames per second per device")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--procs", type=int, default=2, help="Device simulator processes")
+    parser.add_argument("--tick-hz", type=float, default=30.0)
+    args = parser.parse_args()
+
+    bench_table(fps=args.fps)
+    if not args.table_only:
+        bench_network(args.url, args.sessions, args.fps, args.seconds, args.procs, args.tick_hz)
+
+
+if __name__ == "__main__":
+    main()
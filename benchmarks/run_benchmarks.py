@@ -0,0 +1,263 @@
+"""
+Camera-free benchmark suite for every stage of the frame loop, at 480p, 720p and 1080p.
+Reports p50/p99 latency and peak temporary allocation per frame, and compares against a
+saved baseline.
+
+    python benchmarks/run_benchmarks.py                              # measure and print
+    python benchmarks/run_benchmarks.py --save-baseline              # store benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare --threshold 0.25   # exit 1 on a >25% p50 regression
+    python benchmarks/run_benchmarks.py --recording sessions/patient01 --stages rules hud
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main as frame_loop
+from biomechanics import calculate_angle, get_joint_angles
+from clock import VirtualClock
+from frame_buffers import FrameBuffers
+from ghost_coach import GhostCoach, GhostSpriteCache
+from pose_engine import PoseEngine
+from recording import load_recording
+from rules import EXERCISES, compile_all, create_state, evaluate_exercise
+from ui_manager import UIManager
+
+RESOLUTIONS = {"480p": (480, 640), "720p": (720, 1280), "1080p": (1080, 1920)}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Absolute slack so microsecond-level stages do not fail on timer noise
+NOISE_FLOOR_US = 5.0
+
+
+def synthetic_stream(frames, seed=0):
+    """A squat-like landmark stream: ghost coach poses with detector-like jitter and visibility."""
+    coach = GhostCoach()
+    rng = np.random.default_rng(seed)
+    stream = np.empty((frames, 33, 4))
+    for i in range(frames):
+        progress = (1 - np.cos(i / 60 * 2 * np.pi)) / 2
+        stream[i] = coach.get_animated_pose("squat", i * 33, user_progress=progress)
+    stream[:, :, :3] += rng.normal(0, 0.003, (frames, 33, 3))
+    stream[:, :, 3] = rng.uniform(0.85, 1.0, (frames, 33))
+    return stream
+
+
+def as_results(landmarks):
+    """Wraps a (33, 4) array the way the MediaPipe Tasks API returns a result."""
+    return SimpleNamespace(pose_landmarks=[[SimpleNamespace(x=x, y=y, z=z, visibility=v)
+                                            for x, y, z, v in landmarks.tolist()]])
+
+
+class ReplayEngine:
+    """PoseEngine stand-in that hands out pre-built results; drawing and conversion are the real code."""
+    get_landmarks_array = PoseEngine.get_landmarks_array
+    draw_landmarks = PoseEngine.draw_landmarks
+    draw_landmarks_array = PoseEngine.draw_landmarks_array
+
+    def request_inference(self):
+        pass
+
+
+def make_stages(h, w, stream, results):
+    """name -> fn(i) for frame index i; each stage gets its own inputs so they can run in isolation."""
+    n = len(stream)
+    engine = ReplayEngine()
+    coach = GhostCoach()
+    # Sprite rendering is a one-off cost per phase bucket; measure the steady state
+    sprites = GhostSpriteCache(coach)
+    sprites.warm(["squat"], (h, w))
+    ui = UIManager()
+    frame = np.random.default_rng(1).integers(0, 256, (h, w, 3), dtype=np.uint8)
+    panel = np.zeros((h, w, 3), dtype=np.uint8)
+    canvas = np.zeros((h, w * 2, 3), dtype=np.uint8)
+    buffers = FrameBuffers()
+    rule_state = create_state(EXERCISES)
+    ctx = frame_loop.create_context()
+    ctx["clock"] = VirtualClock()
+    ctx["coach_cache"] = sprites
+
+    def rules(i):
+        # Rotate through the exercises like a session would, 300 frames each
+        evaluate_exercise(rule_state, EXERCISES[(i // 300) % len(EXERCISES)], stream[i % n], now=i / 30.0)
+
+    def ghost_render(i):
+        panel[:] = 0
+        pose = coach.get_animated_pose("squat", i * 33, user_progress=0.5)
+        coach.render(panel, pose, color=(0, 255, 255), offset=(0, 0))
+
+    def compose(i):
+        buffers.compose(frame)
+
+    def render_frame(i):
+        ctx["clock"].set(i / 30.0)
+        frame_loop.render_frame(frame, results[i % n], ctx, engine, coach, ui)
+
+    return {
+        "get_landmarks_array": lambda i: engine.get_landmarks_array(results[i % n]),
+        "get_joint_angles": lambda i: get_joint_angles(stream[i % n]),
+        "calculate_angle": lambda i: calculate_angle(stream[i % n, 23, :2], stream[i % n, 25, :2], stream[i % n, 27, :2]),
+        "rules": rules,
+        "ghost_pose": lambda i: coach.get_animated_pose("squat", i * 33, user_progress=(i % 60) / 60),
+        "ghost_render": ghost_render,
+        "ghost_sprite": lambda i: sprites.render(panel, "squat", i * 33, user_progress=(i % 60) / 60),
+        "draw_landmarks": lambda i: engine.draw_landmarks(frame, results[i % n], color=(0, 255, 136)),
+        "render_hud": lambda i: ui.render_hud(canvas, "squat", i // 60, i % 90 < 60, (i % 60) / 60),
+        "compose": compose,
+        "render_frame": render_frame,
+    }
+
+
+def time_stage(fn, frames, warmup, repeats=3):
+    """
+    p50 is the best median of 'repeats' rounds (robust to a busy machine), p99 is taken over
+    all rounds. Both in microseconds.
+    """
+    for i in range(warmup):
+        fn(i)
+    samples = np.empty((repeats, frames))
+    for r in range(repeats):
+        for i in range(frames):
+            t0 = time.perf_counter_ns()
+            fn(warmup + i)
+            samples[r, i] = time.perf_counter_ns() - t0
+    return float(np.median(samples, axis=1).min()) / 1e3, float(np.percentile(samples, 99)) / 1e3
+
+
+def alloc_stage(fn, frames, warmup):
+    """Mean peak of memory allocated (and not yet freed) during one call, in bytes."""
+    frames = min(frames, 100)
+    tracemalloc.start()
+    try:
+        peaks = np.empty(frames)
+        for i in range(frames):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(warmup + i)
+            peaks[i] = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return float(peaks.mean())
+
+
+def reference_us(repeats=5):
+    """
+    Time of a fixed mix of interpreter and numpy work. Baseline comparisons are scaled by its
+    ratio between runs, so a machine that is busier or clocked differently today does not
+    read as a regression.
+    """
+    data = np.random.default_rng(0).random((256, 256))
+
+    def workload():
+        total = 0
+        for i in range(2000):
+            total += i * i
+        np.sort(data, axis=1)
+        return total
+
+    return time_stage(lambda i: workload(), 50, 5, repeats)[0]
+
+
+def run_suite(stream, frames=300, warmup=30, stages=None, repeats=3, resolutions=RESOLUTIONS):
+    results = [as_results(lm) for lm in stream]
+    report = {}
+    for res_name, (h, w) in resolutions.items():
+        for name, fn in make_stages(h, w, stream, results).items():
+            if stages and name not in stages:
+                continue
+            p50, p99 = time_stage(fn, frames, warmup, repeats)
+            report[f"{name}@{res_name}"] = {"p50_us": p50, "p99_us": p99,
+                                            "alloc_kb": alloc_stage(fn, frames, warmup) / 1024}
+    return report
+
+
+def format_report(report, baseline=None, speed_ratio=1.0):
+    lines = [f"{'stage':<30} {'p50 us':>10} {'p99 us':>10} {'alloc KiB':>10}" + ("   vs baseline p50" if baseline else "")]
+    for key, r in report.items():
+        line = f"{key:<30} {r['p50_us']:10.1f} {r['p99_us']:10.1f} {r['alloc_kb']:10.1f}"
+        if baseline and key in baseline:
+            line += f"   {(r['p50_us'] / (baseline[key]['p50_us'] * speed_ratio) - 1) * 100:+6.1f}%"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def compare(report, baseline, threshold, speed_ratio=1.0):
+    """
+    Stages whose p50 got slower than baseline by more than 'threshold' (fraction) plus the noise
+    floor. 'speed_ratio' (reference time now / in the baseline) rescales the baseline first.
+    """
+    failures = []
+    for key, r in report.items():
+        if key not in baseline:
+            continue
+        limit = baseline[key]["p50_us"] * speed_ratio * (1 + threshold) + NOISE_FLOOR_US
+        if r["p50_us"] > limit:
+            failures.append(f"{key}: p50 {r['p50_us']:.1f} us > {limit:.1f} us (baseline {baseline[key]['p50_us']:.1f} us)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=300, help="Timed frames per stage and resolution")
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=3, help="Timing rounds per stage (best p50 is kept)")
+    parser.add_argument("--recording", default=None, help="Landmark recording to use instead of the synthetic stream")
+    parser.add_argument("--stages", nargs="+", default=None, help="Only run these stages")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail if a stage regressed past --threshold")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed p50 slowdown as a fraction")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    compile_all(EXERCISES)
+    if args.recording:
+        landmarks = load_recording(args.recording)[0]
+        stream = np.asarray(landmarks[~np.isnan(landmarks[:, 0, 0])], dtype=np.float64)
+    else:
+        stream = synthetic_stream(600)
+    ref_before = reference_us()
+    report = run_suite(stream, args.frames, args.warmup, args.stages, args.repeats)
+    reference = (ref_before + reference_us()) / 2
+
+    baseline, speed_ratio = None, 1.0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r") as f:
+            saved = json.load(f)
+        baseline = saved["stages"]
+        speed_ratio = reference / saved.get("reference_us", reference)
+        print(f"Machine speed vs baseline: reference workload {reference:.0f} us "
+              f"(baseline {saved.get('reference_us', reference):.0f} us)")
+    print(format_report(report, baseline, speed_ratio))
+
+    data = {"machine": platform.platform(), "python": platform.python_version(),
+            "reference_us": reference, "stages": report}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(data, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(data, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if args.compare:
+        if baseline is None:
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+            return 2
+        failures = compare(report, baseline, args.threshold, speed_ratio)
+        if failures:
+            print(f"{len(failures)} stage(s) regressed more than {args.threshold:.0%}:")
+            print("\n".join(f"  {f}" for f in failures))
+            return 1
+        print(f"No stage regressed more than {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,45 +20,55 @@ def calculate_angle(a, b, c):
 
     return angle
 
+# Clinically relevant joint angles as (name, point A, vertex B, point C) MediaPipe landmark IDs.
+# Hip: 24 (R), 23 (L) | Knee: 26 (R), 25 (L) | Ankle: 28 (R), 27 (L) | Foot index: 32 (R), 31 (L)
+# Shoulder: 12 (R), 11 (L) | Elbow: 14 (R), 13 (L) | Wrist: 16 (R), 15 (L)
+ANGLE_DEFINITIONS = [
+    ("right_knee", 24, 26, 28),
+    ("left_knee", 23, 25, 27),
+    ("right_hip", 12, 24, 26),
+    ("left_hip", 11, 23, 25),
+    ("right_elbow", 12, 14, 16),
+    ("left_elbow", 11, 13, 15),
+    ("right_shoulder", 24, 12, 14),
+    ("left_shoulder", 23, 11, 13),
+    ("right_ankle", 26, 28, 32),
+    ("left_ankle", 25, 27, 31),
+]
+ANGLE_NAMES = [d[0] for d in ANGLE_DEFINITIONS]
+ANGLE_INDEX = {name: i for i, name in enumerate(ANGLE_NAMES)}
+
+# Gather indices: all A points, then all vertices, then all C points
+_ANGLE_POINTS = np.array([d[1] for d in ANGLE_DEFINITIONS] +
+                         [d[2] for d in ANGLE_DEFINITIONS] +
+                         [d[3] for d in ANGLE_DEFINITIONS])
+
+def compute_angle_table(landmarks):
+    """
+    Computes every angle in ANGLE_DEFINITIONS in a single vectorized pass (degrees, 0-180).
+    landmarks: (33, 4) array for one frame -> (K,) or (N, 33, 4) batch -> (N, K).
+    Columns follow ANGLE_NAMES; frames with NaN landmarks yield NaN angles.
+    """
+    k = len(ANGLE_DEFINITIONS)
+    pts = np.asarray(landmarks)[..., _ANGLE_POINTS, :2]
+    b = pts[..., k:2 * k, :]
+    ba = pts[..., :k, :] - b
+    bc = pts[..., 2 * k:, :] - b
+    bax, bay = ba[..., 0], ba[..., 1]
+    bcx, bcy = bc[..., 0], bc[..., 1]
+    # Unsigned angle between BA and BC: same result as calculate_angle with one arctan2 per angle
+    cross = np.abs(bax * bcy - bay * bcx)
+    dot = bax * bcx + bay * bcy
+    return np.degrees(np.arctan2(cross, dot))
+
 def get_joint_angles(landmarks):
     """
-    Extracts key physiotherapy angles from pose landmarks.
+    Extracts key physiotherapy angles from pose landmarks (see ANGLE_DEFINITIONS).
     """
     if landmarks is None:
         return {}
 
-    # MediaPipe Landmark IDs:
-    # Hip: 24 (R), 23 (L)
-    # Knee: 26 (R), 25 (L)
-    # Ankle: 28 (R), 27 (L)
-    # Shoulder: 12 (R), 11 (L)
-
-    # Right Knee Angle
-    r_hip = landmarks[24][:2]
-    r_knee = landmarks[26][:2]
-    r_ankle = landmarks[28][:2]
-    r_knee_angle = calculate_angle(r_hip, r_knee, r_ankle)
-
-    # Left Knee Angle
-    l_hip = landmarks[23][:2]
-    l_knee = landmarks[25][:2]
-    l_ankle = landmarks[27][:2]
-    l_knee_angle = calculate_angle(l_hip, l_knee, l_ankle)
-
-    # Right Hip Angle (Shoulder, Hip, Knee)
-    r_shoulder = landmarks[12][:2]
-    r_hip_angle = calculate_angle(r_shoulder, r_hip, r_knee)
-
-    # Left Hip Angle
-    l_shoulder = landmarks[11][:2]
-    l_hip_angle = calculate_angle(l_shoulder, l_hip, l_knee)
-
-    return {
-        "right_knee": r_knee_angle,
-        "left_knee": l_knee_angle,
-        "right_hip": r_hip_angle,
-        "left_hip": l_hip_angle
-    }
+    return dict(zip(ANGLE_NAMES, compute_angle_table(landmarks).tolist()))
 
 def normalize_landmarks(landmarks):
     """
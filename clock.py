@@ -0,0 +1,25 @@
+import time
+
+class SystemClock:
+    """
+    Wall clock used by the live application.
+    """
+    def now(self):
+        return time.time()
+
+class VirtualClock:
+    """
+    Manually driven clock for replays: time only moves when it is set or advanced,
+    so recorded sessions run as fast as the CPU allows with unchanged rep cooldowns.
+    """
+    def __init__(self, start=0.0):
+        self._now = float(start)
+
+    def now(self):
+        return self._now
+
+    def set(self, t):
+        self._now = float(t)
+
+    def advance(self, dt):
+        self._now += dt
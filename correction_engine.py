@@ -1,55 +1,150 @@
 import numpy as np
 
+# Guidance weight per landmark: hips and knees lead, shoulders and ankles follow, the rest is ignored
+MAJOR_JOINTS = {11: 0.6, 12: 0.6, 23: 1.0, 24: 1.0, 25: 1.0, 26: 1.0, 27: 0.5, 28: 0.5}
+JOINT_WEIGHTS = np.zeros(33)
+JOINT_WEIGHTS[list(MAJOR_JOINTS)] = list(MAJOR_JOINTS.values())
+
+
+def _align_batch(user, target, out):
+    """
+    Maps (N, 33, >=2) user landmarks onto the target's hip center and torso length -> out (N, 33, 2).
+    The camera frame and the coach panel differ in position and scale; only the pose should count.
+    """
+    user_hip = (user[:, 23, :2] + user[:, 24, :2]) / 2
+    target_hip = (target[..., 23, :2] + target[..., 24, :2]) / 2
+    user_torso = np.hypot(*((user[:, 11, :2] + user[:, 12, :2]) / 2 - user_hip).T)
+    target_torso = np.hypot(*((target[..., 11, :2] + target[..., 12, :2]) / 2 - target_hip).T)
+    scale = target_torso / np.maximum(user_torso, 1e-6)
+    np.subtract(user[:, :, :2], user_hip[:, None], out=out)
+    out *= np.reshape(scale, (-1, 1, 1))
+    out += np.reshape(target_hip, (-1, 1, 2))
+    return out
+
+
 class CorrectionEngine:
     """
     Elite Level Logic: Calculates the 'Force Vector' to pull the user's joints
     into the correct positions and translates this into ghost movement.
+
+    The force vector is a displacement field (target - user, after aligning the user's hips and torso
+    length onto the target) over the major joints, weighted per joint and by landmark visibility, and
+    smoothed over time: field = smoothing * previous field + (1 - smoothing) * new field. All per-frame
+    work happens in preallocated buffers; correct_batch() gives the same result for whole sequences.
     """
-    def __init__(self, smoothing=0.2):
-        self.smoothing = smoothing
+    def __init__(self, smoothing=0.2, gain=1.0, weights=JOINT_WEIGHTS):
+        self.smoothing = float(smoothing)
+        self.gain = float(gain)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        # Smoothed field of the last frame with a body (None until then / after tracking loss)
+        self.last_correction = None
+        self._field = np.zeros((33, 2))
+        self._raw = np.empty((1, 33, 2))
+        self._weight = np.empty((33, 1))
+        self._ghost = np.empty((33, 4))
+
+    def reset(self):
         self.last_correction = None
 
     def calculate_correction(self, user_landmarks, target_landmarks):
         """
-        Compares user pose to target pose and returns a displacement vector.
+        Compares user pose to target pose and returns the smoothed (33, 2) displacement field that
+        moves the user onto the target (an internal buffer, overwritten by the next call).
+        Returns None without a body.
         """
-        if user_landmarks is None or target_landmarks is None:
+        if user_landmarks is None or target_landmarks is None or np.isnan(user_landmarks[23:25, :2]).any():
+            self.reset()
             return None
-            
-        # We focus on major joints for guidance: Hips, Knees, Shoulders
-        major_indices = [11, 12, 23, 24, 25, 26]
-        
-        # Displacement vector (Target - User)
-        # We want to show where the user SHOULD be
-        diff = target_landmarks[:, :2] - user_landmarks[:, :2]
-        
-        return diff
-
-    def get_corrected_ghost(self, base_ghost_pose, user_landmarks, target_angles, current_angles):
-        """
-        Modifies the ghost pose to guide the user towards target angles.
-        Example: If user's knee angle is 120 and target is 90, 
-        the ghost knee should emphasize 'going lower'.
-        """
-        if user_landmarks is None:
+        raw = _align_batch(user_landmarks[None], target_landmarks, self._raw)[0]
+        np.subtract(target_landmarks[:, :2], raw, out=raw)
+        np.multiply(self.weights[:, None], user_landmarks[:, 3:4], out=self._weight)
+        raw *= self._weight
+        if self.last_correction is None:
+            self._field[:] = raw
+        else:
+            self._field *= self.smoothing
+            raw *= 1.0 - self.smoothing
+            self._field += raw
+        self.last_correction = self._field
+        return self._field
+
+    def get_corrected_ghost(self, base_ghost_pose, user_landmarks):
+        """
+        Exaggerates the ghost along the correction field: where the user is too high, the ghost
+        goes lower still; where the knees cave in, the ghost's knees move out. Returns the base
+        pose unchanged without a body, otherwise an internal (33, 4) buffer.
+        """
+        field = self.calculate_correction(user_landmarks, base_ghost_pose)
+        if field is None:
             return base_ghost_pose
-            
-        corrected_pose = base_ghost_pose.copy()
-        
-        # Knee correction (Dynamic height adjustment)
-        target_k = target_angles.get('knee_angle', 90)
-        current_k = (current_angles.get('left_knee', 180) + current_angles.get('right_knee', 180)) / 2
-        
-        # If user is too high (angle > target), move ghost slightly lower than target to emphasize depth
-        error = current_k - target_k
-        if error > 10:
-            # Move ghost joints downward (higher Y)
-            correction_y = 0.05 
-            # Apply to lower body 
-            corrected_pose[23:29, 1] += correction_y
-        elif error < -10:
-            # Move ghost upward
-            correction_y = -0.05
-            corrected_pose[23:29, 1] += correction_y
-            
-        return corrected_pose
+        ghost = self._ghost
+        ghost[:] = base_ghost_pose
+        ghost[:, :2] += np.multiply(field, self.gain, out=self._raw[0])
+        return ghost
+
+    def correct_batch(self, user_landmarks, target_landmarks):
+        """
+        calculate_correction() / get_corrected_ghost() for a whole (N, 33, 4) sequence (NaN rows = no
+        body) against one (33, 4) target or (N, 33, 4) targets, continuing from this engine's state.
+        Returns (fields (N, 33, 2), ghosts (N, 33, 4)); fields are 0 and ghosts the target without a body.
+        """
+        user = np.asarray(user_landmarks, dtype=np.float64)
+        target = np.asarray(target_landmarks, dtype=np.float64)
+        n = len(user)
+        body = ~np.isnan(user[:, 23:25, :2]).any(axis=(1, 2))
+        raw = _align_batch(user, target, np.empty((n, 33, 2)))
+        np.subtract(target[..., :2], raw, out=raw)
+        raw *= self.weights[:, None] * user[:, :, 3:4]
+        raw[~body] = 0.0
+
+        fields = self._smooth(raw, body)
+        ghosts = np.empty((n, 33, 4))
+        ghosts[:] = target
+        ghosts[:, :, :2] += self.gain * fields
+        if n:
+            if body[-1]:
+                self._field[:] = fields[-1]
+                self.last_correction = self._field
+            else:
+                self.reset()
+        return fields, ghosts
+
+    def _smooth(self, raw, body):
+        """
+        The recursive smoothing over a sequence without a per-frame loop. Within a block of B frames
+            field[n] = s^n * (field[-1] + sum over k <= n of s^-k * (1 - s) * raw[k]),
+        a cumulative sum; a frame after tracking loss restarts the sum at its own raw value.
+        B keeps s^-B finite.
+        """
+        s = self.smoothing
+        n = len(raw)
+        fields = np.zeros_like(raw)
+        if n == 0:
+            return fields
+        restart = body.copy()
+        restart[1:] &= ~body[:-1]
+        if self.last_correction is None:
+            restart[0] = body[0]
+        else:
+            restart[0] = False
+        if s == 0.0:
+            fields[body] = raw[body]
+            return fields
+        block = max(1, min(256, int(600 / -np.log(s)))) if s < 1.0 else n
+        carry = self._field.copy() if self.last_correction is not None else np.zeros((33, 2))
+        for start in range(0, n, block):
+            end = min(n, start + block)
+            k = np.arange(end - start)
+            scaled = raw[start:end] * np.where(restart[start:end], 1.0, 1.0 - s)[:, None, None]
+            scaled *= (s ** -k.astype(np.float64))[:, None, None]
+            sums = np.cumsum(scaled, axis=0)
+            # Frames since the last restart inside this block only sum from there; earlier ones carry in
+            last = np.maximum.accumulate(np.where(restart[start:end], k, -1))
+            before = np.where(last > 0, last - 1, 0)
+            sums -= np.where((last > 0)[:, None, None], sums[before], 0.0)
+            sums += np.where((last < 0)[:, None, None], carry * s, 0.0)
+            block_fields = sums * (s ** k.astype(np.float64))[:, None, None]
+            block_fields[~body[start:end]] = 0.0
+            fields[start:end] = block_fields
+            carry = block_fields[-1] if body[end - 1] else np.zeros((33, 2))
+        return fields
@@ -0,0 +1,270 @@
+import argparse
+import os
+
+import numpy as np
+
+from biomechanics import ANGLE_INDEX, compute_angle_table
+from recording import load_recording
+from rules import EXERCISES, load_program
+from template_registry import default_registry
+
+# Joint angles compared per exercise (see biomechanics.ANGLE_DEFINITIONS)
+DTW_JOINTS = {
+    "squat": ["left_knee", "right_knee", "left_hip", "right_hip"],
+    "lunge": ["left_knee", "right_knee", "left_hip", "right_hip"],
+    "jumping_jacks": ["left_shoulder", "right_shoulder", "left_hip", "right_hip"],
+    "high_knees": ["left_hip", "right_hip", "left_knee", "right_knee"],
+    "bicep_curl": ["left_elbow", "right_elbow", "left_shoulder", "right_shoulder"],
+    "shoulder_press": ["left_elbow", "right_elbow", "left_shoulder", "right_shoulder"],
+    "calf_raises": ["left_ankle", "right_ankle", "left_knee", "right_knee"],
+    "torso_twist": ["left_shoulder", "right_shoulder", "left_hip", "right_hip"],
+}
+ALL_JOINTS = list(ANGLE_INDEX)
+
+
+def joint_columns(exercise):
+    return np.array([ANGLE_INDEX[name] for name in DTW_JOINTS.get(exercise, ALL_JOINTS)], dtype=np.intp)
+
+
+def reference_angles(template, exercise=None):
+    """
+    (L, J) joint-angle trajectory of one reference rep from a template's ideal pose, which must be a
+    (frames, 33, k) sequence. None when the template has no usable ideal pose, or when the exercise's
+    depth gauge is a constant: rep windows open at the top of the movement read off the depth, so
+    such an exercise (torso_twist) never gets a window and is not scored.
+    """
+    pose = template.ideal_pose
+    if pose is None or pose.ndim != 3 or len(pose) < 2:
+        return None
+    if template.program is not None and template.program.depth_constant is not None:
+        return None
+    angles = compute_angle_table(np.asarray(pose[..., :2], dtype=np.float64))
+    return angles[:, joint_columns(exercise or template.key)]
+
+
+class BandedDTW:
+    """
+    Dynamic time warping of a query that arrives one frame at a time against a fixed (L, J) reference.
+
+    Only the newest row of the cost matrix is kept. A row is
+        D[i, j] = c[i, j] + min(D[i-1, j], D[i-1, j-1], D[i, j-1])
+    and the D[i, j-1] dependency is unrolled into a prefix minimum, so each row is a handful of
+    vectorized operations over L cells: with S = cumsum(c[i]) and A[j] = min(D[i-1, j], D[i-1, j-1]),
+        D[i, j] = S[j] + min over k <= j of (A[k] - S[k-1]).
+    The warping path is kept inside a slope band: query frame i may only align with reference frames
+    between (i+1)/stretch and (i+1)*stretch, so a rep can be at most 'stretch' times slower or faster
+    than the reference and at most stretch * L frames long.
+
+    All operations work on (..., L) rows, so BatchDTW below runs the same arithmetic for many queries.
+    """
+    def __init__(self, reference, stretch=3.0):
+        self.reference = np.ascontiguousarray(reference, dtype=np.float64)
+        self.length = len(self.reference)
+        self.stretch = float(stretch)
+        self.max_frames = int(self.stretch * self.length)
+        i = np.arange(self.max_frames)[:, None]
+        j = np.arange(self.length)[None, :]
+        # Cells outside the band, per query frame
+        self.outside = (j > np.floor((i + 1) * self.stretch) - 1) | (j < np.ceil((i + 1) / self.stretch) - 1)
+        self._row = None
+        self.frames = 0
+
+    def reset(self):
+        self.frames = 0
+
+    def costs(self, query):
+        """Mean absolute joint-angle difference (degrees) of (..., J) query frames to every reference frame."""
+        return np.abs(query[..., None, :] - self.reference).mean(axis=-1)
+
+    def step_row(self, prev, cost, i):
+        """Next row(s) from the previous one(s); prev is None for the first query frame."""
+        s = np.cumsum(cost, axis=-1)
+        if prev is None:
+            row = s.copy()
+        else:
+            a = prev.copy()
+            np.minimum(a[..., 1:], prev[..., :-1], out=a[..., 1:])
+            a[..., self.outside[i]] = np.inf
+            a[..., 1:] -= s[..., :-1]
+            row = np.minimum.accumulate(a, axis=-1) + s
+        row[..., self.outside[i]] = np.inf
+        return row
+
+    def update(self, query):
+        """Adds one (J,) query frame. Returns False once the query is longer than the band allows."""
+        if self.frames >= self.max_frames:
+            return False
+        self._row = self.step_row(self._row if self.frames else None, self.costs(query), self.frames)
+        self.frames += 1
+        return True
+
+    def distance(self, open_end=0.0):
+        """
+        Mean per-step alignment cost (degrees) of the query so far against the whole reference.
+        'open_end' lets the query stop up to that fraction of the reference early. None when no
+        path fits the band.
+        """
+        return end_distance(self._row, self.frames, self.length, open_end) if self.frames else None
+
+
+def end_distance(row, frames, length, open_end=0.0):
+    """
+    Best normalized cost over the allowed end cells of the last row(s): 2 D / (query + reference frames).
+    For one row a float or None, for (R, L) rows with (R,) frame counts an array with NaN for no path.
+    """
+    first = min(length - 1, int(np.ceil((1.0 - open_end) * (length - 1))))
+    j = np.arange(first, length)
+    cost = (2.0 * row[..., first:] / (np.asarray(frames)[..., None] + j + 1)).min(axis=-1)
+    if np.ndim(cost) == 0:
+        return float(cost) if np.isfinite(cost) else None
+    return np.where(np.isfinite(cost), cost, np.nan)
+
+
+def form_score(distance, tolerance):
+    """0-100: 100 for a perfect match, 50 when joints are off by 'tolerance' degrees on average."""
+    return float(np.clip(100.0 * (1.0 - distance / (2.0 * tolerance)), 0.0, 100.0))
+
+
+class RepScorer:
+    """
+    Per-rep form score of one exercise, updated every frame.
+    A rep's window opens at the last frame at the top of the movement (depth below 'start_depth'
+    while the rep state machine is not bottomed) and closes on the frame the rep is counted, when
+    the window is warped onto the reference rep.
+    """
+    def __init__(self, reference, tolerance, exercise=None, stretch=3.0, start_depth=0.1, open_end=0.15):
+        self.exercise = exercise
+        self.columns = joint_columns(exercise)
+        self.dtw = BandedDTW(reference, stretch)
+        self.tolerance = float(tolerance)
+        self.start_depth = start_depth
+        self.open_end = open_end
+
+    def update(self, landmarks, depth, bottomed, rep_done):
+        """
+        One frame with a body: landmarks (33, 4), the depth gauge and the rep state after the rules ran.
+        Returns the rep's score (0-100) on the frame a rep is counted, otherwise None.
+        """
+        if depth < self.start_depth and not bottomed and not rep_done:
+            self.dtw.reset()
+        self.dtw.update(compute_angle_table(landmarks)[self.columns])
+        if not rep_done:
+            return None
+        distance = self.dtw.distance(self.open_end) if self.dtw.frames < self.dtw.max_frames else None
+        self.dtw.reset()
+        return None if distance is None else form_score(distance, self.tolerance)
+
+
+def rep_scorer(exercise, templates, **kwargs):
+    """RepScorer for an exercise from its template's ideal pose, or None without one."""
+    template = templates.get(exercise)
+    reference = reference_angles(template, exercise)
+    if reference is None:
+        return None
+    return RepScorer(reference, template.tolerance, exercise, **kwargs)
+
+
+def rep_windows(depth, bottomed, rep_done, start_depth=0.1):
+    """
+    [start, end] frame index pairs of every counted rep, with the same window rules as RepScorer.
+    Inputs are per-frame arrays over frames with a body.
+    """
+    ends = np.flatnonzero(rep_done)
+    top = np.flatnonzero((depth < start_depth) & ~bottomed & ~rep_done)
+    last_top = np.searchsorted(top, ends, side="right") - 1
+    starts = np.where(last_top >= 0, top[np.maximum(last_top, 0)], 0)
+    # A window never reaches back past the previous counted rep
+    starts = np.maximum(starts, np.r_[0, ends[:-1] + 1])
+    return np.stack([starts, ends], axis=1) if len(ends) else np.zeros((0, 2), dtype=np.intp)
+
+
+class BatchDTW(BandedDTW):
+    """BandedDTW over many queries at once: one vectorized row step per query frame for every rep."""
+
+    def distances(self, queries, windows, open_end=0.0):
+        """
+        queries (T, J) joint angles, windows (R, 2) inclusive [start, end] frames -> (R,) distances
+        (NaN where the rep is longer than the band allows).
+        """
+        lengths = windows[:, 1] - windows[:, 0] + 1
+        out = np.full(len(windows), np.nan)
+        fits = lengths < self.max_frames
+        if not fits.any():
+            return out
+        windows, lengths = windows[fits], lengths[fits]
+        rows = None
+        final = np.empty((len(windows), self.length))
+        for i in range(int(lengths.max())):
+            # Finished reps keep stepping on their last frame; their result was already taken
+            frame = windows[:, 0] + np.minimum(i, lengths - 1)
+            rows = self.step_row(rows, self.costs(queries[frame]), i)
+            done = lengths == i + 1
+            final[done] = rows[done]
+        out[fits] = end_distance(final, lengths, self.length, open_end)
+        return out
+
+
+def score_sequence(exercise, landmarks, timestamps, templates, stretch=3.0, start_depth=0.1, open_end=0.15):
+    """
+    Scores every counted rep of a whole (T, 33, 4) sequence (NaN rows = no body) against the exercise's
+    reference. Returns {"frames": rep completion frames, "scores": (R,) 0-100, NaN = unscorable}.
+    """
+    template = templates.get(exercise)
+    reference = reference_angles(template, exercise)
+    if reference is None:
+        raise ValueError(f"{exercise}: not scorable, the template has no ideal pose sequence (ideal_pose_path) "
+                         f"or the exercise has a constant depth gauge")
+    result = load_program(exercise).run_sequence(landmarks, timestamps)
+    detected = np.flatnonzero(~np.isnan(np.asarray(landmarks)[:, :, :2]).any(axis=(1, 2)))
+    windows = rep_windows(result["depth"][detected], result["bottomed"][detected], result["rep_done"][detected],
+                          start_depth)
+    angles = compute_angle_table(np.asarray(landmarks)[detected].astype(np.float64))[:, joint_columns(exercise)]
+    distances = BatchDTW(reference, stretch).distances(angles, windows, open_end)
+    scores = np.clip(100.0 * (1.0 - distances / (2.0 * template.tolerance)), 0.0, 100.0)
+    return {"frames": detected[windows[:, 1]], "scores": scores}
+
+
+def save_reference(path, landmarks):
+    """Saves one demonstrated rep, (frames, 33, 4) landmarks, as a template ideal pose (.npy)."""
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    if np.isnan(landmarks[:, :, :2]).any():
+        raise ValueError("the reference rep has frames without a detected body")
+    np.save(path, landmarks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-rep DTW form scores against an exercise's reference rep")
+    sub = parser.add_subparsers(dest="command", required=True)
+    score = sub.add_parser("score", help="Score every rep of landmark recordings")
+    score.add_argument("recordings", nargs="+", help="Recording folders (main.py --record)")
+    score.add_argument("--exercise", choices=EXERCISES, required=True)
+    ref = sub.add_parser("reference", help="Cut a demonstrated rep out of a recording as an ideal pose")
+    ref.add_argument("recording")
+    ref.add_argument("--start", type=int, required=True, help="First frame of the rep")
+    ref.add_argument("--end", type=int, required=True, help="Last frame of the rep")
+    ref.add_argument("--out", required=True, help="e.g. templates/squat_ideal.npy (the template's ideal_pose_path)")
+    args = parser.parse_args(argv)
+    try:
+        run(args)
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+
+
+def run(args):
+    if args.command == "reference":
+        landmarks = load_recording(args.recording)[0]
+        save_reference(args.out, landmarks[args.start:args.end + 1])
+        print(f"Saved {args.end + 1 - args.start} frames to {args.out}")
+        return
+    templates = default_registry()
+    for path in args.recordings:
+        landmarks, timestamps, _, _ = load_recording(path)
+        result = score_sequence(args.exercise, landmarks, timestamps, templates)
+        scores = result["scores"]
+        listed = " ".join("-" if np.isnan(s) else f"{s:.0f}" for s in scores)
+        mean = f"{np.nanmean(scores):.0f}" if np.isfinite(scores).any() else "-"
+        print(f"{os.path.basename(os.path.normpath(path))}: {len(scores)} reps, mean score {mean} | {listed}")
+
+
+if __name__ == "__main__":
+    main()
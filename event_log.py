@@ -0,0 +1,253 @@
+import argparse
+import collections
+import datetime
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    patient TEXT NOT NULL,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    exercise TEXT,
+    reps INTEGER,
+    form_ok INTEGER,
+    depth REAL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS events_patient_ts ON events (patient, ts);
+CREATE INDEX IF NOT EXISTS events_patient_exercise_ts ON events (patient, exercise, ts);
+CREATE INDEX IF NOT EXISTS events_session_ts ON events (session, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+"""
+COLUMNS = ("session", "patient", "ts", "kind", "exercise", "reps", "form_ok", "depth", "message")
+INSERT = f"INSERT INTO events ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+# Event kinds
+SESSION_START = "session_start"
+SESSION_END = "session_end"
+EXERCISE = "exercise"
+REP = "rep"
+FORM_FAULT = "form_fault"
+FORM_OK = "form_ok"
+
+
+def connect(path, readonly=False):
+    if readonly:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn = sqlite3.connect(path)
+    # WAL: readers (the therapist's queries) never block the writer and commits are sequential appends
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class EventLog:
+    """
+    Append-only session event log in SQLite, written by a background thread.
+
+    record() only appends a tuple to an in-memory buffer, so the frame loop never touches the
+    disk. The writer commits the buffer in batches (every 'flush_interval' seconds or 'batch_size'
+    events). If the database is locked or the disk stalls, the batch goes back to the front of
+    the buffer and is retried with backoff. The buffer holds at most 'max_buffer' events; past
+    that the oldest are dropped and counted in 'dropped', as are events still unwritten when
+    close() gives up on a database that stays locked (after one more attempt).
+    """
+    def __init__(self, path, batch_size=500, flush_interval=0.5, max_buffer=50_000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = collections.deque()
+        self._cond = threading.Condition()
+        self._closing = False
+
+        # Counters
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+
+        # Create the schema up front so a bad path fails here, not on the writer thread
+        connect(path).close()
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+
+    def record(self, session, patient, ts, kind, exercise=None, reps=None, form_ok=None, depth=None, message=None):
+        row = (session, patient, ts, kind, exercise, reps, None if form_ok is None else int(form_ok), depth, message)
+        with self._cond:
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(row)
+            self.recorded += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def _take(self):
+        with self._cond:
+            if not self._closing and len(self._buffer) < self.batch_size:
+                self._cond.wait(self.flush_interval)
+            n = min(len(self._buffer), self.batch_size * 8)
+            return [self._buffer.popleft() for _ in range(n)]
+
+    def _requeue(self, batch):
+        with self._cond:
+            room = self.max_buffer - len(self._buffer)
+            if room < len(batch):
+                self.dropped += len(batch) - max(room, 0)
+                batch = batch[len(batch) - max(room, 0):]
+            self._buffer.extendleft(reversed(batch))
+
+    def _run(self):
+        conn = None
+        backoff = 0.05
+        while True:
+            batch = self._take()
+            if batch:
+                final = self._closing
+                try:
+                    if conn is None:
+                        conn = connect(self.path)
+                    with conn:
+                        conn.executemany(INSERT, batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                    backoff = 0.05
+                except sqlite3.Error as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+                    self._requeue(batch)
+                    if final:
+                        # The attempt made after close() failed too: everything still buffered is lost
+                        with self._cond:
+                            self.dropped += len(self._buffer)
+                            self._buffer.clear()
+                        break
+                    if self._closing:
+                        continue
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 2.0)
+            elif self._closing:
+                break
+        if conn is not None:
+            conn.close()
+
+    def flush(self, timeout=5.0):
+        """Waits until everything recorded so far is committed (or timeout). Returns True if so."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._cond:
+                if not self._buffer and self.written + self.dropped >= self.recorded:
+                    return True
+                self._cond.notify()
+            time.sleep(0.01)
+        return False
+
+    def close(self, timeout=10.0):
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "buffered": len(self._buffer),
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+def query_events(path, patient=None, exercise=None, since=None, until=None, kinds=None, session=None, limit=None):
+    """
+    Events in time order, filtered by patient, exercise, [since, until) (epoch seconds), kinds
+    and session. Every filter combination is served by one of the indexes.
+    """
+    where, params = [], []
+    for column, value in (("patient", patient), ("exercise", exercise), ("session", session)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if since is not None:
+        where.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("ts < ?")
+        params.append(until)
+    if kinds:
+        where.append(f"kind IN ({', '.join('?' * len(kinds))})")
+        params += list(kinds)
+    sql = f"SELECT {', '.join(COLUMNS)} FROM events"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY ts, id"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    conn = connect(path, readonly=True)
+    try:
+        return [dict(zip(COLUMNS, row)) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def summarize(path, patient=None, exercise=None, since=None, until=None):
+    """Per session and exercise: reps, form faults and mean rep depth."""
+    events = query_events(path, patient, exercise, since, until, kinds=(REP, FORM_FAULT))
+    summary = collections.OrderedDict()
+    for e in events:
+        key = (e["session"], e["exercise"])
+        s = summary.setdefault(key, {"session": e["session"], "patient": e["patient"], "exercise": e["exercise"],
+                                     "start": e["ts"], "reps": 0, "faults": 0, "depth_sum": 0.0})
+        if e["kind"] == REP:
+            s["reps"] += 1
+            s["depth_sum"] += e["depth"] or 0.0
+        else:
+            s["faults"] += 1
+    for s in summary.values():
+        s["mean_depth"] = s.pop("depth_sum") / s["reps"] if s["reps"] else 0.0
+    return list(summary.values())
+
+
+def _parse_time(value):
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def _format_time(ts):
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the session event log")
+    parser.add_argument("db", help="Event log database (main.py --event-log)")
+    parser.add_argument("--patient", default=None)
+    parser.add_argument("--exercise", default=None)
+    parser.add_argument("--since", type=_parse_time, default=None, help="ISO date/time or epoch seconds")
+    parser.add_argument("--until", type=_parse_time, default=None, help="ISO date/time or epoch seconds")
+    parser.add_argument("--summary", action="store_true", help="Reps / faults / depth per session and exercise")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.summary:
+        for s in summarize(args.db, args.patient, args.exercise, args.since, args.until):
+            print(f"{_format_time(s['start'])}  {s['patient']:<12} {s['exercise']:<15} reps {s['reps']:>4}  "
+                  f"faults {s['faults']:>4}  mean depth {s['mean_depth']:.0%}  ({s['session'][:8]})")
+        return
+    for e in query_events(args.db, args.patient, args.exercise, args.since, args.until, limit=args.limit):
+        details = "  ".join(f"{k}={e[k]}" for k in ("reps", "depth", "message") if e[k] is not None)
+        print(f"{_format_time(e['ts'])}  {e['patient']:<12} {e['kind']:<13} {e['exercise'] or '':<15} {details}")
+
+
+if __name__ == "__main__":
+    main()
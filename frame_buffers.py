@@ -0,0 +1,155 @@
+import collections
+
+import cv2
+import numpy as np
+
+
+class ScratchBuffers:
+    """
+    Named reusable arrays: get() hands back the same array for a name until the shape or dtype it
+    is asked for changes. Callers write into them with dst= / out= instead of allocating per frame.
+    """
+    def __init__(self):
+        self._arrays = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        arr = self._arrays.get(name)
+        if arr is None or arr.shape != tuple(shape) or arr.dtype != dtype:
+            arr = np.empty(shape, dtype=dtype)
+            self._arrays[name] = arr
+            self.allocations += 1
+        return arr
+
+    @property
+    def nbytes(self):
+        return sum(arr.nbytes for arr in self._arrays.values())
+
+
+class FrameRing:
+    """
+    'count' same-shape images handed out round-robin. A buffer is reused 'count' frames later, so
+    count must exceed the number of frames still being read when a new one is written.
+    """
+    def __init__(self, count=2):
+        self.count = count
+        self._buffers = []
+        self._next = 0
+        self.allocations = 0
+
+    def next(self, shape):
+        if not self._buffers or self._buffers[0].shape != tuple(shape):
+            self._buffers = [np.empty(shape, dtype=np.uint8) for _ in range(self.count)]
+            self._next = 0
+            self.allocations += self.count
+        buf = self._buffers[self._next]
+        self._next = (self._next + 1) % self.count
+        return buf
+
+    @property
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self._buffers)
+
+
+class FramePool:
+    """
+    Same-shape images for frames that outlive the call that filled them (pipeline hand-offs).
+    acquire() takes a free buffer and release() gives it back once nothing reads it any more; when
+    none is free a new one is allocated, so a buffer still in use is never written over. 'count'
+    buffers are allocated up front (per resolution); sized to the frames in flight, the pool never
+    grows. acquire() and release() may run on different threads.
+    """
+    def __init__(self, count=2):
+        self.initial = count
+        self.shape = None
+        self._free = collections.deque()
+        self.count = 0
+        self.allocations = 0
+
+    def _allocate(self):
+        self.allocations += 1
+        self.count += 1
+        return np.empty(self.shape, dtype=np.uint8)
+
+    def acquire(self, shape):
+        shape = tuple(shape)
+        if shape != self.shape:
+            # New resolution: buffers of the old one are dropped as they come back
+            self.shape = shape
+            self.count = 0
+            self._free = collections.deque(self._allocate() for _ in range(self.initial))
+        try:
+            return self._free.popleft()
+        except IndexError:
+            return self._allocate()
+
+    def release(self, buf):
+        if buf is not None and buf.shape == self.shape:
+            self._free.append(buf)
+
+    @property
+    def nbytes(self):
+        return self.count * int(np.prod(self.shape)) if self.shape else 0
+
+
+class FrameBuffers:
+    """
+    Preallocated images for the capture -> render path, so a steady frame loop allocates nothing
+    per frame. Composite canvases (camera | coach, h x 2w) are double-buffered: the canvas of frame
+    n stays intact while frame n+1 is composed. Buffers are only (re)allocated when the camera
+    resolution changes.
+
+    Sequential loop (frames=0): capture() reads into a reused buffer and mirrors it straight into
+    the camera half of the next canvas, and compose() hands back that same canvas.
+    Pipelined loop (frames > 0): capture() mirrors into a FramePool of (initially) 'frames' buffers
+    and the pipeline release()s each frame once it is rendered or dropped; compose() copies the
+    frame into the next canvas. capture() and compose() may run on different threads.
+    """
+    def __init__(self, canvases=2, frames=0):
+        self.canvases = FrameRing(canvases)
+        self.frames = FramePool(frames) if frames else None
+        self.canvas = None
+        self._raw = None
+
+    def capture(self, cap):
+        """cap.read() + horizontal mirror. Returns the mirrored frame, or None at the end of the stream."""
+        success, raw = cap.read() if self._raw is None else cap.read(self._raw)
+        if not success:
+            return None
+        self._raw = raw
+        h, w = raw.shape[:2]
+        if self.frames is not None:
+            dst = self.frames.acquire(raw.shape)
+        else:
+            self.canvas = self.canvases.next((h, 2 * w, 3))
+            dst = self.canvas[:, :w]
+        cv2.flip(raw, 1, dst=dst)
+        return dst
+
+    def release(self, frame):
+        """Returns a pipelined frame from capture() to the pool (no-op for the sequential loop)."""
+        if self.frames is not None:
+            self.frames.release(frame)
+
+    def compose(self, frame):
+        """
+        Canvas (h, 2w, 3) whose left half holds 'frame': the canvas it was captured into, otherwise
+        the next one with the frame copied in. The right half is left as is for the coach panel.
+        """
+        h, w = frame.shape[:2]
+        if self.canvas is not None and frame.base is self.canvas:
+            return self.canvas
+        canvas = self.canvases.next((h, 2 * w, 3))
+        np.copyto(canvas[:, :w], frame)
+        self.canvas = canvas
+        return canvas
+
+    @property
+    def allocations(self):
+        return self.canvases.allocations + (self.frames.allocations if self.frames is not None else 0)
+
+    def stats(self):
+        return {
+            "allocations": self.allocations,
+            "bytes": self.canvases.nbytes + (self.frames.nbytes if self.frames is not None else 0),
+        }
@@ -0,0 +1,170 @@
+import math
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class LandmarkPredictor:
+    """
+    Constant-velocity (alpha-beta) predictor over all 33 landmarks.
+    Positions snap to every real measurement; velocities are corrected by 'beta' times the
+    prediction error, which smooths out detector jitter without lagging behind real motion.
+    """
+    def __init__(self, beta=0.5, max_horizon_ms=200.0):
+        self.beta = beta
+        self.max_horizon_ms = max_horizon_ms
+        self.pos = None
+        self.vel = np.zeros((33, 3))
+        self.visibility = None
+        self.t = None
+
+    @property
+    def ready(self):
+        return self.pos is not None
+
+    def reset(self):
+        self.pos = None
+        self.vel[:] = 0.0
+        self.visibility = None
+        self.t = None
+
+    def update(self, landmarks, timestamp_ms):
+        """Feeds a real (33, 4) measurement; None (no body) resets the track."""
+        if landmarks is None:
+            self.reset()
+            return
+        if self.pos is None:
+            self.pos = landmarks[:, :3].astype(np.float64)
+            self.vel[:] = 0.0
+        else:
+            dt = max(timestamp_ms - self.t, 1e-3)
+            error = landmarks[:, :3] - (self.pos + self.vel * dt)
+            self.vel += self.beta * error / dt
+            self.pos[:] = landmarks[:, :3]
+        self.visibility = landmarks[:, 3].copy()
+        self.t = timestamp_ms
+
+    def predict(self, timestamp_ms):
+        """(33, 4) landmarks extrapolated to 'timestamp_ms' (visibility held from the last measurement)."""
+        dt = min(max(timestamp_ms - self.t, 0.0), self.max_horizon_ms)
+        out = np.empty((33, 4))
+        out[:, :3] = self.pos + self.vel * dt
+        out[:, 3] = self.visibility
+        return out
+
+    def speed(self, min_visibility=0.5):
+        """90th percentile image-plane speed of the visible landmarks, in normalized units per ms."""
+        if self.pos is None:
+            return 0.0
+        visible = self.visibility >= min_visibility
+        if not visible.any():
+            return 0.0
+        return float(np.percentile(np.hypot(self.vel[visible, 0], self.vel[visible, 1]), 90))
+
+
+class PredictedResults:
+    """
+    Stand-in for a PoseLandmarker result on frames where inference was skipped.
+    'pose_landmarks' is built on demand for code that walks the Tasks API objects.
+    """
+    is_predicted = True
+
+    def __init__(self, landmarks, timestamp_ms):
+        self.landmarks = landmarks
+        self.timestamp_ms = timestamp_ms
+
+    @property
+    def pose_landmarks(self):
+        return [[SimpleNamespace(x=x, y=y, z=z, visibility=v) for x, y, z, v in self.landmarks.tolist()]]
+
+
+class AdaptiveScheduler:
+    """
+    Wraps a PoseEngine and only runs real inference every k-th frame, predicting the landmarks
+    in between. k follows the recent landmark speed (a point may drift at most 'motion_tolerance'
+    normalized units between inferences) and the latency budget (average inference time per
+    frame must fit 'latency_budget_ms'), capped at 'max_skip'.
+    Everything else is delegated to the engine, so it can be used wherever a PoseEngine is.
+    """
+    def __init__(self, engine, max_skip=4, motion_tolerance=0.02, latency_budget_ms=33.0, beta=0.5):
+        if getattr(engine, "running_mode", "video") == "live_stream":
+            raise ValueError("AdaptiveScheduler needs a blocking engine (running_mode='video')")
+        self.engine = engine
+        self.max_skip = max(1, int(max_skip))
+        self.motion_tolerance = motion_tolerance
+        self.latency_budget_ms = latency_budget_ms
+        self.predictor = LandmarkPredictor(beta)
+        self.k = 1
+        self.inference_ms = None
+        self.frame_interval_ms = None
+        self._last_ts = None
+        self._since_inference = 0
+        self._force = True
+        self.last_prepare_ms = 0.0
+
+        # Counters
+        self.inferred = 0
+        self.predicted = 0
+        self.forced = 0
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def request_inference(self):
+        """Makes the next frame use real inference (e.g. a rep transition is pending)."""
+        self._force = True
+
+    def _choose_k(self):
+        speed = self.predictor.speed()
+        interval = self.frame_interval_ms or 33.0
+        k_motion = self.max_skip if speed <= 0 else int(self.motion_tolerance / (speed * interval))
+        k_budget = math.ceil(self.inference_ms / self.latency_budget_ms) if self.latency_budget_ms else 1
+        return min(max(k_motion, k_budget, 1), self.max_skip)
+
+    def process_frame(self, frame, timestamp_ms=None):
+        if timestamp_ms is None:
+            timestamp_ms = time.monotonic() * 1000
+        if self._last_ts is not None:
+            dt = timestamp_ms - self._last_ts
+            self.frame_interval_ms = dt if self.frame_interval_ms is None else 0.9 * self.frame_interval_ms + 0.1 * dt
+        self._last_ts = timestamp_ms
+
+        if self._force or not self.predictor.ready or self._since_inference + 1 >= self.k:
+            if self._force and self.predictor.ready and self._since_inference + 1 < self.k:
+                self.forced += 1
+            t0 = time.perf_counter()
+            results = self.engine.process_frame(frame, timestamp_ms=timestamp_ms)
+            ms = (time.perf_counter() - t0) * 1000
+            self.inference_ms = ms if self.inference_ms is None else 0.8 * self.inference_ms + 0.2 * ms
+            self.last_prepare_ms = getattr(self.engine, "last_prepare_ms", 0.0)
+            self.predictor.update(self.engine.get_landmarks_array(results), timestamp_ms)
+            self.k = self._choose_k()
+            self._since_inference = 0
+            self._force = False
+            self.inferred += 1
+            return results
+
+        self._since_inference += 1
+        self.predicted += 1
+        self.last_prepare_ms = 0.0
+        return PredictedResults(self.predictor.predict(timestamp_ms), timestamp_ms)
+
+    def get_landmarks_array(self, results):
+        if getattr(results, "is_predicted", False):
+            return results.landmarks
+        return self.engine.get_landmarks_array(results)
+
+    def draw_landmarks(self, frame, results, color=(0, 255, 0)):
+        return self.engine.draw_landmarks_array(frame, self.get_landmarks_array(results), color=color)
+
+    def stats(self):
+        total = self.inferred + self.predicted
+        return {
+            "inferred": self.inferred,
+            "predicted": self.predicted,
+            "forced": self.forced,
+            "inference_ratio": (self.inferred / total) if total else 0.0,
+            "k": self.k,
+            "inference_ms": self.inference_ms or 0.0,
+        }
@@ -1,6 +1,8 @@
+from collections import OrderedDict
+
 import cv2
 import numpy as np
-from utils import draw_skeleton
+from utils import POSE_CONNECTIONS, blend_roi, draw_segments, landmarks_to_pixels
 
 class GhostCoach:
     """
@@ -8,13 +10,7 @@ class GhostCoach:
     """
     def __init__(self):
         # MediaPipe POSE_CONNECTIONS indices
-        self.connections = [
-            (11, 12), (11, 13), (13, 15), (12, 14), (14, 16), # Upper Body
-            (11, 23), (12, 24), (23, 24), # Torso
-            (23, 25), (25, 27), (24, 26), (26, 28), # Legs
-            (15, 17), (17, 19), (19, 15), (16, 18), (18, 20), (20, 16), # Hands
-            (27, 29), (29, 31), (31, 27), (28, 30), (30, 32), (32, 28)  # Feet
-        ]
+        self.connections = POSE_CONNECTIONS
         
         # Default 'neutral' ghost position (will be updated dynamically)
         self.base_pose = None 
@@ -28,20 +24,60 @@ class GhostCoach:
         self.base_pose = landmarks
         self.current_display_pose = landmarks.copy()
 
+    def draw_floor_grid(self, canvas):
+        """
+        Draws the 3D perspective floor grid the coach stands on.
+        """
+        h, w = canvas.shape[:2]
+        cx, cy = w // 2, h * 3 // 4
+        for i in range(-5, 6):
+            cv2.line(canvas, (cx + i*40, cy), (cx + i*150, h), (40, 40, 40), 1)
+        cv2.line(canvas, (0, cy), (w, cy), (60, 60, 60), 2)
+        return canvas
+
     def render(self, frame, landmarks, color=(200, 200, 200), offset=(100, 0)):
         """
         Draws the ghost skeleton on the frame.
         """
         if landmarks is None:
             return frame
-            
-        overlay = frame.copy()
-        draw_skeleton(overlay, landmarks, self.connections, color=color, thickness=3, offset=offset)
-        
-        # Blend overlay for ghost effect
-        cv2.addWeighted(overlay, self.alpha, frame, 1 - self.alpha, 0, frame)
+
+        thickness = 3
+        pts = landmarks_to_pixels(landmarks, frame.shape)
+        # Skip points mapped to (0,0) - prevents lines stretching to corner
+        at_origin = (pts == 0).all(axis=1)
+        pts += np.asarray(offset, dtype=np.int32)
+        conn = np.asarray(self.connections)
+        kept = conn[~(at_origin[conn[:, 0]] | at_origin[conn[:, 1]])]
+        if len(kept) == 0:
+            return frame
+        in_use = np.zeros(len(pts), dtype=bool)
+        in_use[kept.ravel()] = True
+
+        def draw(overlay, roi_pts):
+            draw_segments(overlay, roi_pts, self.connections, color, thickness,
+                          joint_radius=thickness + 1, skip_origin=at_origin)
+
+        # Blend overlay for ghost effect, only inside the skeleton's bounding box
+        blend_roi(frame, pts, thickness + 2, draw, self.alpha, bbox_mask=in_use)
         return frame
 
+    # Exercises whose animation follows the clock rather than the 0-1 phase, with their period (ms)
+    TIME_DRIVEN_PERIODS = {"high_knees": 2000, "arm_circles": 2000, "torso_twist": 4000}
+
+    def animation_key(self, exercise_type, timestamp_ms, user_progress=None):
+        """
+        Reduces (timestamp, progress) to the single 0-1 value the pose of an exercise depends on:
+        the cycle position for time-driven exercises, otherwise the movement phase.
+        """
+        period = self.TIME_DRIVEN_PERIODS.get(exercise_type)
+        if period is not None:
+            return (timestamp_ms % period) / period
+        if user_progress is not None:
+            return float(user_progress)
+        t = (timestamp_ms % 4000) / 4000.0
+        return (1 - np.cos(t * 2 * np.pi)) / 2
+
     def get_animated_pose(self, exercise_type, timestamp_ms, user_progress=None):
         """
         Calculates frame-by-frame anatomical movement for the Coach.
@@ -198,3 +234,136 @@ class GhostCoach:
 
     def generate_static_squat_pose(self):
         return self.get_animated_pose("squat", 0)
+
+
+class GhostSpriteCache:
+    """
+    Pose lookup table and pre-rendered ghost sprites, keyed by (exercise, quantized phase bucket).
+    The floor grid is a static background layer per canvas size; each sprite stores only the pixels
+    the blended skeleton changes. Sprites are rendered on first use (or by warm()), evicted
+    least-recently-used beyond 'max_bytes', and dropped when the canvas size changes.
+    """
+    def __init__(self, coach, buckets=64, max_bytes=64 * 1024 * 1024, color=(0, 255, 255)):
+        self.coach = coach
+        self.buckets = buckets
+        self.max_bytes = max_bytes
+        self.color = color
+        self.size = None
+        self.background = None
+        self._poses = {}
+        self._sprites = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Sprite indices widened to intp for fancy indexing, reused across frames (grown on demand)
+        self._rows = np.empty(0, dtype=np.intp)
+        self._cols = np.empty(0, dtype=np.intp)
+
+    def bucket(self, exercise_type, timestamp_ms, user_progress=None):
+        key = self.coach.animation_key(exercise_type, timestamp_ms, user_progress)
+        if exercise_type in self.coach.TIME_DRIVEN_PERIODS:
+            return int(key * self.buckets) % self.buckets
+        return int(round(min(max(key, 0.0), 1.0) * (self.buckets - 1)))
+
+    def get_pose(self, exercise_type, bucket):
+        """
+        Returns the (read-only) ghost pose of a phase bucket, computing it once.
+        """
+        key = (exercise_type, bucket)
+        pose = self._poses.get(key)
+        if pose is None:
+            period = self.coach.TIME_DRIVEN_PERIODS.get(exercise_type)
+            if period is not None:
+                pose = self.coach.get_animated_pose(exercise_type, bucket * period / self.buckets)
+            else:
+                pose = self.coach.get_animated_pose(exercise_type, 0, user_progress=bucket / (self.buckets - 1))
+            pose.flags.writeable = False
+            self._poses[key] = pose
+        return pose
+
+    def get_animated_pose(self, exercise_type, timestamp_ms, user_progress=None):
+        """
+        Cached equivalent of GhostCoach.get_animated_pose (quantized to the nearest phase bucket).
+        """
+        return self.get_pose(exercise_type, self.bucket(exercise_type, timestamp_ms, user_progress))
+
+    def _check_size(self, h, w):
+        if self.size != (h, w):
+            self.size = (h, w)
+            self.background = self.coach.draw_floor_grid(np.zeros((h, w, 3), dtype=np.uint8))
+            self.background.flags.writeable = False
+            self._sprites.clear()
+            self._bytes = 0
+
+    def _render_sprite(self, exercise_type, bucket):
+        """
+        Renders the ghost over the background once and keeps only the pixels it changed (sparse sprite).
+        """
+        panel = self.background.copy()
+        self.coach.render(panel, self.get_pose(exercise_type, bucket), color=self.color)
+        ys, xs = np.nonzero(np.any(panel != self.background, axis=2))
+        index_dtype = np.int16 if max(self.size) < 2 ** 15 else np.int32
+        return (ys.astype(index_dtype), xs.astype(index_dtype), panel[ys, xs])
+
+    @staticmethod
+    def _sprite_bytes(sprite):
+        return sum(a.nbytes for a in sprite)
+
+    def get_sprite(self, exercise_type, bucket):
+        key = (exercise_type, bucket)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self._sprites.move_to_end(key)
+            return sprite
+        self.misses += 1
+        sprite = self._render_sprite(exercise_type, bucket)
+        self._sprites[key] = sprite
+        self._bytes += self._sprite_bytes(sprite)
+        while self._bytes > self.max_bytes and len(self._sprites) > 1:
+            _, old = self._sprites.popitem(last=False)
+            self._bytes -= self._sprite_bytes(old)
+            self.evictions += 1
+        return sprite
+
+    def warm(self, exercises, size):
+        """
+        Pre-renders every phase bucket of the given exercises for an (h, w) panel.
+        """
+        self._check_size(*size)
+        for ex in exercises:
+            for b in range(self.buckets):
+                self.get_sprite(ex, b)
+
+    def render(self, panel, exercise_type, timestamp_ms, user_progress=None):
+        """
+        Draws the coach panel: static floor grid plus the cached ghost sprite for the current phase.
+        """
+        h, w = panel.shape[:2]
+        self._check_size(h, w)
+        ys, xs, pixels = self.get_sprite(exercise_type, self.bucket(exercise_type, timestamp_ms, user_progress))
+        n = len(ys)
+        if n > len(self._rows):
+            self._rows = np.empty(2 * n, dtype=np.intp)
+            self._cols = np.empty(2 * n, dtype=np.intp)
+        rows, cols = self._rows[:n], self._cols[:n]
+        rows[:] = ys
+        cols[:] = xs
+        panel[:] = self.background
+        panel[rows, cols] = pixels
+        return panel
+
+    def render_pose(self, panel, pose):
+        """
+        Draws the coach panel with an arbitrary (per-frame) ghost pose, bypassing the sprite cache.
+        """
+        h, w = panel.shape[:2]
+        self._check_size(h, w)
+        panel[:] = self.background
+        self.coach.render(panel, pose, color=self.color)
+        return panel
+
+    def stats(self):
+        return {"sprites": len(self._sprites), "bytes": self._bytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,375 @@
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import struct
+import time
+
+import numpy as np
+
+from instrumentation import RingHistogram
+from landmark_codec import LandmarkStreamDecoder
+from rules import EXERCISES, NO_BODY_MSG, compile_all, compute_features
+
+# Binary frame sent by devices: little-endian float64 capture time (seconds) followed by
+# 33 x 4 float32 landmarks (x, y, z, visibility). A frame with only the timestamp means "no body".
+FRAME_HEADER = struct.Struct("<d")
+FRAME_BYTES = FRAME_HEADER.size + 33 * 4 * 4
+# Result messages are not written to a connection with more than this many bytes unsent;
+# the session keeps its last-sent state, so the next delta carries everything it missed
+WRITE_LIMIT = 64 * 1024
+
+
+def encode_frame(landmarks, ts):
+    if landmarks is None:
+        return FRAME_HEADER.pack(ts)
+    return FRAME_HEADER.pack(ts) + np.asarray(landmarks, dtype="<f4").tobytes()
+
+
+def decode_frame(data):
+    """(landmarks (33, 4) float32 or None, ts) from an encoded frame; raises ValueError if malformed."""
+    if len(data) == FRAME_HEADER.size:
+        return None, FRAME_HEADER.unpack(data)[0]
+    if len(data) != FRAME_BYTES:
+        raise ValueError(f"frame must be {FRAME_HEADER.size} or {FRAME_BYTES} bytes, got {len(data)}")
+    return np.frombuffer(data, dtype="<f4", offset=FRAME_HEADER.size).reshape(33, 4), FRAME_HEADER.unpack_from(data)[0]
+
+
+class SessionTable:
+    """
+    Rule state of many sessions as parallel arrays (one row per session slot), so a tick
+    evaluates every session's next frame with one vectorized pass per exercise instead of one
+    Python pass per session. Semantics match ExerciseSession / RuleProgram.step frame for frame.
+
+    Frames wait in a small per-session ring buffer until the next tick; when a device sends
+    faster than ticks run, the oldest pending frame is dropped (and counted).
+    """
+    def __init__(self, capacity=4096, exercises=EXERCISES, queue_depth=4):
+        self.capacity = capacity
+        self.exercises = list(exercises)
+        programs = compile_all(self.exercises)
+        self.programs = [programs[ex] for ex in self.exercises]
+        self.queue_depth = queue_depth
+        n, e = capacity, len(self.exercises)
+
+        self.active = np.zeros(n, dtype=bool)
+        self.exercise = np.zeros(n, dtype=np.intp)
+        self.counter = np.zeros((n, e), dtype=np.int64)
+        self.last_rep_time = np.zeros((n, e))
+        # Only the current exercise can be mid-rep: switching resets it, like reset_exercise()
+        self.bottomed = np.zeros(n, dtype=bool)
+        self.base_y = np.zeros(n)
+
+        # Pending frames
+        self.frames = np.zeros((n, queue_depth, 33, 4), dtype=np.float32)
+        self.frame_ts = np.zeros((n, queue_depth))
+        self.arrival = np.zeros((n, queue_depth))
+        self.head = np.zeros(n, dtype=np.intp)
+        self.pending = np.zeros(n, dtype=np.intp)
+        self.dropped = np.zeros(n, dtype=np.int64)
+
+        # Result of each session's last evaluated frame
+        self.body = np.zeros(n, dtype=bool)
+        self.form_ok = np.zeros(n, dtype=bool)
+        self.depth = np.zeros(n)
+        self.feedback_id = np.ones(n, dtype=np.int16)
+        self.result_ts = np.zeros(n)
+
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def open(self, exercise=None):
+        """Allocates a session slot; returns None when the table is full."""
+        if not self._free:
+            return None
+        slot = self._free.pop()
+        self.active[slot] = True
+        self.exercise[slot] = 0
+        self.counter[slot] = 0
+        self.last_rep_time[slot] = 0
+        self.bottomed[slot] = False
+        self.base_y[slot] = 0
+        self.head[slot] = self.pending[slot] = self.dropped[slot] = 0
+        self.body[slot] = self.form_ok[slot] = False
+        self.depth[slot] = 0.0
+        self.feedback_id[slot] = 1
+        if exercise is not None:
+            self.select(slot, exercise)
+        return slot
+
+    def close(self, slot):
+        self.active[slot] = False
+        self.pending[slot] = 0
+        self._free.append(slot)
+
+    def select(self, slot, exercise):
+        if exercise not in self.exercises:
+            return False
+        self.exercise[slot] = self.exercises.index(exercise)
+        self.bottomed[slot] = False
+        self.base_y[slot] = 0
+        return True
+
+    def push(self, slot, landmarks, ts, arrival):
+        if self.pending[slot] == self.queue_depth:
+            self.head[slot] = (self.head[slot] + 1) % self.queue_depth
+            self.pending[slot] -= 1
+            self.dropped[slot] += 1
+        pos = (self.head[slot] + self.pending[slot]) % self.queue_depth
+        if landmarks is None:
+            self.frames[slot, pos, 0, 0] = np.nan
+        else:
+            self.frames[slot, pos] = landmarks
+        self.frame_ts[slot, pos] = ts
+        self.arrival[slot, pos] = arrival
+        self.pending[slot] += 1
+
+    def tick(self):
+        """
+        Evaluates every pending frame, oldest first per session. Returns (slots that got a new
+        result, arrival times of all evaluated frames).
+        """
+        updated, arrivals = [], []
+        while True:
+            slots = np.flatnonzero(self.pending)
+            if not len(slots):
+                break
+            pos = self.head[slots]
+            arrivals.append(self.arrival[slots, pos])
+            self._step(slots, self.frames[slots, pos].astype(np.float64), self.frame_ts[slots, pos])
+            self.head[slots] = (pos + 1) % self.queue_depth
+            self.pending[slots] -= 1
+            updated.append(slots)
+        if not updated:
+            return np.zeros(0, dtype=np.intp), np.zeros(0)
+        return np.unique(np.concatenate(updated)), np.concatenate(arrivals)
+
+    def _step(self, slots, landmarks, ts):
+        body = ~np.isnan(landmarks[:, 0, 0])
+        self.body[slots] = body
+        self.result_ts[slots] = ts
+        none = slots[~body]
+        self.form_ok[none] = False
+        self.depth[none] = 0.0
+        self.feedback_id[none] = 1
+
+        slots, landmarks, ts = slots[body], landmarks[body], ts[body]
+        if not len(slots):
+            return
+        features = compute_features(landmarks)
+        ex_ids = self.exercise[slots]
+        for e in np.unique(ex_ids):
+            sel = np.flatnonzero(ex_ids == e)
+            s = slots[sel]
+            bottomed, counter = self.bottomed[s], self.counter[s, e]
+            last_rep, base_y = self.last_rep_time[s, e], self.base_y[s]
+            ok, depth, ids = self.programs[e].step_batch(landmarks[sel], features[sel], ts[sel],
+                                                         bottomed, counter, last_rep, base_y)
+            self.bottomed[s], self.counter[s, e] = bottomed, counter
+            self.last_rep_time[s, e], self.base_y[s] = last_rep, base_y
+            self.form_ok[s], self.depth[s], self.feedback_id[s] = ok, depth, ids
+
+    def snapshot(self, slot):
+        e = self.exercise[slot]
+        program = self.programs[e]
+        return {
+            "exercise": self.exercises[e],
+            "reps": int(self.counter[slot, e]),
+            "body": bool(self.body[slot]),
+            "form_ok": bool(self.form_ok[slot]),
+            "depth": round(float(self.depth[slot]), 2),
+            "feedback": program.messages[self.feedback_id[slot]] if self.body[slot] else NO_BODY_MSG,
+        }
+
+
+class IngestServer:
+    """
+    WebSocket service that takes landmark frames from many devices (one session per connection)
+    and evaluates all sessions' rules in batches every tick.
+
+    Device -> server:
+        binary frames (see encode_frame)
+        {"type": "hello", "session": "patient-01", "exercise": "squat", "codec": "lmk"}
+            "codec": "lmk" switches the connection's binary frames to landmark_codec stream
+            packets (LandmarkStreamEncoder), ~1/3 the bytes of encode_frame
+        {"type": "select", "exercise": "lunge"}
+        {"type": "stats"}
+    Server -> device:
+        {"type": "state", ...}   once after connecting
+        {"type": "delta", ..., "ts": t}   fields that changed since the last message, and the
+                                           capture time of the frame they came from
+    """
+    def __init__(self, host="127.0.0.1", port=8766, capacity=4096, tick_hz=30.0, reuse_port=False):
+        self.host = host
+        self.port = port
+        self.table = SessionTable(capacity)
+        self.tick_interval = 1.0 / tick_hz
+        self.reuse_port = reuse_port
+        self.connections = {}
+        self.session_ids = {}
+        self.decoders = {}
+        self._sent = {}
+
+        self.tick_ms = RingHistogram(4096)
+        self.latency_ms = RingHistogram(65536)
+        self.frames = 0
+        self.rejected = 0
+        self.skipped_writes = 0
+        self.ticks = 0
+
+    async def serve(self, ready=None):
+        from websockets.asyncio.server import serve
+
+        kwargs = {"reuse_port": True} if self.reuse_port else {}
+        async with serve(self._handle, self.host, self.port, compression=None, max_size=2 ** 16,
+                         **kwargs) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            if ready is not None:
+                ready(self.port)
+            await self._tick_loop()
+
+    async def _tick_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            self.tick()
+            await asyncio.sleep(max(0.0, self.tick_interval - (loop.time() - t0)))
+
+    def tick(self):
+        t0 = time.perf_counter()
+        slots, arrivals = self.table.tick()
+        if len(slots):
+            self._send_results(slots)
+        t1 = time.perf_counter()
+        self.ticks += 1
+        self.frames += len(arrivals)
+        self.tick_ms.record((t1 - t0) * 1000)
+        self.latency_ms.extend((t1 - arrivals) * 1000)
+
+    def _send_results(self, slots):
+        from websockets.asyncio.server import broadcast
+
+        for slot in slots.tolist():
+            ws = self.connections.get(slot)
+            if ws is None:
+                continue
+            state = self.table.snapshot(slot)
+            sent = self._sent[slot]
+            delta = {k: v for k, v in state.items() if sent.get(k) != v}
+            if not delta:
+                continue
+            if ws.transport.get_write_buffer_size() > WRITE_LIMIT:
+                self.skipped_writes += 1
+                continue
+            delta["ts"] = float(self.table.result_ts[slot])
+            broadcast([ws], json.dumps({"type": "delta", **delta}))
+            sent.update(state)
+
+    def _on_text(self, slot, ws, raw):
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            return
+        if not isinstance(msg, dict):
+            return
+        kind = msg.get("type")
+        if kind == "hello":
+            if isinstance(msg.get("session"), str):
+                self.session_ids[slot] = msg["session"]
+            if isinstance(msg.get("exercise"), str):
+                self.table.select(slot, msg["exercise"])
+            if msg.get("codec") == "lmk":
+                self.decoders[slot] = LandmarkStreamDecoder()
+        elif kind == "select" and isinstance(msg.get("exercise"), str):
+            self.table.select(slot, msg["exercise"])
+        elif kind == "stats":
+            from websockets.asyncio.server import broadcast
+            broadcast([ws], json.dumps({"type": "stats", **self.stats()}))
+
+    async def _handle(self, ws):
+        from websockets.exceptions import ConnectionClosed
+
+        slot = self.table.open()
+        if slot is None:
+            self.rejected += 1
+            await ws.close(1013, "server full")
+            return
+        self.connections[slot] = ws
+        state = self.table.snapshot(slot)
+        self._sent[slot] = dict(state)
+        try:
+            # Inside the try: a client gone right after the handshake must still free its slot
+            await ws.send(json.dumps({"type": "state", **state}))
+            async for raw in ws:
+                if isinstance(raw, str):
+                    self._on_text(slot, ws, raw)
+                    continue
+                try:
+                    decoder = self.decoders.get(slot)
+                    if decoder is None:
+                        landmarks, ts = decode_frame(raw)
+                    else:
+                        # None until the first keyframe; the exercise comes from select messages
+                        frame = decoder.decode(raw)
+                        if frame is None:
+                            continue
+                        landmarks, ts = frame[:2]
+                except ValueError:
+                    continue
+                self.table.push(slot, landmarks, ts, time.perf_counter())
+        except ConnectionClosed:
+            pass
+        finally:
+            self.connections.pop(slot, None)
+            self._sent.pop(slot, None)
+            self.session_ids.pop(slot, None)
+            self.decoders.pop(slot, None)
+            self.table.close(slot)
+
+    def stats(self):
+        tick, latency = self.tick_ms.summary(), self.latency_ms.summary()
+        return {
+            "sessions": len(self.connections),
+            "frames": self.frames,
+            "ticks": self.ticks,
+            "dropped_frames": int(self.table.dropped.sum()),
+            "rejected": self.rejected,
+            "skipped_writes": self.skipped_writes,
+            "tick_ms_p50": tick["p50"],
+            "tick_ms_p99": tick["p99"],
+            "latency_ms_p50": latency["p50"],
+            "latency_ms_p99": latency["p99"],
+        }
+
+
+def _serve_worker(host, port, capacity, tick_hz, reuse_port):
+    asyncio.run(IngestServer(host, port, capacity, tick_hz, reuse_port).serve(
+        ready=lambda p: print(f"Ingest worker listening on ws://{host}:{p}", flush=True)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched rule evaluation for landmark streams from many devices")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--capacity", type=int, default=4096, help="Sessions per worker")
+    parser.add_argument("--tick-hz", type=float, default=30.0, help="Rule evaluation ticks per second")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes sharing the port (SO_REUSEPORT, Linux); sessions are spread over them")
+    args = parser.parse_args(argv)
+
+    if args.workers == 1:
+        _serve_worker(args.host, args.port, args.capacity, args.tick_hz, False)
+        return
+    workers = [mp.Process(target=_serve_worker, args=(args.host, args.port, args.capacity, args.tick_hz, True))
+               for _ in range(args.workers)]
+    for p in workers:
+        p.start()
+    try:
+        for p in workers:
+            p.join()
+    except KeyboardInterrupt:
+        for p in workers:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+# Frame loop stages in display order
+STAGES = ("capture", "color", "inference", "landmarks", "rules", "coach", "hud", "display")
+QUANTILES = (50, 90, 99)
+# Startup milestones in display order
+STARTUP_MARKS = ("camera_open", "engine_ready", "first_frame", "first_landmarks")
+
+
+class RingHistogram:
+    """
+    Fixed-size ring buffer of the most recent samples (milliseconds). Recording is a single
+    array store; percentiles are only computed when someone asks for them.
+    """
+    def __init__(self, size=1024):
+        self.samples = np.zeros(size)
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+
+    def record(self, value):
+        self.samples[self.count % self.size] = value
+        self.count += 1
+        self.total += value
+        self.last = value
+
+    def extend(self, values):
+        """Records a batch of samples with one vectorized store."""
+        values = np.asarray(values, dtype=np.float64)[-self.size:]
+        if not len(values):
+            return
+        idx = (self.count + np.arange(len(values))) % self.size
+        self.samples[idx] = values
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.last = float(values[-1])
+
+    def window(self):
+        return self.samples[:min(self.count, self.size)]
+
+    def summary(self):
+        window = self.window()
+        if not len(window):
+            return {"count": 0, "sum": 0.0, "mean": 0.0, "last": 0.0, **{f"p{q}": 0.0 for q in QUANTILES}}
+        values = np.percentile(window, QUANTILES)
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": float(window.mean()),
+            "last": self.last,
+            **{f"p{q}": float(v) for q, v in zip(QUANTILES, values)},
+        }
+
+
+class StartupTimer:
+    """
+    Seconds from t0 (the start of main()) to each startup milestone, first occurrence only, plus
+    the durations of the engine loader's stages. Time to first frame is the first camera frame on
+    screen (loading HUD included), time to first landmarks the first frame rendered with a body.
+    """
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.marks = {}
+        self.stages = {}
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.t0
+
+    def stage(self, name, t0):
+        """Records perf_counter() - t0 as stage 'name' and returns the new perf_counter()."""
+        t1 = time.perf_counter()
+        self.stages[name] = t1 - t0
+        return t1
+
+    def elapsed(self):
+        return time.perf_counter() - self.t0
+
+    def snapshot(self):
+        return {"marks_s": dict(self.marks), "stages_s": dict(self.stages)}
+
+    def format_summary(self):
+        marks = "  ".join(f"{name} {self.marks[name]:.2f}s" for name in STARTUP_MARKS if name in self.marks)
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in list(self.stages.items()))
+        return f"  {marks}" + (f"  (loader: {stages})" if stages else "")
+
+
+class Instrumentation:
+    """
+    Per-stage timings and capture-to-display latency for the frame loop.
+
+        t = time.perf_counter()
+        ...convert...
+        t = metrics.lap("color", t)      # records the stage and restarts the stopwatch
+        ...
+        metrics.frame_done(capture_ts)   # right after imshow; capture_ts is time.monotonic()
+
+    Stages may be recorded from different threads (pipeline mode), one writer per stage.
+    """
+    def __init__(self, size=1024, jsonl_path=None, export_interval=5.0):
+        self.size = size
+        self.stages = {name: RingHistogram(size) for name in STAGES}
+        self.latency = RingHistogram(size)
+        self.frame_interval = RingHistogram(size)
+        self._last_frame = None
+        self.jsonl_path = jsonl_path
+        self.export_interval = export_interval
+        self._next_export = time.monotonic() + export_interval
+        self._lock = threading.Lock()
+        self.startup = StartupTimer()
+
+    def histogram(self, name):
+        hist = self.stages.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.stages.setdefault(name, RingHistogram(self.size))
+        return hist
+
+    def record(self, name, ms):
+        self.histogram(name).record(ms)
+
+    def lap(self, name, t0):
+        """Records perf_counter() - t0 under 'name' and returns the new perf_counter()."""
+        t1 = time.perf_counter()
+        self.histogram(name).record((t1 - t0) * 1000)
+        return t1
+
+    def record_inference(self, t0, prepare_ms=0.0):
+        """Splits one process_frame call started at t0 into 'color' (input preparation) and 'inference'."""
+        total = (time.perf_counter() - t0) * 1000
+        if prepare_ms:
+            self.histogram("color").record(prepare_ms)
+        self.histogram("inference").record(max(total - prepare_ms, 0.0))
+
+    def frame_done(self, capture_ts=None):
+        """Call once a frame has been handed to the display, with its capture time (time.monotonic())."""
+        now = time.monotonic()
+        if capture_ts is not None:
+            self.latency.record((now - capture_ts) * 1000)
+        if self._last_frame is not None:
+            self.frame_interval.record((now - self._last_frame) * 1000)
+        self._last_frame = now
+        if self.jsonl_path and now >= self._next_export:
+            self._next_export = now + self.export_interval
+            self.export_jsonl()
+
+    @property
+    def fps(self):
+        window = self.frame_interval.window()
+        return 1000.0 / window.mean() if len(window) and window.mean() > 0 else 0.0
+
+    def snapshot(self):
+        return {
+            "ts": time.time(),
+            "fps": self.fps,
+            "latency_ms": self.latency.summary(),
+            "stages_ms": {name: hist.summary() for name, hist in list(self.stages.items()) if hist.count},
+            "startup": self.startup.snapshot(),
+        }
+
+    def to_json_line(self):
+        return json.dumps(self.snapshot())
+
+    def export_jsonl(self, path=None):
+        with open(path or self.jsonl_path, "a") as f:
+            f.write(self.to_json_line() + "\n")
+
+    def prometheus_text(self, prefix="physio"):
+        """Prometheus text exposition format: one summary per stage plus latency and FPS."""
+        lines = [f"# HELP {prefix}_stage_ms Frame loop stage duration in milliseconds.",
+                 f"# TYPE {prefix}_stage_ms summary"]
+        for name, hist in list(self.stages.items()):
+            if not hist.count:
+                continue
+            s = hist.summary()
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_ms{{stage="{name}",quantile="{q / 100}"}} {s[f"p{q}"]:.4f}')
+            lines.append(f'{prefix}_stage_ms_sum{{stage="{name}"}} {s["sum"]:.4f}')
+            lines.append(f'{prefix}_stage_ms_count{{stage="{name}"}} {s["count"]}')
+        s = self.latency.summary()
+        lines += [f"# HELP {prefix}_latency_ms Capture to display latency in milliseconds.",
+                  f"# TYPE {prefix}_latency_ms summary"]
+        lines += [f'{prefix}_latency_ms{{quantile="{q / 100}"}} {s[f"p{q}"]:.4f}' for q in QUANTILES]
+        lines += [f"{prefix}_latency_ms_sum {s['sum']:.4f}", f"{prefix}_latency_ms_count {s['count']}"]
+        lines += [f"# HELP {prefix}_fps Displayed frames per second.", f"# TYPE {prefix}_fps gauge",
+                  f"{prefix}_fps {self.fps:.2f}"]
+        lines += [f"# HELP {prefix}_startup_seconds Seconds from launch to each startup milestone.",
+                  f"# TYPE {prefix}_startup_seconds gauge"]
+        lines += [f'{prefix}_startup_seconds{{milestone="{name}"}} {sec:.4f}'
+                  for name, sec in list(self.startup.marks.items())]
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self):
+        lines = [f"  {'stage':<10} {'p50':>7} {'p90':>7} {'p99':>7}  (ms)"]
+        for name, hist in list(self.stages.items()):
+            if hist.count:
+                s = hist.summary()
+                lines.append(f"  {name:<10} {s['p50']:7.2f} {s['p90']:7.2f} {s['p99']:7.2f}")
+        s = self.latency.summary()
+        lines.append(f"  {'latency':<10} {s['p50']:7.2f} {s['p90']:7.2f} {s['p99']:7.2f}  | {self.fps:.1f} FPS")
+        return "\n".join(lines)
+
+    def draw_overlay(self, canvas, origin=(20, 110)):
+        """FPS, latency and the last-window mean of every stage, top-left under the header."""
+        x, y = origin
+        rows = [f"{self.fps:5.1f} FPS  latency p50 {self.latency.summary()['p50']:5.1f} ms"]
+        for name, hist in list(self.stages.items()):
+            if hist.count:
+                window = hist.window()
+                rows.append(f"{name:<10}{window.mean():6.2f} ms")
+        cv2.rectangle(canvas, (x - 10, y - 20), (x + 330, y + 22 * len(rows) - 10), (0, 0, 0), -1)
+        for i, row in enumerate(rows):
+            cv2.putText(canvas, row, (x, y + 22 * i), cv2.FONT_HERSHEY_PLAIN, 1.2, (255, 229, 0), 1)
+        return canvas
+
+
+class MetricsServer:
+    """
+    Serves /metrics (Prometheus text) and /metrics.json from a daemon thread.
+    """
+    def __init__(self, metrics, host="127.0.0.1", port=9108):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, ctype = metrics.prometheus_text(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, ctype = metrics.to_json_line(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
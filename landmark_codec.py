@@ -0,0 +1,348 @@
+import argparse
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+# Quantization bounds of x, y (normalized; landmarks may lie a little off-frame) and z
+BOUNDS = np.array([[-0.5, 1.5], [-0.5, 1.5], [-2.0, 2.0]])
+STEP = (BOUNDS[:, 1] - BOUNDS[:, 0]) / 65535
+
+ARCHIVE_EXT = ".lmk"
+ARCHIVE_MAGIC = b"LMKA"
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER = struct.Struct("<4sHI")      # magic, version, meta json bytes
+BLOCK_MAGIC = b"LMKB"
+BLOCK_HEADER = struct.Struct("<4sHdI")       # magic, frames, first timestamp, compressed payload bytes
+PACKET_HEADER = struct.Struct("<BBd")        # flags, exercise index, timestamp
+KEYFRAME, PRESENT = 1, 2
+# A Z_SYNC_FLUSH always ends with this marker; packets leave it out and the decoder puts it back
+SYNC_MARKER = b"\x00\x00\xff\xff"
+
+
+def quantize(landmarks):
+    """
+    (..., 33, 4) landmarks -> (coords (..., 33, 3) int16, visibility (..., 33) uint8). Coordinates
+    are clipped to BOUNDS and rounded to 1/65535 of the range (~3e-5 of the frame for x, y).
+    NaN (no body) becomes 0; callers keep the presence separately.
+    """
+    lm = np.nan_to_num(np.asarray(landmarks, dtype=np.float64))
+    coords = np.clip(lm[..., :3], BOUNDS[:, 0], BOUNDS[:, 1])
+    coords -= BOUNDS[:, 0]
+    coords /= STEP
+    coords -= 32768
+    vis = np.clip(lm[..., 3], 0.0, 1.0) * 255
+    return np.rint(coords).astype(np.int16), np.rint(vis).astype(np.uint8)
+
+
+def dequantize(coords, vis):
+    """Inverse of quantize() -> (..., 33, 4) float32."""
+    out = np.empty(coords.shape[:-1] + (4,), dtype=np.float32)
+    out[..., :3] = (coords.astype(np.float32) + 32768) * STEP.astype(np.float32) + BOUNDS[:, 0].astype(np.float32)
+    out[..., 3] = vis * np.float32(1 / 255)
+    return out
+
+
+def _shuffle(arr):
+    """int16 array -> little-endian low bytes followed by high bytes (small deltas make the high plane compress)."""
+    return np.ascontiguousarray(arr, dtype="<i2").view(np.uint8).reshape(-1, 2).T.tobytes()
+
+
+def _unshuffle(data, shape):
+    return np.frombuffer(data, dtype=np.uint8).reshape(2, -1).T.copy().view("<i2").reshape(shape)
+
+
+def _fill_missing(coords, vis, present):
+    """Frames without a body repeat the last frame with one (zero deltas); leading ones stay 0."""
+    idx = np.maximum.accumulate(np.where(present, np.arange(len(present)), -1))
+    coords, vis = coords[np.maximum(idx, 0)], vis[np.maximum(idx, 0)]
+    coords[idx < 0] = 0
+    vis[idx < 0] = 0
+    return coords, vis
+
+
+def encode_blocks(landmarks, timestamps, exercise_ids=None, keyframe_interval=30, level=6):
+    """
+    Encodes a (T, 33, 4) sequence (NaN rows = no body) as a list of independently decodable blocks
+    of keyframe_interval frames. Each block starts with a keyframe (absolute quantized values);
+    the other frames are int16 / uint8 differences to the previous frame, which zlib packs tightly.
+    Timestamps are kept to the microsecond.
+    """
+    landmarks = np.asarray(landmarks)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    n = len(landmarks)
+    exercise_ids = np.zeros(n, dtype=np.uint8) if exercise_ids is None else np.asarray(exercise_ids, dtype=np.uint8)
+    present = ~np.isnan(landmarks[:, :, :2]).any(axis=(1, 2)) if n else np.zeros(0, dtype=bool)
+    coords, vis = _fill_missing(*quantize(landmarks), present)
+    deltas, vis_deltas = coords.copy(), vis.copy()
+    deltas[1:] -= coords[:-1]
+    vis_deltas[1:] -= vis[:-1]
+    starts = np.arange(0, n, keyframe_interval)
+    deltas[starts] = coords[starts]
+    vis_deltas[starts] = vis[starts]
+
+    blocks = []
+    for start in starts.tolist():
+        end = min(n, start + keyframe_interval)
+        t0 = timestamps[start]
+        micros = np.rint((timestamps[start:end] - t0) * 1e6).astype(np.int64)
+        steps = np.diff(micros, prepend=0)
+        if np.abs(steps).max() >= 2 ** 31:
+            raise ValueError("timestamps within a block must be less than ~35 minutes apart")
+        payload = b"".join((present[start:end].astype(np.uint8).tobytes(), exercise_ids[start:end].tobytes(),
+                            steps.astype("<i4").tobytes(), _shuffle(deltas[start:end]), vis_deltas[start:end].tobytes()))
+        data = zlib.compress(payload, level)
+        blocks.append(BLOCK_HEADER.pack(BLOCK_MAGIC, end - start, t0, len(data)) + data)
+    return blocks
+
+
+def decode_blocks(blocks):
+    """
+    Decodes blocks from encode_blocks() in one vectorized pass: the per-block prefix sums of the
+    deltas are one wrapping int16 cumsum over all frames, minus its value before each keyframe.
+    Returns (landmarks (T, 33, 4) float32 with NaN rows, timestamps (T,) float64, exercise_ids (T,) uint8).
+    """
+    sizes, t0s, fields = [], [], []
+    for block in blocks:
+        magic, n, t0, length = BLOCK_HEADER.unpack_from(block)
+        if magic != BLOCK_MAGIC:
+            raise ValueError("not a landmark block")
+        payload = zlib.decompress(block[BLOCK_HEADER.size:BLOCK_HEADER.size + length])
+        offsets = np.cumsum([0, n, n, 4 * n, 2 * 99 * n, 33 * n])
+        fields.append([payload[a:b] for a, b in zip(offsets[:-1], offsets[1:])])
+        sizes.append(n)
+        t0s.append(t0)
+    if not sizes:
+        return np.zeros((0, 33, 4), dtype=np.float32), np.zeros(0), np.zeros(0, dtype=np.uint8)
+    present = np.frombuffer(b"".join(f[0] for f in fields), dtype=np.uint8).astype(bool)
+    exercise_ids = np.frombuffer(b"".join(f[1] for f in fields), dtype=np.uint8).copy()
+    steps = np.frombuffer(b"".join(f[2] for f in fields), dtype="<i4")
+    deltas = np.concatenate([_unshuffle(f[3], (n, 33, 3)) for f, n in zip(fields, sizes)])
+    vis_deltas = np.frombuffer(b"".join(f[4] for f in fields), dtype=np.uint8).reshape(-1, 33)
+
+    starts = np.cumsum([0] + sizes[:-1])
+    block_of = np.repeat(np.arange(len(sizes)), sizes)
+    coords = np.cumsum(deltas, axis=0, dtype=np.int16)
+    vis = np.cumsum(vis_deltas, axis=0, dtype=np.uint8)
+    before = starts - 1
+    first = before < 0
+    coords -= np.where(first[:, None, None], 0, coords[np.maximum(before, 0)]).astype(np.int16)[block_of]
+    vis -= np.where(first[:, None], 0, vis[np.maximum(before, 0)]).astype(np.uint8)[block_of]
+
+    micros = np.cumsum(steps.astype(np.int64))
+    micros -= np.where(first, 0, micros[np.maximum(before, 0)])[block_of]
+    timestamps = np.asarray(t0s)[block_of] + micros / 1e6
+    landmarks = dequantize(coords, vis)
+    landmarks[~present] = np.nan
+    return landmarks, timestamps, exercise_ids
+
+
+class ArchiveWriter:
+    """
+    Appends frames to a compressed landmark archive (.lmk): a small header with JSON metadata
+    followed by encode_blocks() blocks. Same append()/close() interface as recording.LandmarkRecorder;
+    a block is written every keyframe_interval frames, so a crash loses at most that many.
+    """
+    def __init__(self, path, exercises=None, keyframe_interval=30, level=6, **meta):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.frames = 0
+        self._lm_buf = np.empty((keyframe_interval, 33, 4), dtype=np.float32)
+        self._ts_buf = np.empty(keyframe_interval, dtype=np.float64)
+        self._ex_buf = np.empty(keyframe_interval, dtype=np.uint8)
+        self._buffered = 0
+        header = json.dumps(dict(meta, exercises=list(exercises or []), keyframe_interval=keyframe_interval,
+                                 bounds=BOUNDS.tolist())).encode("utf-8")
+        self._file = open(path, "wb")
+        self._file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, len(header)) + header)
+
+    def append(self, landmarks, timestamp, exercise_idx=0):
+        i = self._buffered
+        self._lm_buf[i] = np.nan if landmarks is None else landmarks
+        self._ts_buf[i] = timestamp
+        self._ex_buf[i] = exercise_idx
+        self._buffered += 1
+        self.frames += 1
+        if self._buffered == self.keyframe_interval:
+            self.flush()
+
+    def extend(self, landmarks, timestamps, exercise_ids=None):
+        """Appends a whole sequence; full blocks are encoded in one vectorized call."""
+        n = len(landmarks)
+        exercise_ids = np.zeros(n, dtype=np.uint8) if exercise_ids is None else exercise_ids
+        i = 0
+        while i < n and self._buffered:
+            self.append(landmarks[i], timestamps[i], exercise_ids[i])
+            i += 1
+        whole = i + (n - i) // self.keyframe_interval * self.keyframe_interval
+        for block in encode_blocks(landmarks[i:whole], timestamps[i:whole], exercise_ids[i:whole],
+                                   self.keyframe_interval, self.level):
+            self._file.write(block)
+        self.frames += whole - i
+        for j in range(whole, n):
+            self.append(landmarks[j], timestamps[j], exercise_ids[j])
+
+    def flush(self):
+        n = self._buffered
+        if n:
+            for block in encode_blocks(self._lm_buf[:n], self._ts_buf[:n], self._ex_buf[:n], n, self.level):
+                self._file.write(block)
+            self._file.flush()
+            self._buffered = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_archive(path, start=0, stop=None):
+    """
+    Opens a .lmk archive like recording.load_recording: returns (landmarks (T, 33, 4) float32,
+    timestamps, exercise_ids, meta). 'start' / 'stop' select a frame range; only the blocks
+    covering it are decompressed. A truncated last block (crash while writing) is ignored.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, meta_len = ARCHIVE_HEADER.unpack_from(data)
+    if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+        raise ValueError(f"{path} is not a version {ARCHIVE_VERSION} landmark archive")
+    pos = ARCHIVE_HEADER.size + meta_len
+    meta = json.loads(data[ARCHIVE_HEADER.size:pos])
+    blocks, first_frames, frames = [], [], 0
+    while pos + BLOCK_HEADER.size <= len(data):
+        _, n, _, length = BLOCK_HEADER.unpack_from(data, pos)
+        end = pos + BLOCK_HEADER.size + length
+        if end > len(data):
+            break
+        blocks.append((pos, end))
+        first_frames.append(frames)
+        frames += n
+        pos = end
+    stop = frames if stop is None else min(stop, frames)
+    start = min(max(start, 0), stop)
+    first = max(0, int(np.searchsorted(first_frames, start, side="right")) - 1)
+    last = int(np.searchsorted(first_frames, stop, side="left"))
+    landmarks, timestamps, exercise_ids = decode_blocks([data[a:b] for a, b in blocks[first:last]])
+    skip = start - (first_frames[first] if blocks else 0)
+    meta["frames"] = frames
+    return (landmarks[skip:skip + stop - start], timestamps[skip:skip + stop - start],
+            exercise_ids[skip:skip + stop - start], meta)
+
+
+class LandmarkStreamEncoder:
+    """
+    Per-frame packets for sending landmarks between processes or hosts: a PACKET_HEADER (flags,
+    exercise index, float64 capture time) followed, for frames with a body, by the quantized frame,
+    delta-coded against the previous one and compressed with a deflate stream that is flushed
+    every packet. Every keyframe_interval frames a keyframe restarts the stream, so a receiver can
+    join (or recover from a lost packet) there.
+    """
+    def __init__(self, keyframe_interval=30, level=6):
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self._compressor = None
+        self._prev = None
+        self._since_key = 0
+
+    def encode(self, landmarks, timestamp, exercise_idx=0):
+        if landmarks is None or np.isnan(landmarks[:, :2]).any():
+            return PACKET_HEADER.pack(0, exercise_idx, timestamp)
+        coords, vis = quantize(landmarks)
+        flags = PRESENT
+        if self._prev is None or self._since_key >= self.keyframe_interval:
+            flags |= KEYFRAME
+            self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+            self._since_key = 0
+            payload = coords, vis
+        else:
+            payload = coords - self._prev[0], vis - self._prev[1]
+        self._prev = coords, vis
+        self._since_key += 1
+        data = self._compressor.compress(_shuffle(payload[0]) + payload[1].tobytes())
+        data += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return PACKET_HEADER.pack(flags, exercise_idx, timestamp) + data[:-len(SYNC_MARKER)]
+
+
+class LandmarkStreamDecoder:
+    """
+    Receiving side of LandmarkStreamEncoder. decode() returns (landmarks (33, 4) float32 or None,
+    timestamp, exercise index), or None while it waits for a keyframe (after joining mid-stream
+    or a corrupt packet).
+    """
+    def __init__(self):
+        self._decompressor = None
+        self._prev = None
+        self.skipped = 0
+
+    def decode(self, packet):
+        if len(packet) < PACKET_HEADER.size:
+            raise ValueError(f"packet must be at least {PACKET_HEADER.size} bytes, got {len(packet)}")
+        flags, exercise_idx, timestamp = PACKET_HEADER.unpack_from(packet)
+        if not flags & PRESENT:
+            return None, timestamp, exercise_idx
+        if flags & KEYFRAME:
+            self._decompressor = zlib.decompressobj(-15)
+        elif self._decompressor is None:
+            self.skipped += 1
+            return None
+        try:
+            raw = self._decompressor.decompress(packet[PACKET_HEADER.size:] + SYNC_MARKER)
+            coords, vis = _unshuffle(raw[:198], (33, 3)), np.frombuffer(raw[198:231], dtype=np.uint8)
+        except (zlib.error, ValueError):
+            self._decompressor = None
+            self.skipped += 1
+            return None
+        if not flags & KEYFRAME:
+            coords, vis = coords + self._prev[0], vis + self._prev[1]
+        self._prev = coords, vis
+        return dequantize(coords, vis), timestamp, exercise_idx
+
+
+def pack_recording(recording, out, keyframe_interval=30, level=6):
+    """Converts a recording folder (recording.py) to a .lmk archive. Returns the frame count."""
+    from recording import load_recording
+
+    landmarks, timestamps, exercise_ids, meta = load_recording(recording)
+    extra = {k: v for k, v in meta.items() if k not in ("version", "frame_shape", "frames", "exercises")}
+    with ArchiveWriter(out, exercises=meta.get("exercises"), keyframe_interval=keyframe_interval, level=level,
+                       **extra) as writer:
+        writer.extend(landmarks, timestamps, exercise_ids)
+    return writer.frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compressed landmark archives (.lmk)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="Compress a recording folder into a .lmk archive")
+    pack.add_argument("recording")
+    pack.add_argument("out")
+    pack.add_argument("--keyframe-interval", type=int, default=30, help="Frames per independently decodable block")
+    unpack = sub.add_parser("unpack", help="Expand a .lmk archive into a recording folder")
+    unpack.add_argument("archive")
+    unpack.add_argument("out")
+    args = parser.parse_args(argv)
+    if args.command == "pack":
+        frames = pack_recording(args.recording, args.out, args.keyframe_interval)
+        raw = frames * (33 * 4 * 4 + 9)
+        size = os.path.getsize(args.out)
+        print(f"{frames} frames: {size / 1024:.0f} KiB ({raw / max(size, 1):.1f}x smaller than the raw recording)")
+    else:
+        from recording import save_recording
+
+        landmarks, timestamps, exercise_ids, meta = read_archive(args.archive)
+        extra = {k: v for k, v in meta.items() if k not in ("exercises", "frames", "keyframe_interval", "bounds")}
+        save_recording(args.out, landmarks, timestamps, exercise_ids, meta.get("exercises"), **extra)
+        print(f"{len(landmarks)} frames written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
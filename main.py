@@ -1,324 +1,393 @@
+import argparse
 import cv2
 import time
-import json
 import numpy as np
 from pose_engine import PoseEngine
-from biomechanics import get_joint_angles, calculate_angle
-from ghost_coach import GhostCoach
+from frame_scheduler import AdaptiveScheduler
+from model_tuner import CalibrationError, load_clip, select_model
+from rules import EXERCISES, compile_all
+from session import ExerciseSession
+from template_registry import default_registry
+from ghost_coach import GhostCoach, GhostSpriteCache
+from correction_engine import CorrectionEngine
+from frame_buffers import FrameBuffers
 from ui_manager import UIManager
+from clock import SystemClock
+from landmark_codec import ARCHIVE_EXT, ArchiveWriter
+from recording import LandmarkRecorder
+from session_recorder import SessionRecorder
+from pipeline import FramePipeline, DROP_POLICIES, DROP_OLDEST
+from instrumentation import Instrumentation, MetricsServer, StartupTimer
+from startup import EngineLoader
+from telemetry import TelemetryHub, TelemetryServer
+from event_log import EventLog
 import utils
 
-def main():
-    print("Initializng ELITE AI Physiotherapy System...")
-    engine = PoseEngine(min_detection_confidence=0.85, min_tracking_confidence=0.85)
-    coach = GhostCoach()
-    ui = UIManager()
-    
-    exercises = [
-        "squat", "lunge", "jumping_jacks", "high_knees", 
-        "bicep_curl", "shoulder_press", "calf_raises", "torso_twist"
-    ]
-    current_idx = 0
-    
-    def load_template(idx):
-        try:
-            with open(f'templates/{exercises[idx]}.json', 'r') as f:
-                return json.load(f)
-        except:
-            return {"target_angles": {"knee_angle": 100}, "tolerance": 20}
+WINDOW_NAME = 'AI Physiotherapy Assistant'
 
-    template = load_template(current_idx)
-    
-    # State Machine V3 (STRICT ISOLATION)
-    # Using a state dict to prevent leakage between exercises
-    state_tracker = {ex: {"counter": 0, "bottomed": False, "last_rep_time": 0} for ex in exercises}
-    
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    if not cap.isOpened():
-        print("Error: Could not open camera.")
-        return
+def create_context():
+    """
+    Mutable state shared by the render stage and the key handler.
+    """
+    return {
+        "session": ExerciseSession(EXERCISES),
+        "clock": SystemClock(),
+        "recorder": None,
+        "video": None,
+        "coach_cache": None,
+        "correction": None,
+        "metrics": Instrumentation(),
+        "metrics_overlay": False,
+        "telemetry": None,
+        "buffers": FrameBuffers(),
+    }
 
-    print("Elite Strict Engine Active.")
+def apply_remote_commands(ctx):
+    """
+    Applies exercise switches sent from the dashboard since the last frame.
+    """
+    for cmd in ctx["telemetry"].poll_commands():
+        ctx["session"].select(cmd["exercise"])
 
-    while cap.isOpened():
-        success, frame = cap.read()
-        if not success: break
-            
-        frame = cv2.flip(frame, 1)
-        h, w, _ = frame.shape
-        canvas = np.zeros((h, w * 2, 3), dtype=np.uint8)
-        
-        results = engine.process_frame(frame)
-        landmarks = engine.get_landmarks_array(results)
-        
-        is_form_correct = False
-        depth_percent = 0.0
-        ex = exercises[current_idx]
-        feedback_msg = "NO BODY DETECTED"
-        
-        if landmarks is not None:
-            angles = get_joint_angles(landmarks)
-            ex = exercises[current_idx]
-            st = state_tracker[ex]
-            
-            # --- ULTIMATE ISOLATION: Wipe background states ---
-            # This prevents any movement while in one "tab" from ever being remembered by another
-            for other_ex in exercises:
-                if other_ex != ex:
-                    state_tracker[other_ex]["bottomed"] = False
-            
-            # --- 1. INITIALIZE & CALCULATE METRICS ---
-            knee_val = (angles.get('left_knee', 180) + angles.get('right_knee', 180)) / 2
-            hip_val = (angles.get('left_hip', 180) + angles.get('right_hip', 180)) / 2
-            
-            l_sh = calculate_angle(landmarks[23][:2], landmarks[11][:2], landmarks[13][:2])
-            r_sh = calculate_angle(landmarks[24][:2], landmarks[12][:2], landmarks[14][:2])
-            arm_val = (l_sh + r_sh) / 2
-            
-            feedback_msg = "PERFECT FORM"
-            is_form_correct = True
-            
-            # --- 2. VISIBILITY & FORM CHECK ---
-            seated_exercises = ["bicep_curl", "shoulder_press", "torso_twist"]
-            if ex in seated_exercises:
-                vis_points = [11, 12, 13, 14, 15, 16] # Just upper body
-            else:
-                vis_points = [23, 24, 25, 26, 27, 28] # Critical lower body
-                
-            full_body_vis = all(landmarks[i][3] > 0.6 for i in vis_points)
-            
-            if not full_body_vis:
-                is_form_correct = False
-                feedback_msg = "ADJUST VIEW ->" if ex in seated_exercises else "STEP BACK ->"
-                st["bottomed"] = False
-            else:
-                # Exercise Specific Corrections
-                if ex == "squat":
-                    if abs(hip_val - knee_val) > 45 and knee_val < 160: 
-                        feedback_msg = "TOO MUCH LEAN!"; is_form_correct = False
-                    knee_dist = abs(landmarks[25][0] - landmarks[26][0])
-                    feet_dist = abs(landmarks[27][0] - landmarks[28][0])
-                    if knee_dist < feet_dist * 0.7:
-                        feedback_msg = "KNEES OUT!"; is_form_correct = False
+def render_frame(frame, results, ctx, engine, coach, ui, capture_ts=None):
+    """
+    Runs the exercise logic for one (already mirrored) frame and composes the display canvas
+    (a preallocated canvas from ctx["buffers"], reused two frames later).
+    """
+    if ctx["telemetry"] is not None:
+        apply_remote_commands(ctx)
+    metrics = ctx["metrics"]
+    t = time.perf_counter()
+    session = ctx["session"]
+    now = ctx["clock"].now()
+    h, w, _ = frame.shape
+    canvas = ctx["buffers"].compose(frame)
+    camera = canvas[:, :w]
 
-                elif ex == "jumping_jacks":
-                    l_el = calculate_angle(landmarks[11][:2], landmarks[13][:2], landmarks[15][:2])
-                    r_el = calculate_angle(landmarks[12][:2], landmarks[14][:2], landmarks[16][:2])
-                    if l_el < 140 or r_el < 140:
-                        feedback_msg = "STRAIGHTEN ARMS!"; is_form_correct = False
+    landmarks = engine.get_landmarks_array(results)
+    predicted = getattr(results, "is_predicted", False)
+    if ctx["recorder"] is not None:
+        # The time the rules see below, so a replay reproduces their cooldowns exactly
+        ctx["recorder"].append(landmarks, now, session.current_idx)
+    video = ctx["video"]
+    if video is not None and video.raw:
+        # Before anything is drawn on the camera half
+        video.submit(frame, now if capture_ts is None else capture_ts, landmarks, session.current_idx)
+    t = metrics.lap("landmarks", t)
 
-                elif ex == "high_knees":
-                    torso_lean = abs(landmarks[11][0] - landmarks[23][0])
-                    if torso_lean > 0.15:
-                        feedback_msg = "STAND TALL!"; is_form_correct = False
+    ex = session.exercise
+    is_form_correct, depth_percent, feedback_msg = session.update(landmarks, now, predicted=predicted)
 
-                elif ex == "bicep_curl":
-                    l_el = calculate_angle(landmarks[11][:2], landmarks[13][:2], landmarks[15][:2])
-                    r_el = calculate_angle(landmarks[12][:2], landmarks[14][:2], landmarks[16][:2])
-                    
-                    # Movement Authentication: Wrists MUST stay below shoulders for a curl
-                    wrist_below = landmarks[15][1] > landmarks[11][1] and landmarks[16][1] > landmarks[12][1]
-                    if not wrist_below:
-                        feedback_msg = "KEEP HANDS BELOW SHOULDERS"; is_form_correct = False
-                    elif abs(l_el - r_el) > 40:
-                        feedback_msg = "SYNC BOTH ARMS!"; is_form_correct = False
-                        
-                elif ex == "shoulder_press":
-                    l_el_ang = calculate_angle(landmarks[11][:2], landmarks[13][:2], landmarks[15][:2])
-                    r_el_ang = calculate_angle(landmarks[12][:2], landmarks[14][:2], landmarks[16][:2])
-                    elbow_avg = (l_el_ang + r_el_ang) / 2
-                    
-                    # BIOMETRIC ZONE: In a press, ELBOWS must be at or above shoulder level
-                    # This prevents Bicep Curls (elbows at ribs) from being detected here
-                    l_elbow_y, r_elbow_y = landmarks[13][1], landmarks[14][1]
-                    sh_y = (landmarks[11][1] + landmarks[12][1]) / 2
-                    
-                    if l_elbow_y > sh_y + 0.05 or r_elbow_y > sh_y + 0.05:
-                        feedback_msg = "RAISE ELBOWS TO SHOULDER LEVEL"; is_form_correct = False
-                    elif abs(l_el_ang - r_el_ang) > 45:
-                        feedback_msg = "SYNC BOTH ARMS!"; is_form_correct = False
-                
-                elif ex == "lunge":
-                    active_knee = min(angles.get('left_knee', 180), angles.get('right_knee', 180))
-                    # Lunge should have a significant knee bend
-                    if active_knee > 160 and depth_percent > 0.1:
-                        feedback_msg = "GO DEEPER!"; is_form_correct = False
-                    # Check for chest leaning forward too much
-                    torso_tilt = abs(landmarks[11][0] - landmarks[23][0])
-                    if torso_tilt > 0.12:
-                        feedback_msg = "KEEP CHEST UP"; is_form_correct = False
+    if landmarks is not None:
+        metrics.startup.mark("first_landmarks")
+        if session.take_inference_request():
+            # A rep transition is pending on predicted landmarks: let real inference decide it
+            engine.request_inference()
+        coach_progress = session.coach_progress(now)
+        t = metrics.lap("rules", t)
 
-            
-            # --- 3. REP COUNTING (STRICT ISOLATION) ---
-            if ex == "squat":
-                if knee_val < 135 and is_form_correct: st["bottomed"] = True
-                elif knee_val > 165 and st["bottomed"]:
-                    if is_form_correct and (time.time() - st["last_rep_time"] > 1.5):
-                        st["counter"] += 1
-                        st["last_rep_time"] = time.time()
-                    st["bottomed"] = False
-                depth_percent = np.clip((170 - knee_val) / 60, 0, 1)
+        # Render Coach: static floor grid + cached ghost sprite for the current phase
+        if ctx["coach_cache"] is None: ctx["coach_cache"] = GhostSpriteCache(coach)
+        if ctx["correction"] is not None:
+            # Ghost pulled along the user's correction field: drawn every frame instead of a cached sprite
+            base = ctx["coach_cache"].get_animated_pose(ex, int(now*1000), user_progress=coach_progress)
+            ghost = ctx["correction"].get_corrected_ghost(base, landmarks)
+            ctx["coach_cache"].render_pose(canvas[:, w:], ghost)
+        else:
+            ctx["coach_cache"].render(canvas[:, w:], ex, int(now*1000), user_progress=coach_progress)
+        t = metrics.lap("coach", t)
 
-            elif ex == "jumping_jacks":
-                if arm_val > 140 and is_form_correct: st["bottomed"] = True
-                elif arm_val < 60 and st["bottomed"]:
-                    if is_form_correct and (time.time() - st["last_rep_time"] > 1.0):
-                        st["counter"] += 1
-                        st["last_rep_time"] = time.time()
-                    st["bottomed"] = False
-                depth_percent = np.clip((arm_val - 40) / 110, 0, 1)
+        # Draw User Skeleton
+        sk_color = (0, 255, 136) if is_form_correct else (0, 61, 255)
+        engine.draw_landmarks_array(camera, landmarks, color=sk_color)
 
-            elif ex == "high_knees":
-                active_hip = max(180 - angles.get('left_hip', 180), 180 - angles.get('right_hip', 180))
-                if active_hip > 70 and is_form_correct: st["bottomed"] = True
-                elif active_hip < 30 and st["bottomed"]:
-                    if is_form_correct and (time.time() - st["last_rep_time"] > 1.0):
-                        st["counter"] += 1
-                        st["last_rep_time"] = time.time()
-                    st["bottomed"] = False
-                depth_percent = np.clip(active_hip / 70, 0, 1)
+        # HUD Alerts
+        if not is_form_correct:
+            cv2.rectangle(camera, (50, h - 120), (w - 50, h - 40), (0, 0, 0), -1)
+            cv2.rectangle(camera, (50, h - 120), (w - 50, h - 40), (0, 61, 255), 2)
+            cv2.putText(camera, feedback_msg, (70, h - 65), cv2.FONT_HERSHEY_DUPLEX, 1.2, (0, 61, 255), 2)
 
-            elif ex == "bicep_curl":
-                l_el = calculate_angle(landmarks[11][:2], landmarks[13][:2], landmarks[15][:2])
-                r_el = calculate_angle(landmarks[12][:2], landmarks[14][:2], landmarks[16][:2])
-                elbow_avg = (l_el + r_el) / 2
-                depth_percent = np.clip((155 - elbow_avg) / 80, 0, 1)
-                
-                # Double check hands are below shoulders (to block Press leakage)
-                wrist_below = landmarks[15][1] > landmarks[11][1] and landmarks[16][1] > landmarks[12][1]
-                
-                if elbow_avg < 95 and is_form_correct and wrist_below: 
-                    st["bottomed"] = True
-                elif elbow_avg > 145 and st["bottomed"]:
-                    if is_form_correct and (time.time() - st["last_rep_time"] > 1.2):
-                        st["counter"] += 1
-                        st["last_rep_time"] = time.time()
-                    st["bottomed"] = False
+        canvas = ui.render_hud(canvas, ex, session.reps, is_form_correct, depth_percent)
+        metrics.lap("hud", t)
 
-            elif ex == "shoulder_press":
-                l_el_ang = calculate_angle(landmarks[11][:2], landmarks[13][:2], landmarks[15][:2])
-                r_el_ang = calculate_angle(landmarks[12][:2], landmarks[14][:2], landmarks[16][:2])
-                elbow_avg = (l_el_ang + r_el_ang) / 2
-                
-                # Height Authentication: Highest point (wrist) must definitely be above shoulder
-                sh_y = (landmarks[11][1] + landmarks[12][1]) / 2
-                highest_wrist_y = min(landmarks[15][1], landmarks[16][1])
-                overhead_clearance = sh_y - highest_wrist_y
-                
-                # Depth gauge based on how close elbows are to full extension (100 to 160)
-                depth_percent = np.clip((elbow_avg - 100) / 60, 0, 1)
-                
-                # TRIGGER TOP: Arms straightening + Hands Overhead
-                if elbow_avg > 145 and overhead_clearance > 0.1 and is_form_correct:
-                    st["bottomed"] = True
-                
-                # TRIGGER COMPLETION: Arms return to 'bent' state near ears
-                elif elbow_avg < 115 and st["bottomed"]:
-                    if time.time() - st["last_rep_time"] > 1.2:
-                        st["counter"] += 1
-                        st["last_rep_time"] = time.time()
-                    st["bottomed"] = False
+    else:
+        # No body detected
+        if ctx["correction"] is not None:
+            ctx["correction"].reset()
+        canvas[:, w:] = 0
+        cv2.putText(canvas, "NO BODY DETECTED", (w//2 - 150, h//2), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 150), 2)
+        metrics.lap("hud", t)
 
-            elif ex == "lunge":
-                active_knee = min(angles.get('left_knee', 180), angles.get('right_knee', 180))
-                if active_knee < 120 and is_form_correct: st["bottomed"] = True
-                elif active_knee > 165 and st["bottomed"]:
-                    if is_form_correct and (time.time() - st["last_rep_time"] > 1.8):
-                        st["counter"] += 1
-                        st["last_rep_time"] = time.time()
-                    st["bottomed"] = False
-                depth_percent = np.clip((175 - active_knee) / 60, 0, 1)
+    if ctx["telemetry"] is not None:
+        ctx["telemetry"].publish(session.snapshot())
+    if ctx["metrics_overlay"]:
+        metrics.draw_overlay(canvas)
+    if video is not None and not video.raw:
+        video.submit(canvas, now if capture_ts is None else capture_ts)
 
-            elif ex == "calf_raises":
-                curr_y = landmarks[11][1]
-                if not hasattr(main, "base_y") or main.base_y == 0: main.base_y = curr_y
-                diff = main.base_y - curr_y
-                if diff > 0.04 and is_form_correct: st["bottomed"] = True
-                elif diff < 0.01 and st["bottomed"]:
-                    if is_form_correct and (time.time() - st["last_rep_time"] > 1.2):
-                        st["counter"] += 1
-                        st["last_rep_time"] = time.time()
-                    st["bottomed"] = False
-                depth_percent = np.clip(diff / 0.08, 0, 1)
+    return canvas
 
-            elif ex == "torso_twist":
-                w_val = abs(landmarks[11][0] - landmarks[12][0])
-                if w_val < 0.10 and is_form_correct: st["bottomed"] = True
-                elif w_val > 0.15 and st["bottomed"]:
-                    if is_form_correct and (time.time() - st["last_rep_time"] > 1.2):
-                        st["counter"] += 1
-                        st["last_rep_time"] = time.time()
-                    st["bottomed"] = False
-                depth_percent = 0.5
+def handle_key(key, ctx):
+    """
+    Applies a keyboard command. Returns False when the user asked to quit.
+    """
+    if key == ord('q'): return False
+    elif key == ord('m'):
+        ctx["metrics_overlay"] = not ctx["metrics_overlay"]
+    elif ord('1') <= key <= ord('9') or key == ord('0'):
+        idx = 9 if key == ord('0') else (key - ord('1'))
+        if idx < len(EXERCISES):
+            ctx["session"].select(EXERCISES[idx])
+    return True
 
-            # --- 4. DYNAMIC COACH SYNC (Demo vs. Sync) ---
-            # If user is idle, show a demo. If user moves, sync to them.
-            if not hasattr(main, "last_move_time"): main.last_move_time = time.time()
-            if not hasattr(main, "is_user_moving"): main.is_user_moving = False
-            
-            # Sensitivity trigger for sync
-            if depth_percent > 0.1:
-                main.last_move_time = time.time()
-                main.is_user_moving = True
-            elif time.time() - main.last_move_time > 2.0:
-                main.is_user_moving = False
+def show(canvas, ctx, capture_ts):
+    """
+    Displays a finished canvas and closes the frame's latency trace. Returns the pressed key.
+    """
+    t = time.perf_counter()
+    cv2.imshow(WINDOW_NAME, canvas)
+    key = cv2.waitKey(1) & 0xFF
+    ctx["metrics"].startup.mark("first_frame")
+    ctx["metrics"].lap("display", t)
+    ctx["metrics"].frame_done(capture_ts)
+    return key
 
-            if main.is_user_moving:
-                # SYNC MODE: Coach follows user
-                target_pose = coach.get_animated_pose(ex, int(time.time()*1000), user_progress=depth_percent)
-            else:
-                # DEMO MODE: Coach shows how to do it (Slow looping 0 -> 1 -> 0)
-                t = (time.time() % 4) / 4.0
-                demo_phase = (1 - np.cos(t * 2 * np.pi)) / 2
-                target_pose = coach.get_animated_pose(ex, int(time.time()*1000), user_progress=demo_phase)
-            
-            # Draw User Skeleton
-            sk_color = (0, 255, 136) if is_form_correct else (0, 61, 255)
-            frame = engine.draw_landmarks(frame, results, color=sk_color)
-            
-            # Render Coach
-            coach_canvas = np.zeros((h, w, 3), dtype=np.uint8)
-            # 3D Grid Floor
-            cx, cy = w // 2, h * 3 // 4
-            for i in range(-5, 6):
-                cv2.line(coach_canvas, (cx + i*40, cy), (cx + i*150, h), (40, 40, 40), 1)
-            cv2.line(coach_canvas, (0, cy), (w, cy), (60, 60, 60), 2)
-            
-            coach.render(coach_canvas, target_pose, color=(0, 255, 255))
-            
-            # HUD Alerts
-            if not is_form_correct:
-                cv2.rectangle(frame, (50, h - 120), (w - 50, h - 40), (0, 0, 0), -1)
-                cv2.rectangle(frame, (50, h - 120), (w - 50, h - 40), (0, 61, 255), 2)
-                cv2.putText(frame, feedback_msg, (70, h - 65), cv2.FONT_HERSHEY_DUPLEX, 1.2, (0, 61, 255), 2)
+def build_engine(args, frame_size):
+    """
+    The PoseEngine for the command line options (runs on the loader thread). frame_size() blocks
+    until the camera's (h, w) is known; it is only needed to pick a model tier.
+    """
+    model_path, max_input_side = 'pose_landmarker.task', args.max_input_side
+    if args.model or args.auto_model:
+        clip = load_clip(args.calibration_clip) if args.calibration_clip else None
+        try:
+            choice = select_model(args.target_fps, frame_size() or (480, 640), clip=clip, override=args.model,
+                                  retune=args.retune)
+        except CalibrationError as e:
+            print(f"Model calibration failed, using {model_path}: {e}")
+        else:
+            model_path = choice["model_path"]
+            max_input_side = max_input_side or choice["max_input_side"]
+            print(f"Pose model: {choice['tier']} ({model_path}), input side {max_input_side or 'full'}")
+    return PoseEngine(model_path=model_path, min_detection_confidence=0.85, min_tracking_confidence=0.85,
+                      running_mode="live_stream" if args.live_stream else "video",
+                      timestamp_mode=args.timestamps,
+                      roi_mode=args.roi, max_input_side=max_input_side)
 
-            # Stack 
-            canvas[:, :w] = frame
-            canvas[:, w:] = coach_canvas
-            canvas = ui.render_hud(canvas, ex, st["counter"], is_form_correct, depth_percent)
+def wait_for_engine(cap, loader, ui, ctx):
+    """
+    Shows the mirrored camera with a loading HUD until the engine loader is done. Returns the
+    engine, or None when the user quit, the camera stopped or loading failed.
+    """
+    startup = ctx["metrics"].startup
+    while not loader.ready:
+        frame = ctx["buffers"].capture(cap)
+        if frame is None:
+            return None
+        canvas = ctx["buffers"].compose(frame)
+        canvas[:, frame.shape[1]:] = 0
+        ui.render_loading(canvas, loader.status, startup.elapsed())
+        cv2.imshow(WINDOW_NAME, canvas)
+        startup.mark("first_frame")
+        if not handle_key(cv2.waitKey(1) & 0xFF, ctx):
+            return None
+    try:
+        return loader.result()
+    except Exception as e:
+        print(f"Error: could not load the pose model: {e}")
+        return None
 
-        else:
-            # No body detected
-            coach_canvas = np.zeros((h, w, 3), dtype=np.uint8)
-            canvas[:, :w] = frame
-            canvas[:, w:] = coach_canvas
-            cv2.putText(canvas, "NO BODY DETECTED", (w//2 - 150, h//2), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 150), 2)
+def run_sequential(cap, engine, coach, ui, ctx):
+    metrics = ctx["metrics"]
+    while cap.isOpened():
+        t = time.perf_counter()
+        # Mirrored straight into the camera half of the next display canvas
+        frame = ctx["buffers"].capture(cap)
+        if frame is None: break
+        capture_ts = time.monotonic()
+        t = metrics.lap("capture", t)
+        results = engine.process_frame(frame, timestamp_ms=capture_ts * 1000)
+        metrics.record_inference(t, getattr(engine, "last_prepare_ms", 0.0))
+        canvas = render_frame(frame, results, ctx, engine, coach, ui, capture_ts)
+
+        key = show(canvas, ctx, capture_ts)
+        if not handle_key(key, ctx): break
 
-        cv2.imshow('AI Physiotherapy Assistant', canvas)
-        
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'): break
-        elif ord('1') <= key <= ord('9') or key == ord('0'):
-            idx = 9 if key == ord('0') else (key - ord('1'))
-            if idx < len(exercises):
-                current_idx = idx
-                template = load_template(current_idx)
-                # RESET current rep state when switching to prevent leakage
-                state_tracker[exercises[current_idx]]["bottomed"] = False
-                if hasattr(main, "base_y"): del main.base_y
+def run_pipelined(cap, engine, coach, ui, ctx, queue_size, drop_policy):
+    # Captured frames come from a pool sized for what can be in flight (the capture queue plus one
+    # each being captured, inferred, waiting for render and rendered); each returns when released
+    ctx["buffers"] = FrameBuffers(frames=queue_size + 4)
+    pipeline = FramePipeline(cap, engine, queue_size=queue_size, drop_policy=drop_policy, metrics=ctx["metrics"],
+                             buffers=ctx["buffers"])
 
+    def render(frame_id, capture_ts, frame, results):
+        canvas = render_frame(frame, results, ctx, engine, coach, ui, capture_ts)
+        return handle_key(show(canvas, ctx, capture_ts), ctx)
+
+    def idle():
+        # Keep the window responsive while inference catches up
+        return handle_key(cv2.waitKey(1) & 0xFF, ctx)
+
+    pipeline.run(render, idle_fn=idle)
+    print("Pipeline stats:")
+    print(pipeline.format_stats())
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Elite AI Physiotherapy System")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run capture, inference and rendering as separate stages")
+    parser.add_argument("--queue-size", type=int, default=2,
+                        help="Capacity of the capture -> inference queue in pipeline mode")
+    parser.add_argument("--drop-policy", choices=DROP_POLICIES, default=DROP_OLDEST,
+                        help="What to do when a pipeline queue is full")
+    parser.add_argument("--timestamps", choices=PoseEngine.TIMESTAMP_MODES, default="fixed",
+                        help="'realtime' stamps frames with their capture time instead of a fixed 33 ms step")
+    parser.add_argument("--live-stream", action="store_true",
+                        help="Use MediaPipe's non-blocking LIVE_STREAM mode (shows the latest available landmarks)")
+    parser.add_argument("--roi", action="store_true",
+                        help="Crop the detector input around the tracked body (full frame when tracking is lost)")
+    parser.add_argument("--max-input-side", type=int, default=None,
+                        help="Downscale the detector input so its longest side is at most this many pixels")
+    parser.add_argument("--model", default=None,
+                        help="Pose model tier (heavy/full/lite/default) or .task path; skips auto-tuning")
+    parser.add_argument("--auto-model", action="store_true",
+                        help="Pick the model tier / input size this machine sustains at --target-fps (cached)")
+    parser.add_argument("--target-fps", type=float, default=25.0, help="FPS target for --auto-model")
+    parser.add_argument("--retune", action="store_true", help="Re-run the --auto-model calibration")
+    parser.add_argument("--calibration-clip", metavar="VIDEO", default=None,
+                        help="Recorded video of a person to run the --auto-model calibration on "
+                             "(default: a built-in synthetic clip)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Skip inference on slow-moving frames and predict the landmarks in between")
+    parser.add_argument("--max-skip", type=int, default=4,
+                        help="Adaptive mode: at most one real inference every this many frames")
+    parser.add_argument("--latency-budget", type=float, default=33.0,
+                        help="Adaptive mode: average inference milliseconds allowed per frame")
+    parser.add_argument("--metrics-overlay", action="store_true",
+                        help="Show FPS, latency and per-stage timings on screen (toggle with 'm')")
+    parser.add_argument("--metrics-jsonl", metavar="PATH", default=None,
+                        help="Append a metrics snapshot to this JSON-lines file every few seconds")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--telemetry-port", type=int, default=None,
+                        help="Stream session state to the dashboard over ws://127.0.0.1:PORT (e.g. 8765)")
+    parser.add_argument("--telemetry-fps", type=float, default=30,
+                        help="Default dashboard update rate (clients can ask for their own)")
+    parser.add_argument("--event-log", metavar="DB", default=None,
+                        help="Append reps, form faults and exercise switches to this SQLite file (see event_log.py)")
+    parser.add_argument("--patient", default="anonymous", help="Patient id stored with logged events")
+    parser.add_argument("--ghost-correction", action="store_true",
+                        help="Pull the coach's ghost along the user's joint correction field every frame")
+    parser.add_argument("--correction-smoothing", type=float, default=0.2,
+                        help="Share of the previous frame's correction kept with --ghost-correction")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Skip the warm-up inference on a blank frame while the model loads")
+    parser.add_argument("--record", metavar="DIR", default=None,
+                        help="Record per-frame landmarks to this folder for later replay (see replay.py); "
+                             "a path ending in .lmk writes a compressed archive (landmark_codec.py)")
+    parser.add_argument("--record-video", metavar="PATH", default=None,
+                        help="Export the session video (composite canvas) to this file, encoded in the background")
+    parser.add_argument("--video-fps", type=float, default=15.0, help="Frame rate of the exported video")
+    parser.add_argument("--video-scale", type=float, default=0.5, help="Downscale factor of the exported video")
+    parser.add_argument("--video-raw", action="store_true",
+                        help="With --record-video DIR: store camera frames plus landmarks instead, for "
+                             "re-rendering with session_recorder.py")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    t0 = time.perf_counter()
+    args = parse_args(argv)
+    if args.adaptive and args.live_stream:
+        print("Error: --adaptive needs blocking inference and cannot be combined with --live-stream.")
+        return
+    print("Initializng ELITE AI Physiotherapy System...")
+    # The model loads (and warms up) on a background thread while the camera opens and the
+    # rest of the app is built; the camera is shown with a loading HUD until it is ready
+    startup = StartupTimer(t0)
+    loader = EngineLoader(lambda frame_size: build_engine(args, frame_size), startup,
+                          warm_up=not args.no_warmup).start()
+    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+    if not cap.isOpened():
+        loader.set_frame_size(None)
+        print("Error: Could not open camera.")
+        return
+    startup.mark("camera_open")
+    loader.set_frame_size((int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))))
+
+    coach = GhostCoach()
+    ui = UIManager()
+    # Load, validate and compile every exercise template once, before the frame loop starts;
+    # edited templates are picked up while running
+    templates = default_registry().watch()
+    for key, warnings in templates.warnings().items():
+        print(f"Template {key}: {'; '.join(warnings)}")
+    compile_all(EXERCISES)
+    ctx = create_context()
+    ctx["metrics"].startup = startup
+    ctx["metrics"].jsonl_path = args.metrics_jsonl
+    ctx["metrics_overlay"] = args.metrics_overlay
+    metrics_server = MetricsServer(ctx["metrics"], port=args.metrics_port).start() if args.metrics_port else None
+    telemetry_server = None
+    if args.telemetry_port:
+        ctx["telemetry"] = TelemetryHub()
+        telemetry_server = TelemetryServer(ctx["telemetry"], port=args.telemetry_port,
+                                           default_fps=args.telemetry_fps).start()
+    if args.ghost_correction:
+        ctx["correction"] = CorrectionEngine(smoothing=args.correction_smoothing)
+    if args.record:
+        recorder = ArchiveWriter if args.record.endswith(ARCHIVE_EXT) else LandmarkRecorder
+        ctx["recorder"] = recorder(args.record, exercises=EXERCISES)
+    if args.record_video:
+        ctx["video"] = SessionRecorder(args.record_video, fps=args.video_fps, scale=args.video_scale,
+                                       raw=args.video_raw, exercises=EXERCISES)
+    events = None
+    if args.event_log:
+        events = EventLog(args.event_log)
+        ctx["session"] = ExerciseSession(EXERCISES, event_log=events, patient=args.patient)
+
+    engine = wait_for_engine(cap, loader, ui, ctx)
+    if engine is not None:
+        print(f"Elite Strict Engine Active (ready after {startup.marks['engine_ready']:.2f}s).")
+        if args.adaptive:
+            engine = AdaptiveScheduler(engine, max_skip=args.max_skip, latency_budget_ms=args.latency_budget)
+        if args.pipeline:
+            run_pipelined(cap, engine, coach, ui, ctx, args.queue_size, args.drop_policy)
+        else:
+            run_sequential(cap, engine, coach, ui, ctx)
 
+    if ctx["session"].rep_scores:
+        scores = ctx["session"].rep_scores
+        print(f"Rep form scores ({ctx['session'].exercise}): {' '.join(f'{s:.0f}' for s in scores)} "
+              f"(mean {np.mean(scores):.0f})")
+    if events is not None:
+        ctx["session"].close()
+        events.close()
+        print(f"Event log: {events.stats()}")
+    if ctx["recorder"] is not None:
+        ctx["recorder"].close()
+        print(f"Recorded {ctx['recorder'].frames} frames to {args.record}")
+    if ctx["video"] is not None:
+        ctx["video"].close()
+        print(f"Session video ({args.record_video}): {ctx['video'].stats()}")
+    if args.roi and engine is not None:
+        print(f"ROI inference: {engine.roi_stats()}")
+    if args.adaptive and engine is not None:
+        print(f"Adaptive inference: {engine.stats()}")
+    print("Startup:")
+    print(startup.format_summary())
+    print("Frame timings:")
+    print(ctx["metrics"].format_summary())
+    if args.metrics_jsonl:
+        ctx["metrics"].export_jsonl()
+    if metrics_server is not None:
+        metrics_server.stop()
+    if telemetry_server is not None:
+        print(f"Telemetry: {telemetry_server.stats()}")
+        telemetry_server.stop()
+    templates.stop()
     cap.release(); cv2.destroyAllWindows()
+    if engine is not None:
+        engine.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import time
+
+import cv2
+import numpy as np
+
+# Most accurate first
+MODEL_TIERS = [
+    ("heavy", "pose_landmarker_heavy.task"),
+    ("full", "pose_landmarker_full.task"),
+    ("lite", "pose_landmarker_lite.task"),
+    ("default", "pose_landmarker.task"),
+]
+# Candidate detector input sizes (longest side), largest first; None keeps the camera resolution
+INPUT_SIDES = [None, 720, 480, 360]
+
+# Share of clip frames a candidate must find the pose in. Below it the tier's landmark network
+# barely ran (only the shared person detector did), so its latency says nothing about the tier.
+MIN_DETECTION_RATE = 0.8
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pose_detection_poc", "model_tuner.json")
+
+
+class CalibrationError(RuntimeError):
+    pass
+
+
+def available_models(model_dir="."):
+    """(tier, path) of every known model file present in model_dir, most accurate first."""
+    return [(tier, os.path.join(model_dir, name)) for tier, name in MODEL_TIERS
+            if os.path.exists(os.path.join(model_dir, name))]
+
+
+def machine_fingerprint(models, frame_size, target_fps):
+    """
+    Hash of everything the measurement depends on: CPU, OS, library versions, the model files
+    on disk, the camera frame size and the FPS target.
+    """
+    import mediapipe as mp
+    info = {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "mediapipe": getattr(mp, "__version__", "?"),
+        "opencv": cv2.__version__,
+        "models": [(tier, os.path.getsize(path), int(os.path.getmtime(path))) for tier, path in models],
+        "frame_size": list(frame_size),
+        "target_fps": target_fps,
+        # Choices made under another acceptance rule are measured again
+        "min_detection_rate": MIN_DETECTION_RATE,
+    }
+    return hashlib.sha1(json.dumps(info, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def synthetic_clip(frames=60, frame_size=(720, 1280)):
+    """
+    A built-in clip of a squatting figure drawn from the ghost coach poses, so calibration
+    needs neither a camera nor a recording. It is only usable if the detector finds the figure;
+    calibrate() rejects candidates that do not (see benchmarks/bench_model_tuner.py).
+    """
+    from ghost_coach import GhostCoach
+    from utils import POSE_CONNECTIONS, draw_segments, landmarks_to_pixels
+
+    h, w = frame_size
+    coach = GhostCoach()
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(60, 140, (h, w, 3), dtype=np.uint8), (0, 0), 5)
+    clip = []
+    for i in range(frames):
+        pose = coach.get_animated_pose("squat", i * 33, user_progress=(1 - np.cos(i / frames * 2 * np.pi)) / 2)
+        frame = background.copy()
+        missing = pose[:, 0] == 0  # joints the coach poses leave undefined
+        pts = landmarks_to_pixels(pose, frame.shape)
+        # Center the figure horizontally
+        pts[:, 0] += w // 2 - int(pts[~missing, 0].mean())
+        draw_segments(frame, pts, POSE_CONNECTIONS, (90, 120, 200), thickness=max(6, h // 40),
+                      joint_radius=max(5, h // 60), skip_origin=missing)
+        cv2.circle(frame, tuple(int(v) for v in pts[0]), max(10, h // 18), (90, 120, 200), -1)
+        clip.append(frame)
+    return clip
+
+
+def load_clip(path, frames=60):
+    cap = cv2.VideoCapture(path)
+    clip = []
+    while len(clip) < frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        clip.append(cv2.flip(frame, 1))
+    cap.release()
+    if not clip:
+        raise IOError(f"Could not read frames from clip: {path}")
+    return clip
+
+
+def measure(model_path, max_input_side, clip, warmup=5):
+    """Runs the clip through a fresh engine and returns latency statistics in milliseconds."""
+    from pose_engine import PoseEngine
+
+    engine = PoseEngine(model_path=model_path, max_input_side=max_input_side)
+    try:
+        for frame in clip[:warmup]:
+            engine.process_frame(frame)
+        samples = []
+        detected = 0
+        for frame in clip[warmup:]:
+            t0 = time.perf_counter()
+            results = engine.process_frame(frame)
+            samples.append((time.perf_counter() - t0) * 1000)
+            detected += bool(results and results.pose_landmarks)
+    finally:
+        engine.close()
+    samples = np.array(samples)
+    return {
+        "p50_ms": float(np.median(samples)),
+        "p90_ms": float(np.percentile(samples, 90)),
+        "mean_ms": float(samples.mean()),
+        "fps": float(1000.0 / samples.mean()),
+        "detection_rate": detected / len(samples),
+    }
+
+
+def accepted(entry, target_fps=None, min_detection_rate=MIN_DETECTION_RATE):
+    return entry["detection_rate"] >= min_detection_rate and (target_fps is None or entry["fps"] >= target_fps)
+
+
+def pick(report, target_fps, min_detection_rate=MIN_DETECTION_RATE):
+    """
+    The choice among measured candidates (most accurate first): the first that finds the pose in at
+    least min_detection_rate of the frames and meets target_fps, else the fastest one that finds it.
+    None when no candidate finds the pose.
+    """
+    detected = [e for e in report if accepted(e, None, min_detection_rate)]
+    if not detected:
+        return None
+    return next((e for e in detected if e["fps"] >= target_fps), max(detected, key=lambda e: e["fps"]))
+
+
+def calibrate(clip, target_fps=25.0, model_dir=".", full_report=False):
+    """
+    Measures (tier, input side) candidates from most to least accurate and picks one with pick().
+    Stops at the first candidate that qualifies unless full_report is set. Returns (choice, report);
+    raises CalibrationError if no candidate detects the pose in the clip.
+    """
+    models = available_models(model_dir)
+    if not models:
+        raise FileNotFoundError(f"No pose landmarker model found in {os.path.abspath(model_dir)}")
+    native_side = max(clip[0].shape[:2])
+    report = []
+    choice = None
+    for tier, path in models:
+        for side in INPUT_SIDES:
+            if side is not None and side >= native_side:
+                continue
+            stats = measure(path, side, clip)
+            entry = {"tier": tier, "model_path": path, "max_input_side": side, **stats}
+            report.append(entry)
+            print(f"  {tier:<8} input {side or native_side:>5}px: {stats['p50_ms']:6.1f} ms p50, "
+                  f"{stats['fps']:5.1f} FPS, pose in {stats['detection_rate']:.0%} of frames"
+                  f"{'' if accepted(stats) else ' (rejected)'}")
+            if not full_report and accepted(entry, target_fps):
+                return entry, report
+    choice = pick(report, target_fps)
+    if choice is None:
+        raise CalibrationError(f"no candidate found the pose in {MIN_DETECTION_RATE:.0%} of the clip frames "
+                               f"(best {max(e['detection_rate'] for e in report):.0%}); calibrate on a recording "
+                               f"of a person instead (--clip / --calibration-clip)")
+    return choice, report
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def resolve_override(override, model_dir="."):
+    """An override is a tier name ('lite', 'full', ...) or a path to a .task file."""
+    tiers = dict(MODEL_TIERS)
+    if override in tiers:
+        return {"tier": override, "model_path": os.path.join(model_dir, tiers[override]), "max_input_side": None}
+    return {"tier": "custom", "model_path": override, "max_input_side": None}
+
+
+def select_model(target_fps=25.0, frame_size=(720, 1280), model_dir=".", clip=None, override=None,
+                 retune=False, cache_path=CACHE_PATH):
+    """
+    Returns the engine settings to use: {"tier", "model_path", "max_input_side", ...}.
+    An override skips calibration; otherwise a cached choice for this machine is reused and
+    only a cache miss (or retune=True) runs the measurement, on 'clip' (recorded frames, preferred)
+    or the synthetic clip. A failed calibration raises CalibrationError and is not cached.
+    """
+    if override:
+        return resolve_override(override, model_dir)
+    if clip is not None:
+        frame_size = clip[0].shape[:2]
+    models = available_models(model_dir)
+    if not models:
+        raise FileNotFoundError(f"No pose landmarker model found in {os.path.abspath(model_dir)}")
+    key = machine_fingerprint(models, frame_size, target_fps)
+    cache = load_cache(cache_path)
+    if not retune and key in cache:
+        return cache[key]["choice"]
+
+    print(f"Calibrating pose model for {target_fps:.0f} FPS at {frame_size[1]}x{frame_size[0]}...")
+    if clip is None:
+        clip = synthetic_clip(frame_size=frame_size)
+    choice, report = calibrate(clip, target_fps, model_dir)
+    cache[key] = {"choice": choice, "report": report, "measured_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+    save_cache(cache, cache_path)
+    return choice
+
+
+def format_report(report, choice=None):
+    lines = [f"{'tier':<8} {'input':>6} {'p50 ms':>8} {'p90 ms':>8} {'FPS':>6} {'pose':>5}"]
+    picked = (choice["tier"], choice["max_input_side"]) if choice else None
+    for e in report:
+        mark = " <" if (e["tier"], e["max_input_side"]) == picked else ""
+        lines.append(f"{e['tier']:<8} {str(e['max_input_side'] or 'full'):>6} {e['p50_ms']:8.1f} {e['p90_ms']:8.1f} "
+                     f"{e['fps']:6.1f} {e['detection_rate']:5.0%}{mark}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pick the pose model tier / input size this machine can sustain")
+    parser.add_argument("--target-fps", type=float, default=25.0)
+    parser.add_argument("--frame-size", type=int, nargs=2, default=(720, 1280), metavar=("H", "W"))
+    parser.add_argument("--model-dir", default=".")
+    parser.add_argument("--clip", default=None, help="Recorded video to calibrate on (default: built-in synthetic clip)")
+    parser.add_argument("--retune", action="store_true", help="Ignore the cached choice and measure again")
+    parser.add_argument("--all", action="store_true", help="Measure every candidate instead of stopping at the first fit")
+    args = parser.parse_args(argv)
+
+    clip = load_clip(args.clip) if args.clip else None
+    frame_size = clip[0].shape[:2] if clip else tuple(args.frame_size)
+    try:
+        if args.all:
+            choice, report = calibrate(clip or synthetic_clip(frame_size=frame_size), args.target_fps,
+                                       args.model_dir, full_report=True)
+        else:
+            choice = select_model(args.target_fps, frame_size, args.model_dir, clip=clip, retune=args.retune)
+    except CalibrationError as e:
+        parser.exit(1, f"Calibration failed: {e}\n")
+    if not args.all:
+        models = available_models(args.model_dir)
+        report = load_cache().get(machine_fingerprint(models, frame_size, args.target_fps), {}).get("report", [])
+    print(format_report(report, choice))
+    print(f"Selected: {choice['tier']} ({choice['model_path']}), input side {choice['max_input_side'] or 'full'}")
+
+
+if __name__ == "__main__":
+    main()
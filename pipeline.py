@@ -0,0 +1,298 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class FrameQueue:
+    """
+    Bounded hand-off queue between two pipeline stages.
+    When full, 'drop_oldest' evicts the stalest item so consumers always see the newest data,
+    'drop_newest' rejects the incoming item and 'block' waits for space.
+    'on_drop(item)' is called for every item discarded without being handed to a consumer.
+    """
+    def __init__(self, name, maxsize=2, policy=DROP_OLDEST, on_drop=None):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{policy}', expected one of {DROP_POLICIES}")
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.on_drop = on_drop
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Counters
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item):
+        """
+        Pushes an item, applying the drop policy when full. Returns False if the item was rejected.
+        """
+        with self._cond:
+            if self._closed:
+                self._drop(item)
+                return False
+            if len(self._items) >= self.maxsize:
+                if self.policy == DROP_OLDEST:
+                    self._drop(self._items.popleft())
+                    self.dropped += 1
+                elif self.policy == DROP_NEWEST:
+                    self._drop(item)
+                    self.dropped += 1
+                    return False
+                else:
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        self._drop(item)
+                        return False
+            self._items.append(item)
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Pops the oldest queued item. Returns None on timeout or once the queue is closed and drained.
+        """
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self.dequeued += 1
+            self._cond.notify_all()
+            return item
+
+    def get_latest(self, timeout=None):
+        """
+        Pops the newest item and discards anything older (counted as dropped).
+        """
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.pop()
+            self.dropped += len(self._items)
+            while self._items:
+                self._drop(self._items.popleft())
+            self.dequeued += 1
+            self._cond.notify_all()
+            return item
+
+    def _drop(self, item):
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enqueued": self.enqueued,
+                "dequeued": self.dequeued,
+                "dropped": self.dropped,
+                "queued": len(self._items),
+                "max_depth": self.max_depth,
+            }
+
+
+class StageWorker(threading.Thread):
+    """
+    Runs one pipeline stage on its own thread: pulls from 'inbox' (if any),
+    calls 'fn' and pushes the result (if not None) to 'outbox'.
+    """
+    def __init__(self, name, fn, inbox=None, outbox=None, poll_timeout=0.1):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.poll_timeout = poll_timeout
+        self.processed = 0
+        self.busy_time = 0.0
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                if self.inbox is not None:
+                    item = self.inbox.get(timeout=self.poll_timeout)
+                    if item is None:
+                        if self.inbox.closed:
+                            break
+                        continue
+                    t0 = time.perf_counter()
+                    out = self.fn(item)
+                else:
+                    t0 = time.perf_counter()
+                    out = self.fn()
+                    if out is StopIteration:
+                        break
+                self.busy_time += time.perf_counter() - t0
+                self.processed += 1
+                if out is not None and self.outbox is not None:
+                    self.outbox.put(out)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._stop_event.set()
+            if self.outbox is not None:
+                self.outbox.close()
+
+    def stats(self):
+        return {
+            "processed": self.processed,
+            "avg_ms": (self.busy_time / self.processed * 1000) if self.processed else 0.0,
+        }
+
+
+class FramePipeline:
+    """
+    Staged capture -> inference -> render pipeline.
+    Capture and pose inference each run on a worker thread; rendering (and cv2.imshow)
+    stays on the calling thread, which is required by most OpenCV GUI backends.
+    """
+    def __init__(self, cap, engine, queue_size=2, drop_policy=DROP_OLDEST, metrics=None, buffers=None):
+        """
+        buffers: optional frame_buffers.FrameBuffers with a capture pool; captured frames are then
+                 mirrored into reused buffers, each released once it is rendered or dropped.
+        """
+        self.cap = cap
+        self.buffers = buffers
+        self.engine = engine
+        self.metrics = metrics
+        self.capture_queue = FrameQueue("capture", queue_size, drop_policy, on_drop=self._release)
+        # Render only ever wants the newest result
+        self.result_queue = FrameQueue("inference", 1, DROP_OLDEST, on_drop=self._release)
+        self.frame_id = 0
+        self.rendered = 0
+        self.render_time = 0.0
+        self.start_time = None
+
+        self.capture_worker = StageWorker("capture", self._capture, outbox=self.capture_queue)
+        self.inference_worker = StageWorker("inference", self._infer,
+                                            inbox=self.capture_queue, outbox=self.result_queue)
+
+    def _capture(self):
+        t0 = time.perf_counter()
+        if self.buffers is not None:
+            frame = self.buffers.capture(self.cap)
+            if frame is None:
+                return StopIteration
+        else:
+            success, frame = self.cap.read()
+            if not success:
+                return StopIteration
+            frame = cv2.flip(frame, 1)
+        capture_ts = time.monotonic()
+        self.frame_id += 1
+        if self.metrics is not None:
+            self.metrics.lap("capture", t0)
+        return (self.frame_id, capture_ts, frame)
+
+    def _release(self, item):
+        if self.buffers is not None:
+            self.buffers.release(item[2])
+
+    def _infer(self, item):
+        frame_id, capture_ts, frame = item
+        t0 = time.perf_counter()
+        results = self.engine.process_frame(frame, timestamp_ms=capture_ts * 1000)
+        if self.metrics is not None:
+            self.metrics.record_inference(t0, getattr(self.engine, "last_prepare_ms", 0.0))
+        return (frame_id, capture_ts, frame, results)
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.capture_worker.start()
+        self.inference_worker.start()
+
+    def stop(self):
+        self.capture_worker.stop()
+        self.inference_worker.stop()
+        self.capture_queue.close()
+        self.result_queue.close()
+        self.capture_worker.join(timeout=1.0)
+        self.inference_worker.join(timeout=1.0)
+
+    def run(self, render_fn, idle_fn=None, poll_timeout=0.05):
+        """
+        Render loop. 'render_fn(frame_id, capture_ts, frame, results)' returns False to quit.
+        'idle_fn()' is called when no new result arrived in time (e.g. to keep the GUI responsive)
+        and may also return False to quit.
+        """
+        self.start()
+        try:
+            while True:
+                item = self.result_queue.get_latest(timeout=poll_timeout)
+                if item is None:
+                    if self.result_queue.closed:
+                        break
+                    if idle_fn is not None and idle_fn() is False:
+                        break
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    keep_going = render_fn(*item)
+                finally:
+                    # render_fn copies what it keeps (the canvas), so the frame buffer can be reused
+                    self._release(item)
+                self.render_time += time.perf_counter() - t0
+                self.rendered += 1
+                if keep_going is False:
+                    break
+        finally:
+            self.stop()
+        for worker in (self.capture_worker, self.inference_worker):
+            if worker.error is not None:
+                raise worker.error
+
+    def stats(self):
+        elapsed = (time.perf_counter() - self.start_time) if self.start_time else 0.0
+        return {
+            "capture": dict(self.capture_worker.stats(), **self.capture_queue.stats()),
+            "inference": dict(self.inference_worker.stats(), **self.result_queue.stats()),
+            "render": {
+                "processed": self.rendered,
+                "avg_ms": (self.render_time / self.rendered * 1000) if self.rendered else 0.0,
+                "fps": (self.rendered / elapsed) if elapsed else 0.0,
+            },
+        }
+
+    def format_stats(self):
+        lines = []
+        for stage, st in self.stats().items():
+            parts = ", ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in st.items())
+            lines.append(f"  {stage:<10} {parts}")
+        return "\n".join(lines)
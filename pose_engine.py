@@ -1,78 +1,295 @@
+import threading
+import time
 import cv2
-import mediapipe as mp
 import numpy as np
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
+from frame_buffers import ScratchBuffers
+from utils import POSE_CONNECTIONS, draw_points, draw_segments, landmarks_to_pixels
+
+_mediapipe = None
+
+
+def load_mediapipe():
+    """
+    Imports mediapipe on first use and returns (mp, tasks.python, tasks.python.vision). The import
+    takes most of a cold start, so it is kept out of module import and can run on a loader thread
+    while the camera opens (see startup.py).
+    """
+    global _mediapipe
+    if _mediapipe is None:
+        import mediapipe as mp
+        from mediapipe.tasks import python
+        from mediapipe.tasks.python import vision
+        _mediapipe = (mp, python, vision)
+    return _mediapipe
+
+
+def prepare_input(frame, roi=None, max_input_side=None, scratch=None):
+    """
+    Crops 'frame' to roi=(x1, y1, x2, y2) pixels (whole frame when None), downscales it so its
+    longest side is at most max_input_side, then converts to RGB. Cropping and resizing first
+    means cvtColor only touches the pixels the detector actually gets.
+    With 'scratch' (frame_buffers.ScratchBuffers) the resized and RGB images are written into
+    reused buffers instead of new ones.
+    Returns (rgb, rect) where rect is the crop in full-frame pixels.
+    """
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = roi if roi is not None else (0, 0, w, h)
+    crop = frame[y1:y2, x1:x2]
+    if max_input_side and max(x2 - x1, y2 - y1) > max_input_side:
+        scale = max_input_side / max(x2 - x1, y2 - y1)
+        size = (max(1, round((x2 - x1) * scale)), max(1, round((y2 - y1) * scale)))
+        dst = scratch.get("resized", (size[1], size[0], 3)) if scratch is not None else None
+        crop = cv2.resize(crop, size, dst=dst, interpolation=cv2.INTER_LINEAR)
+    if scratch is None:
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), (x1, y1, x2, y2)
+    rgb = scratch.get("rgb", crop.shape)
+    cv2.cvtColor(crop, cv2.COLOR_BGR2RGB, dst=rgb)
+    return rgb, (x1, y1, x2, y2)
+
+
+def remap_landmarks(results, rect, frame_shape):
+    """
+    Maps landmarks detected on a crop back to full-frame normalized coordinates (in place).
+    z shares x's scale, so it is rescaled by the crop/frame width ratio too.
+    """
+    h, w = frame_shape[:2]
+    x1, y1, x2, y2 = rect
+    if not results or not results.pose_landmarks or (x1, y1, x2, y2) == (0, 0, w, h):
+        return results
+    sx, sy = (x2 - x1) / w, (y2 - y1) / h
+    ox, oy = x1 / w, y1 / h
+    for pose in results.pose_landmarks:
+        for lm in pose:
+            lm.x = lm.x * sx + ox
+            lm.y = lm.y * sy + oy
+            lm.z = lm.z * sx
+    return results
+
 
 class PoseEngine:
     """
     Wrapper for MediaPipe Tasks API to handle real-time body landmark detection.
     """
-    def __init__(self, model_path='pose_landmarker.task', min_detection_confidence=0.5, min_tracking_confidence=0.5):
+    RUNNING_MODES = ("video", "live_stream")
+    TIMESTAMP_MODES = ("fixed", "realtime")
+
+    def __init__(self, model_path='pose_landmarker.task', min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 running_mode="video", timestamp_mode="fixed", result_callback=None,
+                 roi_mode=False, roi_margin=0.25, max_input_side=None, roi_min_visibility=0.5):
+        """
+        running_mode: "video" runs the blocking detect_for_video; "live_stream" uses detect_async and
+                      process_frame returns the most recent result delivered by the callback.
+        timestamp_mode: "fixed" advances 33 ms per frame (legacy); "realtime" stamps each frame with
+                        its capture time (or the current monotonic clock when none is given).
+        result_callback: optional fn(results, timestamp_ms) called when a live_stream result arrives.
+        roi_mode: crop the input around the previous frame's landmarks (plus roi_margin of the body
+                  size on every side) and fall back to the full frame when tracking is lost or the
+                  mean landmark visibility drops below roi_min_visibility.
+        max_input_side: downscale the (possibly cropped) input so its longest side fits.
+        """
+        if running_mode not in self.RUNNING_MODES:
+            raise ValueError(f"Unknown running_mode '{running_mode}', expected one of {self.RUNNING_MODES}")
+        if timestamp_mode not in self.TIMESTAMP_MODES:
+            raise ValueError(f"Unknown timestamp_mode '{timestamp_mode}', expected one of {self.TIMESTAMP_MODES}")
+        self.running_mode = running_mode
+        self.timestamp_mode = timestamp_mode
+        self.result_callback = result_callback
+        self._mp, python, vision = load_mediapipe()
+
         base_options = python.BaseOptions(model_asset_path=model_path)
+        extra = {}
+        if running_mode == "live_stream":
+            extra["result_callback"] = self._on_async_result
         options = vision.PoseLandmarkerOptions(
             base_options=base_options,
-            running_mode=vision.RunningMode.VIDEO,
+            running_mode=vision.RunningMode.LIVE_STREAM if running_mode == "live_stream" else vision.RunningMode.VIDEO,
             num_poses=1,
             min_pose_detection_confidence=min_detection_confidence,
             min_pose_presence_confidence=min_detection_confidence,
             min_tracking_confidence=min_tracking_confidence,
             output_segmentation_masks=False,
+            **extra
         )
-        self.detector = vision.PoseLandmarker.create_from_options(options)
+        self._results_lock = threading.Lock()
         self.last_results = None
+        self.last_result_timestamp_ms = None
         self.frame_timestamp_ms = 0
+        self._clock_origin = None
 
-    def process_frame(self, frame):
+        self.roi_mode = roi_mode
+        self.roi_margin = roi_margin
+        self.max_input_side = max_input_side
+        self.roi_min_visibility = roi_min_visibility
+        self.roi = None
+        self._pending_rects = {}
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.roi_fallbacks = 0
+        self.last_prepare_ms = 0.0
+        # mp.Image copies its pixels, so one RGB buffer serves every frame, async detection included
+        self.scratch = ScratchBuffers()
+        self.detector = vision.PoseLandmarker.create_from_options(options)
+
+    def _next_timestamp(self, timestamp_ms=None):
+        """
+        Returns the timestamp for the next frame. MediaPipe requires strictly increasing values.
+        """
+        if self.timestamp_mode == "fixed":
+            ts = self.frame_timestamp_ms + 33 # Approx 30 FPS
+        else:
+            if timestamp_ms is None:
+                timestamp_ms = time.monotonic() * 1000
+            # Rebase so the stream starts near 0 regardless of the clock's epoch
+            if self._clock_origin is None:
+                self._clock_origin = timestamp_ms
+            ts = int(timestamp_ms - self._clock_origin)
+            ts = max(ts, self.frame_timestamp_ms + 1)
+        self.frame_timestamp_ms = ts
+        return ts
+
+    def _update_roi(self, results, frame_shape):
+        """
+        Picks the crop for the next frame from this frame's (full-frame) landmarks.
+        The crop is kept while the body stays well inside it, so the detector's own tracking
+        sees a stable input; it is recomputed when the body nears an edge or shrinks a lot.
+        """
+        if not self.roi_mode:
+            return
+        h, w = frame_shape[:2]
+        if not results or not results.pose_landmarks:
+            if self.roi is not None:
+                self.roi_fallbacks += 1
+            self.roi = None
+            return
+        pts = np.array([[lm.x, lm.y, getattr(lm, 'visibility', 1.0) or 0.0] for lm in results.pose_landmarks[0]])
+        visible = pts[:, 2] >= self.roi_min_visibility
+        if pts[:, 2].mean() < self.roi_min_visibility or visible.sum() < 4:
+            if self.roi is not None:
+                self.roi_fallbacks += 1
+            self.roi = None
+            return
+
+        xs = np.clip(pts[visible, 0], 0.0, 1.0) * w
+        ys = np.clip(pts[visible, 1], 0.0, 1.0) * h
+        bx1, by1, bx2, by2 = xs.min(), ys.min(), xs.max(), ys.max()
+        if self.roi is not None:
+            rx1, ry1, rx2, ry2 = self.roi
+            inner = 0.5 * self.roi_margin * max(bx2 - bx1, by2 - by1)
+            inside = bx1 - inner >= rx1 and by1 - inner >= ry1 and bx2 + inner <= rx2 and by2 + inner <= ry2
+            fitted_side = max(bx2 - bx1, by2 - by1) * (1 + 2 * self.roi_margin)
+            if inside and max(rx2 - rx1, ry2 - ry1) <= 2 * fitted_side:
+                return
+        pad = self.roi_margin * max(bx2 - bx1, by2 - by1)
+        x1, y1 = max(int(bx1 - pad), 0), max(int(by1 - pad), 0)
+        x2, y2 = min(int(np.ceil(bx2 + pad)), w), min(int(np.ceil(by2 + pad)), h)
+        self.roi = (x1, y1, x2, y2) if x2 - x1 >= 32 and y2 - y1 >= 32 else None
+
+    def _on_async_result(self, result, output_image, timestamp_ms):
+        with self._results_lock:
+            rect, frame_shape = self._pending_rects.pop(timestamp_ms, (None, None))
+            # Frames the detector skipped never get a callback
+            for stale in [t for t in self._pending_rects if t < timestamp_ms]:
+                del self._pending_rects[stale]
+        if rect is not None:
+            remap_landmarks(result, rect, frame_shape)
+            self._update_roi(result, frame_shape)
+        with self._results_lock:
+            self.last_results = result
+            self.last_result_timestamp_ms = timestamp_ms
+        if self.result_callback is not None:
+            self.result_callback(result, timestamp_ms)
+
+    def process_frame(self, frame, timestamp_ms=None):
         """
         Processes a single frame and returns results.
+        timestamp_ms is the frame's capture time in milliseconds (used in "realtime" timestamp mode).
+        In "live_stream" mode this never blocks on inference: it returns the latest available result,
+        which may belong to an earlier frame (or None before the first result arrives).
         """
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
-        
-        # Incremental timestamp
-        self.frame_timestamp_ms += 33 # Approx 30 FPS
+        # Crop / downscale, then convert BGR to RGB
+        t0 = time.perf_counter()
+        roi = self.roi if self.roi_mode else None
+        rgb_frame, rect = prepare_input(frame, roi, self.max_input_side, self.scratch)
+        if roi is None:
+            self.full_frames += 1
+        else:
+            self.roi_frames += 1
+        mp_image = self._mp.Image(image_format=self._mp.ImageFormat.SRGB, data=rgb_frame)
+        self.last_prepare_ms = (time.perf_counter() - t0) * 1000
         
-        self.last_results = self.detector.detect_for_video(mp_image, self.frame_timestamp_ms)
+        ts = self._next_timestamp(timestamp_ms)
+
+        if self.running_mode == "live_stream":
+            # The result arrives later; remember which crop it belongs to
+            with self._results_lock:
+                self._pending_rects[ts] = (rect, frame.shape)
+            self.detector.detect_async(mp_image, ts)
+            return self.get_latest_results()
+
+        results = self.detector.detect_for_video(mp_image, ts)
+        remap_landmarks(results, rect, frame.shape)
+        self._update_roi(results, frame.shape)
+        self.last_results = results
+        self.last_result_timestamp_ms = ts
         return self.last_results
 
+    def warm_up(self, frame_shape=(480, 640, 3), timeout=5.0):
+        """
+        Runs one inference on a blank frame so the first camera frame does not pay for the
+        detector's lazy initialization; also sizes the input buffers. In live_stream mode it waits
+        (up to 'timeout' seconds) for the result. ROI statistics and results are left as before.
+        Returns the time taken in ms.
+        """
+        t0 = time.perf_counter()
+        frames = (self.roi_frames, self.full_frames)
+        self.process_frame(np.zeros(frame_shape, dtype=np.uint8))
+        if self.running_mode == "live_stream":
+            ts = self.frame_timestamp_ms
+            while (self.last_result_timestamp_ms or -1) < ts and time.perf_counter() - t0 < timeout:
+                time.sleep(0.005)
+        self.roi_frames, self.full_frames = frames
+        with self._results_lock:
+            self.last_results = None
+        return (time.perf_counter() - t0) * 1000
+
+    def roi_stats(self):
+        total = self.roi_frames + self.full_frames
+        return {
+            "roi_frames": self.roi_frames,
+            "full_frames": self.full_frames,
+            "fallbacks": self.roi_fallbacks,
+            "roi_ratio": (self.roi_frames / total) if total else 0.0,
+            "roi": self.roi,
+        }
+
+    def get_latest_results(self):
+        """
+        Returns the most recent detection result (thread-safe).
+        """
+        with self._results_lock:
+            return self.last_results
+
+    def close(self):
+        self.detector.close()
+
     def draw_landmarks(self, frame, results, color=(0, 255, 0)):
         """
         Manually draws skeleton landmarks on the frame (since drawing_utils may be missing).
         """
         if not results or not results.pose_landmarks:
             return frame
-        
-        h, w, _ = frame.shape
-        # POSE_CONNECTIONS indices for MediaPipe
-        CONNECTIONS = [
-            (11, 12), (11, 13), (13, 15), (12, 14), (14, 16), # Upper Body
-            (11, 23), (12, 24), (23, 24), # Torso
-            (23, 25), (25, 27), (24, 26), (26, 28), # Legs
-            (15, 17), (17, 19), (19, 15), (16, 18), (18, 20), (20, 16), # Hands
-            (27, 29), (29, 31), (31, 27), (28, 30), (30, 32), (32, 28)  # Feet
-        ]
-
-        # Get landmarks for the first detected pose
-        landmarks = results.pose_landmarks[0]
-        
-        # Draw joints
-        for lm in landmarks:
-            cx, cy = int(lm.x * w), int(lm.y * h)
-            cv2.circle(frame, (cx, cy), 3, color, -1)
-            
-        # Draw connections
-        for connection in CONNECTIONS:
-            start_idx = connection[0]
-            end_idx = connection[1]
-            p1 = landmarks[start_idx]
-            p2 = landmarks[end_idx]
-            
-            x1, y1 = int(p1.x * w), int(p1.y * h)
-            x2, y2 = int(p2.x * w), int(p2.y * h)
-            cv2.line(frame, (x1, y1), (x2, y2), color, 2)
-            
+        return self.draw_landmarks_array(frame, self.get_landmarks_array(results), color=color)
+
+    def draw_landmarks_array(self, frame, landmarks, color=(0, 255, 0)):
+        """
+        Draws a (33, 4) landmark array: pixel conversion in one vectorized step,
+        all joints and all connections with one cv2.polylines call each.
+        """
+        if landmarks is None:
+            return frame
+        pts = landmarks_to_pixels(landmarks, frame.shape)
+        draw_points(frame, pts, color, radius=3)
+        draw_segments(frame, pts, POSE_CONNECTIONS, color, thickness=2)
         return frame
 
     def get_landmarks_array(self, results):
@@ -0,0 +1,132 @@
+import json
+import os
+
+import numpy as np
+
+RECORDING_VERSION = 1
+LANDMARKS_FILE = "landmarks.f32"
+TIMESTAMPS_FILE = "timestamps.f64"
+EXERCISE_FILE = "exercise.u8"
+META_FILE = "meta.json"
+
+FRAME_SHAPE = (33, 4)
+FRAME_BYTES = 33 * 4 * 4
+
+
+class LandmarkRecorder:
+    """
+    Appends per-frame landmark arrays to an on-disk recording (a folder of raw, contiguous arrays):
+      landmarks.f32   (T, 33, 4) float32, NaN rows for frames without a detected body
+      timestamps.f64  (T,) clock time (seconds) the rules evaluated the frame at
+      exercise.u8     (T,) index of the active exercise
+      meta.json       frame count and free-form metadata
+    Raw files can be memory-mapped directly and stay readable up to the last complete frame after a crash.
+    """
+    def __init__(self, path, exercises=None, flush_every=256, **meta):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self.meta = dict(meta, version=RECORDING_VERSION, frame_shape=list(FRAME_SHAPE),
+                         exercises=list(exercises or []))
+        self.frames = 0
+        self._lm_buf = np.empty((flush_every,) + FRAME_SHAPE, dtype=np.float32)
+        self._ts_buf = np.empty(flush_every, dtype=np.float64)
+        self._ex_buf = np.empty(flush_every, dtype=np.uint8)
+        self._buffered = 0
+        self._files = [open(os.path.join(path, name), "ab") for name in (LANDMARKS_FILE, TIMESTAMPS_FILE, EXERCISE_FILE)]
+        self._write_meta()
+
+    def append(self, landmarks, timestamp, exercise_idx=0):
+        """
+        Records one frame. 'landmarks' is the (33, 4) array from get_landmarks_array, or None.
+        """
+        i = self._buffered
+        if landmarks is None:
+            self._lm_buf[i] = np.nan
+        else:
+            self._lm_buf[i] = landmarks
+        self._ts_buf[i] = timestamp
+        self._ex_buf[i] = exercise_idx
+        self._buffered += 1
+        self.frames += 1
+        if self._buffered == self.flush_every:
+            self.flush()
+
+    def flush(self):
+        n = self._buffered
+        if n:
+            for f, buf in zip(self._files, (self._lm_buf, self._ts_buf, self._ex_buf)):
+                f.write(buf[:n].tobytes())
+                f.flush()
+            self._buffered = 0
+
+    def _write_meta(self):
+        meta = dict(self.meta, frames=self.frames)
+        tmp_path = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+    def close(self):
+        self.flush()
+        for f in self._files:
+            f.close()
+        self._files = []
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_recording(path, landmarks, timestamps, exercise_ids=None, exercises=None, **meta):
+    """
+    Writes a whole (T, 33, 4) landmark sequence as a recording in one go.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    if exercise_ids is None:
+        exercise_ids = np.zeros(len(landmarks), dtype=np.uint8)
+    os.makedirs(path, exist_ok=True)
+    for name, arr, dtype in ((LANDMARKS_FILE, landmarks, np.float32), (TIMESTAMPS_FILE, timestamps, np.float64),
+                             (EXERCISE_FILE, exercise_ids, np.uint8)):
+        np.ascontiguousarray(arr, dtype=dtype).tofile(os.path.join(path, name))
+    meta = dict(meta, version=RECORDING_VERSION, frame_shape=list(FRAME_SHAPE),
+                exercises=list(exercises or []), frames=len(landmarks))
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_recording(path, mmap=True):
+    """
+    Opens a recording. Returns (landmarks (T, 33, 4) float32, timestamps (T,) float64,
+    exercise_ids (T,) uint8, meta). With mmap=True the arrays are read-only memory maps.
+    A file path is read as a compressed landmark archive (landmark_codec.py) instead.
+    """
+    if os.path.isfile(path):
+        from landmark_codec import read_archive
+        return read_archive(path)
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get("version") != RECORDING_VERSION:
+        raise ValueError(f"Unsupported recording version {meta.get('version')} in {path}")
+
+    # Derive the frame count from the file sizes so an unclean shutdown still loads
+    lm_path = os.path.join(path, LANDMARKS_FILE)
+    ts_path = os.path.join(path, TIMESTAMPS_FILE)
+    ex_path = os.path.join(path, EXERCISE_FILE)
+    frames = min(os.path.getsize(lm_path) // FRAME_BYTES, os.path.getsize(ts_path) // 8, os.path.getsize(ex_path))
+
+    def open_array(file_path, dtype, shape):
+        if frames == 0:
+            return np.zeros(shape, dtype=dtype)
+        if mmap:
+            return np.memmap(file_path, dtype=dtype, mode="r", shape=shape)
+        return np.fromfile(file_path, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+    landmarks = open_array(lm_path, np.float32, (frames,) + FRAME_SHAPE)
+    timestamps = open_array(ts_path, np.float64, (frames,))
+    exercise_ids = open_array(ex_path, np.uint8, (frames,))
+    meta["frames"] = int(frames)
+    return landmarks, timestamps, exercise_ids, meta
@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from recording import load_recording
+from rules import EXERCISES, METRIC_SLOT, NUM_FEATURES, compute_features, load_program
+
+# Upper bound on (enter x exit x frames) elements evaluated at once; larger grids are done in chunks
+CHUNK_ELEMENTS = 8_000_000
+
+
+def parse_grid(text):
+    """'120:150:5' (start:stop:step, stop included) or '120,130,145' -> float array."""
+    if ":" in text:
+        start, stop, step = (float(v) for v in text.split(":"))
+        return np.round(np.arange(start, stop + step / 2, step), 6)
+    return np.array([float(v) for v in text.split(",")])
+
+
+def template_thresholds(program):
+    """(enter, exit, cooldown) of an exercise's compiled rep rules."""
+    return (float(program.atom_thr[program.enter_atom]), float(program.atom_thr[program.exit_atom]),
+            program.cooldown)
+
+
+def default_grid(program, steps=11):
+    """Thresholds within half the hysteresis gap of the template's, cooldowns from 0 to twice the template's."""
+    enter, exit_, cooldown = template_thresholds(program)
+    half = abs(exit_ - enter) / 2
+    return (np.linspace(enter - half, enter + half, steps), np.linspace(exit_ - half, exit_ + half, steps),
+            np.linspace(0.0, 2 * cooldown, 9))
+
+
+def rep_trace(program, landmarks, timestamps, exercise_ids=None, exercise_idx=None):
+    """
+    Everything the rep hysteresis needs that does not depend on the thresholds, for the frames of one
+    exercise: rep metric, visibility, enter requirements, form gate, timestamps and the starts of runs
+    (the rep state is reset on every switch to the exercise, like replay.py does).
+    """
+    landmarks = np.asarray(landmarks)
+    keep = ~np.isnan(landmarks[:, :, :2]).any(axis=(1, 2))
+    runs = np.zeros(len(landmarks), dtype=np.intp)
+    if exercise_idx is not None:
+        selected = np.asarray(exercise_ids) == exercise_idx
+        runs = np.cumsum(np.r_[selected[:1], selected[1:] & ~selected[:-1]])
+        keep &= selected
+    idx = np.flatnonzero(keep)
+    lm = landmarks[idx].astype(np.float64)
+    runs = runs[idx]
+    run_start = np.r_[True, runs[1:] != runs[:-1]] if len(idx) else np.zeros(0, dtype=bool)
+
+    feats = np.empty((len(idx), NUM_FEATURES + 1))
+    feats[:, :NUM_FEATURES] = compute_features(lm) if len(idx) else 0.0
+    if program.baseline_idx is not None:
+        # Baseline = the first frame of each run
+        first = np.maximum.accumulate(np.where(run_start, np.arange(len(idx)), 0))
+        feats[:, METRIC_SLOT] = feats[first, program.baseline_idx] - feats[:, program.baseline_idx]
+    else:
+        feats[:, METRIC_SLOT] = feats[:, program.metric_idx]
+    atoms = program._eval_atoms(feats)
+    visible = (lm[:, program.vis_points, 3] > program.vis_min).all(axis=1)
+    ok, _ = program._form_result(atoms, visible)
+
+    requires = atoms[:, program.enter_atoms[1:]].all(axis=1)
+    if program.enter_requires_form:
+        requires &= ok
+    return {
+        "metric": feats[:, METRIC_SLOT],
+        "visible": visible,
+        "requires": requires,
+        "can_count": ok if program.exit_requires_form else np.ones_like(ok),
+        "ts": np.asarray(timestamps, dtype=np.float64)[idx],
+        "run_start": run_start,
+    }
+
+
+def _compare(program, atom, metric, thresholds):
+    """The atom's comparison of (T,) metric against each threshold -> (len(thresholds), T)."""
+    diff = program.atom_sign[atom] * (metric[None, :] - np.asarray(thresholds, dtype=np.float64)[:, None])
+    return diff < 0 if program.atom_strict[atom] else diff <= 0
+
+
+def _rep_candidates(enter, exit_, trace):
+    """
+    Hysteresis for every (enter, exit) pair at once. enter (E, T), exit (X, T) -> (E * X, T) frames where
+    a bottomed rep comes back up (the rep counts there unless the cooldown is still running).
+    The state is the last event: +1 enter, -1 exit or lost visibility (and every run start), carried
+    forward with a running maximum over event positions.
+    """
+    e, x = len(enter), len(exit_)
+    t = enter.shape[1]
+    visible, run_start = trace["visible"], trace["run_start"]
+    events = np.where(enter[:, None, :], np.int8(1), np.where(exit_[None, :, :] | ~visible, np.int8(-1), np.int8(0)))
+    events[..., run_start] = np.where(events[..., run_start] == 1, 1, -1)
+    last = np.where(events != 0, np.arange(t, dtype=np.int32), np.int32(-1))
+    np.maximum.accumulate(last, axis=-1, out=last)
+    bottomed = np.take_along_axis(events, np.maximum(last, 0), axis=-1) == 1
+    bottomed &= last >= 0
+    before = np.zeros_like(bottomed)
+    before[..., 1:] = bottomed[..., :-1]
+    before[..., run_start] = False
+    candidates = before & ~enter[:, None, :] & exit_[None, :, :] & (visible & trace["can_count"])
+    return candidates.reshape(e * x, t)
+
+
+def _count_with_cooldowns(candidates, ts, cooldowns, last_rep_time=0.0):
+    """
+    Reps counted from (P, T) candidate frames for every cooldown -> (C, P).
+    A candidate counts when it is more than 'cooldown' after the last counted rep. For each candidate
+    the next one that could count is found with one searchsorted over all rows (each row offset by W),
+    then every (cooldown, row) chain is followed in lockstep, one rep per round.
+    """
+    cooldowns = np.asarray(cooldowns, dtype=np.float64)
+    p = len(candidates)
+    per_row = candidates.sum(axis=1)
+    k = int(per_row.max()) if p else 0
+    if k == 0:
+        return np.zeros((len(cooldowns), p), dtype=np.int32)
+    rel = ts - ts[0]
+    w = rel[-1] + cooldowns.max() + 2.0
+    rows, cols = np.nonzero(candidates)
+    slot = np.arange(len(rows)) - np.repeat(np.cumsum(per_row) - per_row, per_row)
+    times = np.full((p, k), w - 0.5)  # padding sorts after every reachable time of its row
+    times[rows, slot] = rel[cols]
+    exact = np.full((p, k + 1), np.inf)
+    exact[rows, slot] = ts[cols]
+    offset = (np.arange(p) * w)[:, None]
+    keys = (times + offset).ravel()
+    base = (np.arange(p) * k)[:, None]
+    row = np.arange(p)[:, None]
+    since_rep = np.where(np.isfinite(exact[:, :k]), exact[:, :k], 0.0)
+
+    def settle(pos, since, cooldown):
+        # The row offsets round differently from the rules' own 'now - last_rep_time > cooldown', which
+        # matters when a gap equals the cooldown to the last bit: step to the exact answer
+        for _ in range(2):
+            pos = np.where(exact[row, pos] - since > cooldown, pos, np.minimum(pos + 1, k))
+            prev = np.maximum(pos - 1, 0)
+            pos = np.where((pos > 0) & (exact[row, prev] - since > cooldown), prev, pos)
+        return pos
+
+    counts = np.zeros((len(cooldowns), p), dtype=np.int32)
+    for c, cooldown in enumerate(cooldowns):
+        jump = np.searchsorted(keys, (times + cooldown + offset).ravel(), side="right").reshape(p, k) - base
+        jump = settle(np.minimum(jump, k), since_rep, cooldown)
+        first = max(last_rep_time - ts[0] + cooldown, -0.25)
+        pos = np.searchsorted(keys, first + offset, side="right") - base
+        pos = settle(np.minimum(pos, k), last_rep_time, cooldown)[:, 0]
+        while True:
+            active = pos < per_row
+            if not active.any():
+                break
+            counts[c] += active
+            pos = np.where(active, jump[row[:, 0], np.minimum(pos, k - 1)], pos)
+    return counts
+
+
+def sweep_counts(program, trace, enter_grid, exit_grid, cooldowns):
+    """
+    Rep counts of one trace for every threshold combination -> int32 (len(enter), len(exit), len(cooldowns)).
+    """
+    counts = np.zeros((len(enter_grid), len(exit_grid), len(cooldowns)), dtype=np.int32)
+    t = len(trace["ts"])
+    if t == 0:
+        return counts
+    enter = _compare(program, program.enter_atom, trace["metric"], enter_grid) & trace["requires"]
+    exit_ = _compare(program, program.exit_atom, trace["metric"], exit_grid)
+    chunk = max(1, CHUNK_ELEMENTS // (len(exit_grid) * t))
+    for i in range(0, len(enter_grid), chunk):
+        candidates = _rep_candidates(enter[i:i + chunk], exit_, trace)
+        reps = _count_with_cooldowns(candidates, trace["ts"], cooldowns)
+        counts[i:i + chunk] = reps.T.reshape(-1, len(exit_grid), len(cooldowns))
+    return counts
+
+
+def _sweep_recording(path, exercises, grids):
+    """Worker: {exercise: counts} for one recording."""
+    landmarks, timestamps, exercise_ids, meta = load_recording(path)
+    names = meta.get("exercises") or []
+    out = {}
+    for ex in exercises:
+        program = load_program(ex)
+        # Recordings from the live app tag every frame with the active exercise; others are scored whole
+        ex_idx = names.index(ex) if ex in names else (len(names) if names else None)
+        trace = rep_trace(program, landmarks, timestamps, exercise_ids, ex_idx)
+        out[ex] = sweep_counts(program, trace, *grids[ex])
+    return out
+
+
+def load_labels(recordings, labels_path=None):
+    """
+    Labeled rep counts: {recording: {exercise: reps}} from a JSON file keyed by recording path or folder
+    name, falling back to "rep_labels" in each recording's meta.json.
+    """
+    given = {}
+    if labels_path:
+        with open(labels_path) as f:
+            given = json.load(f)
+    labels = {}
+    for path in recordings:
+        entry = given.get(path) or given.get(os.path.normpath(path)) or given.get(os.path.basename(os.path.normpath(path)))
+        if entry is None:
+            with open(os.path.join(path, "meta.json")) as f:
+                entry = json.load(f).get("rep_labels")
+        if entry:
+            labels[path] = {ex: int(n) for ex, n in entry.items()}
+    return labels
+
+
+def score(counts, labels):
+    """
+    Precision / recall of predicted rep counts against labels, summed over sessions: every predicted rep up
+    to the labeled count is a true positive, extra reps are false positives, missing ones false negatives.
+    counts (S, ...) and labels (S,) -> dict of arrays shaped like one session's counts.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int64).reshape((-1,) + (1,) * (counts.ndim - 1))
+    tp = np.minimum(counts, labels).sum(axis=0)
+    predicted, actual = counts.sum(axis=0), labels.sum()
+    precision = np.where(predicted > 0, tp / np.maximum(predicted, 1), 1.0)
+    recall = tp / actual if actual else np.ones_like(precision)
+    f1 = np.where(precision + recall > 0, 2 * precision * recall / np.maximum(precision + recall, 1e-12), 0.0)
+    return {"precision": precision, "recall": recall, "f1": f1,
+            "exact": (counts == labels).mean(axis=0), "mae": np.abs(counts - labels).mean(axis=0)}
+
+
+def run_sweep(recordings, labels, grids, workers=None):
+    """
+    Sweeps every labeled exercise's grid over all recordings in a process pool.
+    Returns {exercise: (counts (S, E, X, C), labels (S,))}.
+    """
+    exercises = sorted({ex for entry in labels.values() for ex in entry})
+    jobs = [path for path in recordings if path in labels]
+    per_session = {ex: ([], []) for ex in exercises}
+    workers = workers or os.cpu_count() or 1
+
+    def collect(path, result):
+        for ex, counts in result.items():
+            if ex in labels[path]:
+                per_session[ex][0].append(counts)
+                per_session[ex][1].append(labels[path][ex])
+
+    if workers == 1:
+        for path in jobs:
+            collect(path, _sweep_recording(path, exercises, grids))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(jobs) // (workers * 8))
+            for path, result in zip(jobs, pool.map(_sweep_recording, jobs, [exercises] * len(jobs),
+                                                   [grids] * len(jobs), chunksize=chunksize)):
+                collect(path, result)
+    return {ex: (np.array(c), np.array(l)) for ex, (c, l) in per_session.items() if c}
+
+
+def report(ex, grid, counts, labels, top=10):
+    enter_grid, exit_grid, cooldowns = grid
+    scores = score(counts, labels)
+    program = load_program(ex)
+    enter, exit_, cooldown = template_thresholds(program)
+    print(f"\n{ex}: {len(labels)} sessions, {int(labels.sum())} labeled reps, "
+          f"{counts[0].size} threshold combinations")
+
+    # The template's own thresholds, when they lie on the grid
+    at = [np.flatnonzero(np.isclose(values, value)) for values, value in zip(grid, (enter, exit_, cooldown))]
+    if all(len(a) for a in at):
+        i, j, c = (a[0] for a in at)
+        print(f"  template ({enter:g}, {exit_:g}, {cooldown:g}s): precision {scores['precision'][i, j, c]:.3f} "
+              f"recall {scores['recall'][i, j, c]:.3f} f1 {scores['f1'][i, j, c]:.3f}")
+    order = np.lexsort((-scores["exact"].ravel(), -scores["f1"].ravel()))[:top]
+    print(f"  {'enter':>8} {'exit':>8} {'cooldown':>8} {'precision':>9} {'recall':>7} {'f1':>6} {'exact':>6} {'mae':>5}")
+    for flat in order:
+        i, j, c = np.unravel_index(flat, counts.shape[1:])
+        mark = " <- template" if np.allclose((enter_grid[i], exit_grid[j], cooldowns[c]), (enter, exit_, cooldown)) else ""
+        print(f"  {enter_grid[i]:8.3g} {exit_grid[j]:8.3g} {cooldowns[c]:8.3g} {scores['precision'][i, j, c]:9.3f} "
+              f"{scores['recall'][i, j, c]:7.3f} {scores['f1'][i, j, c]:6.3f} {scores['exact'][i, j, c]:6.1%} "
+              f"{scores['mae'][i, j, c]:5.2f}{mark}")
+    return scores
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score recorded sessions over a grid of rep thresholds")
+    parser.add_argument("recordings", nargs="+", help="Landmark recording folders (main.py --record, batch_analyze.py)")
+    parser.add_argument("--labels", default=None, help="JSON {recording: {exercise: reps}} (default: meta.json rep_labels)")
+    parser.add_argument("--exercise", choices=EXERCISES, default=None, help="Only sweep this exercise")
+    parser.add_argument("--enter", default=None, help="Enter thresholds, start:stop:step or a,b,c")
+    parser.add_argument("--exit", default=None, help="Exit thresholds, start:stop:step or a,b,c")
+    parser.add_argument("--cooldown", default=None, help="Cooldowns in seconds, start:stop:step or a,b,c")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--top", type=int, default=10, help="Best combinations to print per exercise")
+    parser.add_argument("--out", default=None, help="Write every combination's scores to this .npz")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    labels = load_labels(args.recordings, args.labels)
+    if args.exercise:
+        labels = {path: {ex: n for ex, n in entry.items() if ex == args.exercise} for path, entry in labels.items()}
+        labels = {path: entry for path, entry in labels.items() if entry}
+    if not labels:
+        raise SystemExit("No labeled recordings (see --labels)")
+
+    grids = {}
+    for ex in sorted({ex for entry in labels.values() for ex in entry}):
+        program = load_program(ex)
+        if not program.has_rep:
+            raise SystemExit(f"{ex} has no rep rules to sweep")
+        enter, exit_, cooldown = default_grid(program)
+        grids[ex] = (parse_grid(args.enter) if args.enter else enter, parse_grid(args.exit) if args.exit else exit_,
+                     parse_grid(args.cooldown) if args.cooldown else cooldown)
+
+    t0 = time.perf_counter()
+    results = run_sweep(args.recordings, labels, grids, args.workers)
+    elapsed = time.perf_counter() - t0
+    combos = sum(counts.size for counts, _ in results.values())
+    print(f"Swept {len(labels)} recordings in {elapsed:.1f}s ({combos / elapsed:,.0f} session-combinations/s)")
+
+    arrays = {}
+    for ex, (counts, ex_labels) in results.items():
+        for name, values in report(ex, grids[ex], counts, ex_labels, args.top).items():
+            arrays[f"{ex}_{name}"] = values
+        for axis, values in zip(("enter", "exit", "cooldown"), grids[ex]):
+            arrays[f"{ex}_{axis}"] = values
+    if args.out:
+        np.savez(args.out, **arrays)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import time
+
+import numpy as np
+
+from clock import VirtualClock
+from recording import load_recording
+from rules import EXERCISES, create_state, evaluate_exercise, load_program, reset_exercise
+
+
+def _replay_batch(state, landmarks, timestamps, exercise_ids, names, exercise=None):
+    """
+    Runs each run of consecutive same-exercise frames through the compiled rules in one call.
+    """
+    if not len(landmarks):
+        return
+    ids = np.zeros(len(landmarks), dtype=np.intp) if exercise else np.asarray(exercise_ids, dtype=np.intp)
+    bounds = np.flatnonzero(np.diff(ids)) + 1
+    for i, (start, end) in enumerate(zip(np.r_[0, bounds], np.r_[bounds, len(ids)])):
+        ex = exercise or names[ids[start]]
+        if i:
+            reset_exercise(state, ex)
+        load_program(ex).run_sequence(landmarks[start:end], timestamps[start:end], state)
+
+
+def replay_recording(path, exercise=None, clock=None, speed=None, batch=False):
+    """
+    Feeds a landmark recording through the exercise rules without a camera or the model.
+    'exercise' overrides the exercise recorded per frame. The clock (a VirtualClock by default)
+    is set to each frame's recorded rule time, so cooldowns behave exactly as during the live session.
+    'speed' paces the replay at that multiple of real time; None replays as fast as possible.
+    'batch' runs the compiled rules over each run of same-exercise frames at once instead of frame by frame.
+    """
+    landmarks, timestamps, exercise_ids, meta = load_recording(path)
+    names = meta.get("exercises") or EXERCISES
+    clock = clock or VirtualClock()
+    state = create_state(EXERCISES)
+    detected = ~np.isnan(landmarks[:, 0, 0])
+
+    wall_t0 = time.perf_counter()
+    if batch and not speed:
+        _replay_batch(state, landmarks, timestamps, exercise_ids, names, exercise)
+        if len(timestamps):
+            clock.set(timestamps[-1])
+    else:
+        current = None
+        for i in range(len(landmarks)):
+            ex = exercise or names[exercise_ids[i]]
+            if ex != current:
+                if current is not None:
+                    reset_exercise(state, ex)
+                current = ex
+            clock.set(timestamps[i])
+            if speed:
+                target = (timestamps[i] - timestamps[0]) / speed
+                delay = target - (time.perf_counter() - wall_t0)
+                if delay > 0:
+                    time.sleep(delay)
+            lm = np.asarray(landmarks[i], dtype=np.float64) if detected[i] else None
+            evaluate_exercise(state, ex, lm, now=clock.now())
+
+    elapsed = time.perf_counter() - wall_t0
+    session_seconds = float(timestamps[-1] - timestamps[0]) if len(timestamps) else 0.0
+    return {
+        "path": path,
+        "frames": int(len(landmarks)),
+        "session_seconds": session_seconds,
+        "replay_seconds": elapsed,
+        "speedup": (session_seconds / elapsed) if elapsed else 0.0,
+        "reps": {ex: st["counter"] for ex, st in state["state_tracker"].items() if st["counter"]},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay landmark recordings through the exercise rules")
+    parser.add_argument("recordings", nargs="+", help="Recording folders or .lmk archives written by main.py --record")
+    parser.add_argument("--exercise", choices=EXERCISES, default=None,
+                        help="Score every frame as this exercise instead of the recorded one")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="Pace the replay at this multiple of real time (default: as fast as possible)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Evaluate the compiled rules over whole runs of frames instead of frame by frame")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for path in args.recordings:
+        report = replay_recording(path, exercise=args.exercise, speed=args.speed, batch=args.batch)
+        reps = ", ".join(f"{ex}={n}" for ex, n in report["reps"].items()) or "none"
+        print(f"{path}: {report['frames']} frames, {report['session_seconds']:.1f}s session replayed in "
+              f"{report['replay_seconds']:.2f}s ({report['speedup']:.0f}x) | reps: {reps}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+import os
+import time
+import numpy as np
+from biomechanics import ANGLE_NAMES, compute_angle_table
+
+EXERCISES = [
+    "squat", "lunge", "jumping_jacks", "high_knees",
+    "bicep_curl", "shoulder_press", "calf_raises", "torso_twist"
+]
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+PERFECT_MSG = "PERFECT FORM"
+NO_BODY_MSG = "NO BODY DETECTED"
+
+# --- FEATURE VECTOR ---
+# Every rule in templates/*.json is written against these named per-frame features.
+# All joint angles from biomechanics.ANGLE_DEFINITIONS come first, then derived metrics.
+# A derived metric is op(u, v) over linear terms of the angles and landmark coordinates, where a term is
+# a {source: weight} dict with sources "<angle name>", "x<id>", "y<id>" or "1" (constant).
+DERIVED_FEATURES = [
+    # mean knee angle
+    ("knee_avg", "lin", {"left_knee": 0.5, "right_knee": 0.5}),
+    # mean hip angle
+    ("hip_avg", "lin", {"left_hip": 0.5, "right_hip": 0.5}),
+    # mean shoulder (arm raise) angle
+    ("arm_avg", "lin", {"left_shoulder": 0.5, "right_shoulder": 0.5}),
+    # mean elbow angle
+    ("elbow_avg", "lin", {"left_elbow": 0.5, "right_elbow": 0.5}),
+    # |left - right| elbow angle (arm sync)
+    ("elbow_diff", "abs", {"left_elbow": 1, "right_elbow": -1}),
+    # |hip_avg - knee_avg| (torso lean in squats)
+    ("lean_gap", "abs", {"left_hip": 0.5, "right_hip": 0.5, "left_knee": -0.5, "right_knee": -0.5}),
+    # most bent knee
+    ("active_knee", "min", {"left_knee": 1}, {"right_knee": 1}),
+    # highest knee lift (180 - most flexed hip)
+    ("active_hip", "max", {"1": 180, "left_hip": -1}, {"1": 180, "right_hip": -1}),
+    # horizontal knee spread
+    ("knee_dist", "abs", {"x25": 1, "x26": -1}),
+    # horizontal ankle spread
+    ("feet_dist", "abs", {"x27": 1, "x28": -1}),
+    # |left shoulder x - left hip x|
+    ("torso_lean", "abs", {"x11": 1, "x23": -1}),
+    # min over sides of (wrist y - shoulder y); > 0 when both wrists are below the shoulders
+    ("wrist_below_shoulder", "min", {"y15": 1, "y11": -1}, {"y16": 1, "y12": -1}),
+    # lowest elbow y - mean shoulder y; > 0 when an elbow is below shoulder level
+    ("elbow_drop", "max", {"y13": 1, "y11": -0.5, "y12": -0.5}, {"y14": 1, "y11": -0.5, "y12": -0.5}),
+    # mean shoulder y - highest wrist y
+    ("overhead_clearance", "max", {"y11": 0.5, "y12": 0.5, "y15": -1}, {"y11": 0.5, "y12": 0.5, "y16": -1}),
+    # horizontal shoulder spread (shrinks when twisting)
+    ("shoulder_width", "abs", {"x11": 1, "x12": -1}),
+    # left shoulder height (calf-raise baseline)
+    ("shoulder_y", "lin", {"y11": 1}),
+]
+FEATURE_NAMES = ANGLE_NAMES + [d[0] for d in DERIVED_FEATURES]
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+NUM_FEATURES = len(FEATURE_NAMES)
+
+def _compile_features():
+    """
+    Turns DERIVED_FEATURES into one weight matrix plus index arrays per operation.
+    Source vector layout: [angles (K), x (33), y (33), 1].
+    """
+    k = len(ANGLE_NAMES)
+    sources = {name: i for i, name in enumerate(ANGLE_NAMES)}
+    sources.update({f"x{i}": k + i for i in range(33)})
+    sources.update({f"y{i}": k + 33 + i for i in range(33)})
+    sources["1"] = k + 66
+    terms = []
+
+    def add_term(term):
+        row = np.zeros(k + 67)
+        for src, weight in term.items():
+            row[sources[src]] = weight
+        terms.append(row)
+        return len(terms) - 1
+
+    ops = {"lin": ([], []), "abs": ([], []), "min": ([], [], []), "max": ([], [], [])}
+    for i, (name, op, *args) in enumerate(DERIVED_FEATURES):
+        ops[op][0].append(k + i)
+        for slot, term in enumerate(args, start=1):
+            ops[op][slot].append(add_term(term))
+    return np.array(terms).T, {op: tuple(np.array(a, dtype=np.intp) for a in idx) for op, idx in ops.items()}
+
+_FEATURE_WEIGHTS, _FEATURE_OPS = _compile_features()
+
+def compute_features(landmarks):
+    """
+    Builds the feature vector for one (33, 4) frame -> (F,) or an (N, 33, 4) batch -> (N, F).
+    """
+    lm = np.asarray(landmarks, dtype=np.float64)
+    k = len(ANGLE_NAMES)
+    src = np.empty(lm.shape[:-2] + (k + 67,))
+    src[..., :k] = compute_angle_table(lm)
+    src[..., k:k + 33] = lm[..., 0]
+    src[..., k + 33:k + 66] = lm[..., 1]
+    src[..., -1] = 1.0
+    terms = src @ _FEATURE_WEIGHTS
+
+    out = np.empty(lm.shape[:-2] + (NUM_FEATURES,))
+    out[..., :k] = src[..., :k]
+    dst, a = _FEATURE_OPS["lin"]
+    out[..., dst] = terms[..., a]
+    dst, a = _FEATURE_OPS["abs"]
+    out[..., dst] = np.abs(terms[..., a])
+    dst, a, b = _FEATURE_OPS["min"]
+    out[..., dst] = np.minimum(terms[..., a], terms[..., b])
+    dst, a, b = _FEATURE_OPS["max"]
+    out[..., dst] = np.maximum(terms[..., a], terms[..., b])
+    return out
+
+# --- RULE PROGRAMS ---
+# Comparisons are compiled to (feature, sign, strict, threshold, rhs feature, rhs scale) atoms:
+#   sign * (value - (threshold + scale * rhs_value)) < 0   (strict)   or   <= 0   (non-strict)
+_OPS = {"<": (1.0, True), "<=": (1.0, False), ">": (-1.0, True), ">=": (-1.0, False)}
+
+# Slot appended after the feature vector holding the rep metric (needed for baseline-relative metrics)
+METRIC_SLOT = NUM_FEATURES
+
+DEFAULT_RULES = {
+    "visibility": {"points": [23, 24, 25, 26, 27, 28], "min": 0.6, "message": "STEP BACK ->"},
+    "form": [],
+    "rep": None,
+    "depth": {"constant": 0.0},
+}
+
+class RuleProgram:
+    """
+    An exercise's form checks, rep state machine and depth gauge compiled from its template.
+    Every comparison of a frame is evaluated in one vectorized pass; only the rep hysteresis is sequential.
+    """
+    def __init__(self, name, spec):
+        self.name = name
+        spec = dict(DEFAULT_RULES, **(spec or {}))
+        atoms = []
+
+        def add_atom(cond):
+            feature, op, rhs = cond
+            if op not in _OPS:
+                raise ValueError(f"{name}: unknown operator '{op}' in {cond}")
+            sign, strict = _OPS[op]
+            if isinstance(rhs, dict):
+                thr, rhs_idx, scale = rhs.get("offset", 0.0), self._feature(rhs["feature"]), rhs.get("scale", 1.0)
+            else:
+                thr, rhs_idx, scale = float(rhs), 0, 0.0
+            idx = METRIC_SLOT if feature == "metric" else self._feature(feature)
+            atoms.append((idx, sign, strict, thr, rhs_idx, scale))
+            return len(atoms) - 1
+
+        # Visibility gate
+        vis = spec["visibility"]
+        self.vis_points = np.array(vis["points"], dtype=np.intp)
+        self.vis_min = float(vis["min"])
+        self.messages = [PERFECT_MSG, NO_BODY_MSG, vis["message"]]
+
+        # Form checks: a check fails when all its conditions hold; the last failing check sets the message
+        form_atoms = []
+        for check in spec["form"]:
+            form_atoms.append([add_atom(c) for c in check["all"]])
+            self.messages.append(check["message"])
+        self.form_msg_ids = np.arange(3, 3 + len(form_atoms))
+
+        # Rep state machine
+        rep = spec["rep"]
+        self.has_rep = rep is not None
+        if self.has_rep:
+            self.baseline_idx = self._feature(rep["baseline"]) if rep.get("baseline") else None
+            self.metric_idx = None if self.baseline_idx is not None else self._feature(rep["metric"])
+            self.enter_atom = add_atom(["metric"] + list(rep["enter"]))
+            self.exit_atom = add_atom(["metric"] + list(rep["exit"]))
+            self.enter_atoms = [self.enter_atom] + [add_atom(c) for c in rep.get("enter_requires", [])]
+            self.enter_requires_form = rep.get("enter_requires_form", True)
+            self.exit_requires_form = rep.get("exit_requires_form", True)
+            self.cooldown = float(rep["cooldown"])
+        else:
+            self.baseline_idx = None
+
+        # Depth gauge: clip((value - origin) / span, 0, 1) or a constant
+        depth = spec["depth"]
+        self.depth_constant = depth.get("constant")
+        if self.depth_constant is None:
+            metric = depth.get("metric", "metric")
+            self.depth_idx = METRIC_SLOT if metric == "metric" else self._feature(metric)
+            self.depth_origin = float(depth["origin"])
+            self.depth_span = float(depth["span"])
+
+        # Pack atoms into arrays
+        n = len(atoms)
+        cols = list(zip(*atoms)) if atoms else [[]] * 6
+        self.atom_feature = np.array(cols[0], dtype=np.intp)
+        self.atom_sign = np.array(cols[1], dtype=np.float64)
+        self.atom_strict = np.array(cols[2], dtype=bool)
+        self.atom_thr = np.array(cols[3], dtype=np.float64)
+        self.atom_rhs = np.array(cols[4], dtype=np.intp)
+        self.atom_scale = np.array(cols[5], dtype=np.float64)
+        self.form_matrix = np.zeros((len(form_atoms), n), dtype=np.int32)
+        for r, ids in enumerate(form_atoms):
+            self.form_matrix[r, ids] = 1
+        self.form_sizes = self.form_matrix.sum(axis=1)
+        self._buf = np.empty(NUM_FEATURES + 1)
+
+    @staticmethod
+    def _feature(name):
+        if name not in FEATURE_INDEX:
+            raise ValueError(f"Unknown rule feature '{name}'. Known features: {FEATURE_NAMES}")
+        return FEATURE_INDEX[name]
+
+    def _eval_atoms(self, feats):
+        """
+        feats: (F+1,) or (N, F+1) -> (A,) or (N, A) booleans.
+        """
+        rhs = self.atom_thr + self.atom_scale * feats[..., self.atom_rhs]
+        diff = self.atom_sign * (feats[..., self.atom_feature] - rhs)
+        return np.where(self.atom_strict, diff < 0, diff <= 0)
+
+    def _form_failures(self, atoms):
+        return (atoms.astype(np.int32) @ self.form_matrix.T) == self.form_sizes
+
+    def _form_result(self, atoms, visible):
+        """
+        Per-row form flag and feedback message id for (N, A) atoms: the visibility gate first,
+        then the last failing form check.
+        """
+        ok = visible.copy()
+        ids = np.where(visible, 0, 2).astype(np.int16)
+        if len(self.form_sizes):
+            failed = self._form_failures(atoms) & visible[:, None]
+            any_failed = failed.any(axis=1)
+            last = failed.shape[1] - 1 - np.argmax(failed[:, ::-1], axis=1)
+            ids = np.where(any_failed, self.form_msg_ids[last], ids).astype(np.int16)
+            ok &= ~any_failed
+        return ok, ids
+
+    def _depth(self, feats):
+        if self.depth_constant is not None:
+            return np.full(feats.shape[:-1], self.depth_constant) if feats.ndim > 1 else self.depth_constant
+        return np.clip((feats[..., self.depth_idx] - self.depth_origin) / self.depth_span, 0, 1)
+
+    def step(self, state, landmarks, features, now, predicted=False):
+        """
+        Evaluates one frame and advances this exercise's rep state.
+        On predicted (not inferred) landmarks the rep state never moves: a transition is held back
+        and state["needs_inference"] is set so the next frame gets real inference to decide it.
+        Returns (is_form_correct, depth_percent, feedback_msg).
+        """
+        st = state["state_tracker"][self.name]
+        before = (st["counter"], st["bottomed"], st["last_rep_time"])
+        buf = self._buf
+        buf[:NUM_FEATURES] = features
+        if self.baseline_idx is not None:
+            if not state["base_y"]: state["base_y"] = features[self.baseline_idx]
+            buf[METRIC_SLOT] = state["base_y"] - features[self.baseline_idx]
+        elif self.has_rep:
+            buf[METRIC_SLOT] = features[self.metric_idx]
+        atoms = self._eval_atoms(buf)
+
+        is_form_correct = True
+        feedback_msg = PERFECT_MSG
+        if not (landmarks[self.vis_points, 3] > self.vis_min).all():
+            is_form_correct = False
+            feedback_msg = self.messages[2]
+            st["bottomed"] = False
+        elif len(self.form_sizes):
+            failed = np.flatnonzero(self._form_failures(atoms))
+            if len(failed):
+                is_form_correct = False
+                feedback_msg = self.messages[self.form_msg_ids[failed[-1]]]
+
+        if self.has_rep:
+            if atoms[self.enter_atoms].all() and (is_form_correct or not self.enter_requires_form):
+                st["bottomed"] = True
+            elif atoms[self.exit_atom] and st["bottomed"]:
+                if (is_form_correct or not self.exit_requires_form) and (now - st["last_rep_time"] > self.cooldown):
+                    st["counter"] += 1
+                    st["last_rep_time"] = now
+                st["bottomed"] = False
+
+        if predicted and (st["counter"], st["bottomed"]) != before[:2]:
+            st["counter"], st["bottomed"], st["last_rep_time"] = before
+            state["needs_inference"] = True
+
+        return is_form_correct, self._depth(buf), feedback_msg
+
+    def step_batch(self, landmarks, features, now, bottomed, counter, last_rep_time, base_y):
+        """
+        One step() for N independent sessions at once, all on this exercise.
+        landmarks (N, 33, 4), features (N, F) and now (N,) describe each session's frame; the rep
+        state arrays (N,) are updated in place. Returns (form_ok, depth, feedback_ids).
+        """
+        feats = np.empty((len(features), NUM_FEATURES + 1))
+        feats[:, :NUM_FEATURES] = features
+        if self.baseline_idx is not None:
+            unset = base_y == 0
+            base_y[unset] = features[unset, self.baseline_idx]
+            feats[:, METRIC_SLOT] = base_y - features[:, self.baseline_idx]
+        elif self.has_rep:
+            feats[:, METRIC_SLOT] = features[:, self.metric_idx]
+        atoms = self._eval_atoms(feats)
+
+        visible = (landmarks[:, self.vis_points, 3] > self.vis_min).all(axis=1)
+        ok, ids = self._form_result(atoms, visible)
+
+        if self.has_rep:
+            was_bottomed = bottomed & visible
+            enter = atoms[:, self.enter_atoms].all(axis=1)
+            if self.enter_requires_form:
+                enter &= ok
+            exit_ = ~enter & atoms[:, self.exit_atom] & was_bottomed
+            count = exit_ & (now - last_rep_time > self.cooldown)
+            if self.exit_requires_form:
+                count &= ok
+            counter += count
+            last_rep_time[count] = now[count]
+            bottomed[:] = enter | (was_bottomed & ~exit_)
+        else:
+            bottomed &= visible
+        return ok, self._depth(feats), ids
+
+    def run_sequence(self, landmarks, timestamps, state=None):
+        """
+        Runs the compiled rules over a whole (N, 33, 4) sequence (NaN rows = no body) with timestamps in seconds.
+        Form checks and depth are evaluated for all frames at once; the rep hysteresis walks the precomputed
+        booleans. Returns per-frame form_ok / depth / feedback_ids (into self.messages), the rep state after
+        each frame (bottomed, rep_done) and the rep count.
+        """
+        state = state or create_state([self.name])
+        st = state["state_tracker"][self.name]
+        landmarks = np.asarray(landmarks)
+        n = len(landmarks)
+        detected = ~np.isnan(landmarks[:, :, :2]).any(axis=(1, 2))
+        form_ok = np.zeros(n, dtype=bool)
+        depth = np.zeros(n, dtype=np.float64)
+        feedback_ids = np.ones(n, dtype=np.int16)  # NO BODY DETECTED
+        bottomed_after = np.zeros(n, dtype=bool)
+        rep_done = np.zeros(n, dtype=bool)
+        if not detected.any():
+            return {"form_ok": form_ok, "depth": depth, "feedback_ids": feedback_ids, "bottomed": bottomed_after,
+                    "rep_done": rep_done, "messages": self.messages, "reps": st["counter"]}
+
+        idx = np.flatnonzero(detected)
+        lm = landmarks[idx].astype(np.float64)
+        feats = np.empty((len(idx), NUM_FEATURES + 1))
+        feats[:, :NUM_FEATURES] = compute_features(lm)
+        if self.baseline_idx is not None:
+            if not state["base_y"]: state["base_y"] = feats[0, self.baseline_idx]
+            feats[:, METRIC_SLOT] = state["base_y"] - feats[:, self.baseline_idx]
+        elif self.has_rep:
+            feats[:, METRIC_SLOT] = feats[:, self.metric_idx]
+        atoms = self._eval_atoms(feats)
+
+        visible = (lm[:, self.vis_points, 3] > self.vis_min).all(axis=1)
+        ok, ids = self._form_result(atoms, visible)
+
+        # --- ULTIMATE ISOLATION: the selected exercise wipes the others' pending reps ---
+        for other_ex, other in state["state_tracker"].items():
+            if other_ex != self.name:
+                other["bottomed"] = False
+
+        if self.has_rep:
+            enter = atoms[:, self.enter_atoms].all(axis=1)
+            if self.enter_requires_form:
+                enter &= ok
+            exit_ = atoms[:, self.exit_atom]
+            can_count = ok if self.exit_requires_form else np.ones_like(ok)
+            ts = np.asarray(timestamps, dtype=np.float64)[idx]
+            bottomed, counter, last_rep = st["bottomed"], st["counter"], st["last_rep_time"]
+            for i in range(len(idx)):
+                if not visible[i]:
+                    bottomed = False
+                if enter[i]:
+                    bottomed = True
+                elif exit_[i] and bottomed:
+                    if can_count[i] and ts[i] - last_rep > self.cooldown:
+                        counter += 1
+                        last_rep = ts[i]
+                        rep_done[idx[i]] = True
+                    bottomed = False
+                bottomed_after[idx[i]] = bottomed
+            st["bottomed"], st["counter"], st["last_rep_time"] = bottomed, counter, last_rep
+
+        form_ok[idx] = ok
+        depth[idx] = self._depth(feats)
+        feedback_ids[idx] = ids
+        return {"form_ok": form_ok, "depth": depth, "feedback_ids": feedback_ids, "bottomed": bottomed_after,
+                "rep_done": rep_done, "messages": self.messages, "reps": st["counter"]}
+
+
+_programs = {}
+
+def load_program(ex, template_dir=TEMPLATE_DIR):
+    """
+    Compiles (once) and returns the RuleProgram for an exercise from templates/<ex>.json, loaded
+    and validated the same way as by the template registry, so offline tools (replay, batch
+    analysis, sweeps) reject a malformed template just like the live engine does.
+    Raises template_registry.TemplateError listing every problem found.
+    """
+    key = (ex, template_dir)
+    if key not in _programs:
+        path = os.path.join(template_dir, f"{ex}.json")
+        if os.path.exists(path):
+            # Imported here: template_registry builds on this module
+            from template_registry import load_template_file
+            root = os.path.dirname(os.path.abspath(template_dir))
+            _programs[key] = load_template_file(path, root).program
+        else:
+            _programs[key] = RuleProgram(ex, None)
+    return _programs[key]
+
+def set_program(ex, program, template_dir=TEMPLATE_DIR):
+    """
+    Replaces the compiled rules of an exercise (used by the template registry on load and hot reload).
+    """
+    _programs[(ex, template_dir)] = program
+
+def compile_all(exercises=EXERCISES, template_dir=TEMPLATE_DIR):
+    """
+    Compiles every exercise's rules up front so no template is parsed inside the frame loop.
+    """
+    return {ex: load_program(ex, template_dir) for ex in exercises}
+
+def create_state(exercises):
+    """
+    Per-session rule state: one isolated rep tracker per exercise plus the calf-raise baseline.
+    """
+    return {
+        # State Machine V3 (STRICT ISOLATION)
+        # Using a state dict to prevent leakage between exercises
+        "state_tracker": {ex: {"counter": 0, "bottomed": False, "last_rep_time": 0} for ex in exercises},
+        "base_y": 0,
+        # Set when a rep transition was held back on predicted landmarks (see RuleProgram.step)
+        "needs_inference": False,
+    }
+
+def reset_exercise(state, ex):
+    """
+    RESET rep state when switching to prevent leakage.
+    """
+    state["state_tracker"][ex]["bottomed"] = False
+    state["base_y"] = 0
+
+def evaluate_exercise(state, ex, landmarks, now=None, predicted=False):
+    """
+    Runs the compiled form checks and rep state machine of exercise 'ex' for one frame of landmarks.
+    'now' is the frame time in seconds (defaults to the wall clock) and drives rep cooldowns.
+    'predicted' marks motion-predicted landmarks, which never count reps on their own.
+    Returns (is_form_correct, depth_percent, feedback_msg).
+    """
+    if landmarks is None:
+        return False, 0.0, NO_BODY_MSG
+    if now is None:
+        now = time.time()
+
+    state_tracker = state["state_tracker"]
+
+    # --- ULTIMATE ISOLATION: Wipe background states ---
+    # This prevents any movement while in one "tab" from ever being remembered by another
+    for other_ex in state_tracker:
+        if other_ex != ex:
+            state_tracker[other_ex]["bottomed"] = False
+
+    return load_program(ex).step(state, landmarks, compute_features(landmarks), now, predicted)
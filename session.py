@@ -0,0 +1,158 @@
+import json
+import time
+import uuid
+import numpy as np
+from dtw_scoring import rep_scorer
+from event_log import EXERCISE, FORM_FAULT, FORM_OK, REP, SESSION_END, SESSION_START
+from rules import EXERCISES, NO_BODY_MSG, create_state, evaluate_exercise, reset_exercise
+from template_registry import default_registry
+
+class ExerciseSession:
+    """
+    Rep counting, form checks and coach sync of one patient, independent of where the landmarks
+    come from (local camera, replay or a remote device).
+    With an EventLog, rep completions, form-fault transitions and exercise switches are recorded.
+    Exercises whose template has an ideal pose sequence get a DTW form score per rep (dtw_scoring.py).
+    """
+    # Depth above which the user counts as moving, and idle time before the coach goes back to demo mode
+    MOVE_DEPTH = 0.1
+    IDLE_SECONDS = 2.0
+
+    def __init__(self, exercises=EXERCISES, event_log=None, patient="anonymous", templates=None):
+        self.exercises = list(exercises)
+        self.templates = templates or default_registry()
+        # Rule state in the layout rules.py works on (state_tracker, base_y, needs_inference)
+        self.state = create_state(self.exercises)
+        self.current_idx = 0
+        self.template = self.templates.get(self.exercises[0])
+        self.last_move_time = None
+        self.is_user_moving = False
+
+        # Result of the last update()
+        self.body = False
+        self.is_form_correct = False
+        self.depth_percent = 0.0
+        self.feedback_msg = NO_BODY_MSG
+
+        # Per-rep DTW form scores (0-100) of the current exercise
+        self.scorer = rep_scorer(self.exercise, self.templates)
+        self.rep_scores = []
+        self.last_rep_score = None
+
+        # Event log state: the active form fault and the deepest point of the current rep
+        self.event_log = event_log
+        self.patient = patient
+        self.session_id = uuid.uuid4().hex
+        self._fault = None
+        self._peak_depth = 0.0
+        self._record(SESSION_START, time.time(), exercise=self.exercise)
+
+    @property
+    def exercise(self):
+        return self.exercises[self.current_idx]
+
+    @property
+    def state_tracker(self):
+        return self.state["state_tracker"]
+
+    @property
+    def reps(self):
+        return self.state_tracker[self.exercise]["counter"]
+
+    def _record(self, kind, ts, **fields):
+        if self.event_log is not None:
+            self.event_log.record(self.session_id, self.patient, ts, kind, **fields)
+
+    def select(self, ex, now=None):
+        """Switches to exercise 'ex' (name). Returns False for an unknown exercise."""
+        if ex not in self.exercises:
+            return False
+        previous = self.exercise
+        self.current_idx = self.exercises.index(ex)
+        self.template = self.templates.get(ex)
+        self.scorer = rep_scorer(ex, self.templates)
+        self.rep_scores = []
+        self.last_rep_score = None
+        reset_exercise(self.state, ex)
+        self._fault = None
+        self._peak_depth = 0.0
+        self._record(EXERCISE, time.time() if now is None else now, exercise=ex, reps=self.reps, message=previous)
+        return True
+
+    def update(self, landmarks, now, predicted=False):
+        """
+        Evaluates one frame of (33, 4) landmarks (None = no body) taken at 'now' seconds.
+        Returns (is_form_correct, depth_percent, feedback_msg).
+        """
+        self.body = landmarks is not None
+        reps = self.reps
+        self.is_form_correct, self.depth_percent, self.feedback_msg = evaluate_exercise(
+            self.state, self.exercise, landmarks, now=now, predicted=predicted)
+        if self.body and self.scorer is not None:
+            score = self.scorer.update(landmarks, self.depth_percent, self.state_tracker[self.exercise]["bottomed"],
+                                       self.reps != reps)
+            if score is not None:
+                self.rep_scores.append(score)
+                self.last_rep_score = score
+        if self.body and self.event_log is not None:
+            self._log_transitions(reps, now)
+        if self.body:
+            # --- 4. DYNAMIC COACH SYNC (Demo vs. Sync) ---
+            # If user is idle, show a demo. If user moves, sync to them.
+            if self.last_move_time is None: self.last_move_time = now
+
+            # Sensitivity trigger for sync
+            if self.depth_percent > self.MOVE_DEPTH:
+                self.last_move_time = now
+                self.is_user_moving = True
+            elif now - self.last_move_time > self.IDLE_SECONDS:
+                self.is_user_moving = False
+        return self.is_form_correct, self.depth_percent, self.feedback_msg
+
+    def _log_transitions(self, reps_before, now):
+        self._peak_depth = max(self._peak_depth, float(self.depth_percent))
+        if self.reps != reps_before:
+            self._record(REP, now, exercise=self.exercise, reps=self.reps, form_ok=self.is_form_correct,
+                         depth=self._peak_depth)
+            self._peak_depth = 0.0
+        fault = None if self.is_form_correct else self.feedback_msg
+        if fault != self._fault:
+            if fault is None:
+                self._record(FORM_OK, now, exercise=self.exercise, form_ok=True, message=self._fault)
+            else:
+                self._record(FORM_FAULT, now, exercise=self.exercise, form_ok=False, message=fault)
+            self._fault = fault
+
+    def close(self, now=None):
+        """Records the end of the session with the final rep count of every exercise."""
+        self._record(SESSION_END, time.time() if now is None else now, exercise=self.exercise,
+                     reps=sum(s["counter"] for s in self.state_tracker.values()),
+                     message=json.dumps({name: s["counter"] for name, s in self.state_tracker.items()}))
+
+    def take_inference_request(self):
+        """True once after a rep transition was held back on predicted landmarks."""
+        requested = self.state["needs_inference"]
+        self.state["needs_inference"] = False
+        return requested
+
+    def coach_progress(self, now):
+        if self.is_user_moving:
+            # SYNC MODE: Coach follows user
+            return self.depth_percent
+        # DEMO MODE: Coach shows how to do it (Slow looping 0 -> 1 -> 0)
+        phase = (now % 4) / 4.0
+        return (1 - np.cos(phase * 2 * np.pi)) / 2
+
+    def snapshot(self):
+        """JSON-ready summary of the last update (what the dashboard shows)."""
+        return {
+            "exercise": self.exercise,
+            "reps": self.reps,
+            "counters": {name: s["counter"] for name, s in self.state_tracker.items()},
+            "body": self.body,
+            "form_ok": bool(self.is_form_correct),
+            # 1% steps are all the gauge shows; finer values would only turn jitter into deltas
+            "depth": round(float(self.depth_percent), 2),
+            "feedback": self.feedback_msg,
+            "rep_score": None if self.last_rep_score is None else round(self.last_rep_score),
+        }
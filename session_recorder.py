@@ -0,0 +1,211 @@
+import argparse
+import collections
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from pipeline import DROP_NEWEST, FrameQueue
+from pose_engine import PoseEngine
+from recording import LandmarkRecorder, load_recording
+
+RAW_VIDEO_FILE = "raw.mp4"
+
+
+class SessionRecorder:
+    """
+    Session video export that never blocks the frame loop.
+
+    submit() downscales (or copies) the frame into one of a fixed pool of buffers and hands it to
+    an encoder thread over a bounded queue; cv2.VideoWriter.write runs on that thread. When every
+    buffer is still waiting to be encoded the frame is dropped and counted instead of waiting.
+
+    Frames are taken on an 'fps' time grid from their capture times: faster loops are decimated,
+    and a frame after a gap (slow frame or drop) is written once per grid slot it covers, so the
+    video plays back in real time.
+
+    Composite mode writes the display canvas to 'path' (a video file). Raw mode (raw=True) writes
+    the mirrored camera frames to path/raw.mp4 and their landmarks, one row per video frame, as a
+    landmark recording in the same folder; render_raw() re-renders it later.
+    """
+    def __init__(self, path, fps=15.0, scale=0.5, raw=False, buffers=4, fourcc="mp4v", exercises=None):
+        self.path = path
+        self.fps = float(fps)
+        self.scale = float(scale)
+        self.raw = raw
+        self.fourcc = fourcc
+        self.video_path = os.path.join(path, RAW_VIDEO_FILE) if raw else path
+        self.landmarks = LandmarkRecorder(path, exercises=exercises, video=RAW_VIDEO_FILE, video_fps=self.fps) \
+            if raw else None
+        self.pool_size = buffers
+        self._free = collections.deque()
+        self.queue = FrameQueue("video", buffers, DROP_NEWEST)
+        self.size = None
+        self._t0 = None
+        self._next_slot = 0
+        self._writer = None
+
+        # Counters
+        self.submitted = 0
+        self.decimated = 0
+        self.dropped = 0
+        self.written = 0
+        self.encoded = 0
+        self.encode_time = 0.0
+        self.error = None
+
+        self._thread = threading.Thread(target=self._run, name="video-encoder", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, capture_ts, landmarks=None, exercise_idx=0):
+        """
+        Offers one frame (the canvas, or in raw mode the camera frame plus its (33, 4) landmarks or
+        None). Returns True if it was queued for encoding.
+        """
+        self.submitted += 1
+        if self._t0 is None:
+            self._t0 = capture_ts
+            h, w = image.shape[:2]
+            self.size = (max(2, round(w * self.scale)) // 2 * 2, max(2, round(h * self.scale)) // 2 * 2)
+            self._free.extend(np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+                              for _ in range(self.pool_size))
+        slot = int((capture_ts - self._t0) * self.fps)
+        if slot < self._next_slot:
+            self.decimated += 1
+            return False
+        try:
+            buf = self._free.popleft()
+        except IndexError:
+            # The encoder is behind: skip this frame; the next one taken fills its slots
+            self.dropped += 1
+            return False
+        if image.shape[1::-1] == self.size:
+            np.copyto(buf, image)
+        else:
+            cv2.resize(image, self.size, dst=buf, interpolation=cv2.INTER_AREA)
+        repeats = slot - self._next_slot + 1
+        if self.landmarks is not None:
+            for k in range(self._next_slot, slot + 1):
+                self.landmarks.append(landmarks, self._t0 + k / self.fps, exercise_idx)
+        self._next_slot = slot + 1
+        self.queue.put((buf, repeats))
+        return True
+
+    def _open_writer(self):
+        writer = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.size)
+        if not writer.isOpened():
+            raise IOError(f"could not open a '{self.fourcc}' video writer for {self.video_path}")
+        return writer
+
+    def _run(self):
+        while True:
+            item = self.queue.get(timeout=0.5)
+            if item is None:
+                if self.queue.closed:
+                    break
+                continue
+            buf, repeats = item
+            try:
+                if self.error is None:
+                    if self._writer is None:
+                        self._writer = self._open_writer()
+                    t0 = time.perf_counter()
+                    for _ in range(repeats):
+                        self._writer.write(buf)
+                    self.encode_time += time.perf_counter() - t0
+                    self.encoded += 1
+                    self.written += repeats
+            except Exception as e:
+                # Keep draining so the frame loop only ever sees drops
+                self.error = e
+            finally:
+                self._free.append(buf)
+        if self._writer is not None:
+            self._writer.release()
+
+    def close(self, timeout=10.0):
+        """Encodes what is queued and finalizes the file(s)."""
+        self.queue.close()
+        self._thread.join(timeout)
+        if self.landmarks is not None:
+            self.landmarks.close()
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "decimated": self.decimated,
+            "dropped": self.dropped,
+            "queued": self.queue.stats()["queued"],
+            "written": self.written,
+            "avg_encode_ms": (self.encode_time / self.encoded * 1000) if self.encoded else 0.0,
+            "error": None if self.error is None else str(self.error),
+        }
+
+
+class _RecordedEngine:
+    """Stands in for PoseEngine in render_raw(): the 'results' passed around are the recorded rows."""
+    draw_landmarks_array = PoseEngine.draw_landmarks_array
+
+    @staticmethod
+    def get_landmarks_array(results):
+        return results
+
+    def request_inference(self):
+        pass
+
+
+def render_raw(path, out, fourcc="mp4v"):
+    """
+    Re-renders a raw-mode recording (path/raw.mp4 + landmarks) into an annotated composite video,
+    running the exercise rules, ghost coach and HUD on a virtual clock set to each frame's time.
+    Returns the number of frames written.
+    """
+    import main as frame_loop
+    from clock import VirtualClock
+    from ghost_coach import GhostCoach
+    from ui_manager import UIManager
+
+    landmarks, timestamps, exercise_ids, meta = load_recording(path)
+    names = meta.get("exercises")
+    fps = meta.get("video_fps", 15.0)
+    cap = cv2.VideoCapture(os.path.join(path, meta.get("video", RAW_VIDEO_FILE)))
+    ctx = frame_loop.create_context()
+    ctx["clock"] = VirtualClock()
+    engine, coach, ui = _RecordedEngine(), GhostCoach(), UIManager()
+    writer = None
+    frames = 0
+    try:
+        for i in range(len(timestamps)):
+            success, frame = cap.read()
+            if not success:
+                break
+            if names and ctx["session"].exercise != names[exercise_ids[i]]:
+                ctx["session"].select(names[exercise_ids[i]])
+            ctx["clock"].set(timestamps[i])
+            lm = None if np.isnan(landmarks[i, 0, 0]) else np.asarray(landmarks[i], dtype=np.float64)
+            canvas = frame_loop.render_frame(frame, lm, ctx, engine, coach, ui, timestamps[i])
+            if writer is None:
+                writer = cv2.VideoWriter(out, cv2.VideoWriter_fourcc(*fourcc), fps, canvas.shape[1::-1])
+            writer.write(canvas)
+            frames += 1
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+    return frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-render a raw session recording (main.py --video-raw)")
+    parser.add_argument("recording", help="Folder written by main.py --record-video DIR --video-raw")
+    parser.add_argument("--out", required=True, help="Annotated video file, e.g. session.mp4")
+    args = parser.parse_args(argv)
+    t0 = time.perf_counter()
+    frames = render_raw(args.recording, args.out)
+    print(f"Rendered {frames} frames to {args.out} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
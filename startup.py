@@ -0,0 +1,79 @@
+import threading
+import time
+
+from pose_engine import load_mediapipe
+
+# Loader stages, shown on the loading HUD
+IMPORTING, LOADING_MODEL, WAITING_FOR_CAMERA, WARMING_UP, READY, FAILED = (
+    "importing mediapipe", "loading pose model", "waiting for camera", "warming up", "ready", "failed")
+
+
+class EngineLoader:
+    """
+    Builds the pose engine on a daemon thread while the main thread opens the camera and shows
+    the loading HUD: imports mediapipe, calls build_fn(frame_size) to load the model, then runs a
+    warm-up inference on a blank frame of the camera's size.
+
+    frame_size is a function returning the camera's (h, w) once set_frame_size() was called
+    (blocking until then, None when the camera failed); build_fn only needs it to pick a model
+    for the camera resolution. Stage durations go to 'timer' (instrumentation.StartupTimer).
+    """
+    def __init__(self, build_fn, timer, warm_up=True, camera_timeout=10.0):
+        self.build_fn = build_fn
+        self.timer = timer
+        self.warm_up = warm_up
+        self.camera_timeout = camera_timeout
+        self.status = IMPORTING
+        self.engine = None
+        self.error = None
+        self._frame_size = None
+        self._camera_known = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="engine-loader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def set_frame_size(self, frame_size):
+        self._frame_size = frame_size
+        self._camera_known.set()
+
+    def frame_size(self):
+        self._camera_known.wait(self.camera_timeout)
+        return self._frame_size
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """The engine once loaded; re-raises the loader's exception."""
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.engine
+
+    def _run(self):
+        try:
+            t = time.perf_counter()
+            load_mediapipe()
+            t = self.timer.stage("import", t)
+            self.status = LOADING_MODEL
+            engine = self.build_fn(self.frame_size)
+            t = self.timer.stage("model", t)
+            if self.warm_up:
+                self.status = WAITING_FOR_CAMERA
+                size = self.frame_size()
+                t = time.perf_counter()
+                self.status = WARMING_UP
+                engine.warm_up((*size, 3) if size else (480, 640, 3))
+                self.timer.stage("warm_up", t)
+            self.engine = engine
+            self.status = READY
+            self.timer.mark("engine_ready")
+        except Exception as e:
+            self.error = e
+            self.status = FAILED
+        finally:
+            self._done.set()
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import queue
+import threading
+
+# Dashboard refresh rates a client may ask for (frames per second)
+MIN_FPS = 1
+MAX_FPS = 120
+
+
+def diff_state(old, new):
+    """
+    Keys of 'new' whose values differ from 'old'. Nested dicts are diffed recursively, so a
+    delta is applied by merging it into the previous state.
+    """
+    delta = {}
+    for key, value in new.items():
+        prev = old.get(key)
+        if isinstance(value, dict) and isinstance(prev, dict):
+            sub = diff_state(prev, value)
+            if sub:
+                delta[key] = sub
+        elif value != prev:
+            delta[key] = value
+    return delta
+
+
+class TelemetryHub:
+    """
+    Hand-off point between the frame loop and the telemetry server.
+
+    The frame loop calls publish() once per frame: it only swaps in the latest state, so it
+    never waits for a client. The server reads 'latest' at each client's own refresh rate
+    (frames in between are coalesced) and queues dashboard commands for poll_commands().
+    """
+    def __init__(self):
+        self.version = 0
+        self.latest = (0, None)
+        self.commands = queue.SimpleQueue()
+
+    def publish(self, state):
+        """'state' is a JSON-serializable dict that the caller no longer mutates."""
+        self.version += 1
+        self.latest = (self.version, state)
+
+    def poll_commands(self):
+        """Commands received since the last call, oldest first (never blocks)."""
+        commands = []
+        while True:
+            try:
+                commands.append(self.commands.get_nowait())
+            except queue.Empty:
+                return commands
+
+
+class TelemetryServer:
+    """
+    Local WebSocket server (asyncio, on a daemon thread) that streams TelemetryHub state to dashboards.
+
+    Server -> client:
+        {"type": "state", ...}    full state, first message after connecting
+        {"type": "delta", ...}    changed keys only (see diff_state)
+    Client -> server:
+        {"type": "hello", "fps": 60}              refresh rate to coalesce updates to
+        {"type": "select", "exercise": "lunge"}   forwarded to the frame loop via the hub
+
+    Backpressure is latest-only: each client has at most one send in flight and always gets the
+    newest state once it completes, so a slow tab just receives fewer updates. A client that
+    cannot drain a single message within 'send_timeout' seconds is disconnected.
+    """
+    def __init__(self, hub, host="127.0.0.1", port=8765, default_fps=30, send_timeout=5.0):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.default_fps = default_fps
+        self.send_timeout = send_timeout
+        self.thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._ready = threading.Event()
+        self._loop = None
+        self._stop = None
+        self._server = None
+        self._error = None
+        # Encoded deltas for the current version, keyed by the version a client last received.
+        # Clients that are in step share one encoding.
+        self._encoded_version = None
+        self._encoded = {}
+
+        # Counters (only touched on the event loop thread)
+        self.clients = 0
+        self.connections = 0
+        self.full_sent = 0
+        self.deltas_sent = 0
+        self.bytes_sent = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+        self.commands = 0
+
+    @property
+    def address(self):
+        return self._server.sockets[0].getsockname()[:2]
+
+    def start(self):
+        self.thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        self.thread.join(timeout=5.0)
+
+    def _run(self):
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+
+    async def _main(self):
+        from websockets.asyncio.server import serve
+
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        # Messages are a few hundred bytes at most; compression would only cost CPU
+        async with serve(self._handle, self.host, self.port, compression=None) as server:
+            self._server = server
+            self._ready.set()
+            await self._stop.wait()
+
+    def _message(self, sent_version, sent_state, version, state):
+        if sent_state is None:
+            self.full_sent += 1
+            return json.dumps({"type": "state", **state})
+        if version != self._encoded_version:
+            self._encoded_version = version
+            self._encoded = {}
+        if sent_version not in self._encoded:
+            delta = diff_state(sent_state, state)
+            self._encoded[sent_version] = json.dumps({"type": "delta", **delta}) if delta else None
+        message = self._encoded[sent_version]
+        if message is not None:
+            self.deltas_sent += 1
+        return message
+
+    async def _send_loop(self, ws, client):
+        loop = asyncio.get_running_loop()
+        sent_version, sent_state = None, None
+        while True:
+            t0 = loop.time()
+            version, state = self.hub.latest
+            if state is not None and version != sent_version:
+                if sent_version is not None:
+                    self.coalesced += version - sent_version - 1
+                message = self._message(sent_version, sent_state, version, state)
+                if message is not None:
+                    try:
+                        await asyncio.wait_for(ws.send(message), self.send_timeout)
+                    except asyncio.TimeoutError:
+                        self.slow_disconnects += 1
+                        ws.transport.abort()
+                        return
+                    self.bytes_sent += len(message)
+                sent_version, sent_state = version, state
+            await asyncio.sleep(max(0.0, client["interval"] - (loop.time() - t0)))
+
+    def _on_message(self, client, raw):
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            return
+        if not isinstance(msg, dict):
+            return
+        if msg.get("type") == "hello":
+            try:
+                fps = min(max(float(msg.get("fps", self.default_fps)), MIN_FPS), MAX_FPS)
+            except (TypeError, ValueError):
+                return
+            client["interval"] = 1.0 / fps
+        elif msg.get("type") == "select" and isinstance(msg.get("exercise"), str):
+            self.commands += 1
+            self.hub.commands.put(msg)
+
+    async def _handle(self, ws):
+        from websockets.exceptions import ConnectionClosed
+
+        client = {"interval": 1.0 / self.default_fps}
+        self.clients += 1
+        self.connections += 1
+        sender = asyncio.create_task(self._send_loop(ws, client))
+        try:
+            async for raw in ws:
+                self._on_message(client, raw)
+        except ConnectionClosed:
+            pass
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+            self.clients -= 1
+
+    def stats(self):
+        return {
+            "clients": self.clients,
+            "connections": self.connections,
+            "full_sent": self.full_sent,
+            "deltas_sent": self.deltas_sent,
+            "bytes_sent": self.bytes_sent,
+            "coalesced": self.coalesced,
+            "slow_disconnects": self.slow_disconnects,
+            "commands": self.commands,
+        }
@@ -0,0 +1,221 @@
+import collections
+import json
+import os
+import threading
+import types
+
+import numpy as np
+
+from rules import TEMPLATE_DIR, RuleProgram, set_program
+
+# Used for an exercise without a template file (what load_template used to fall back to)
+DEFAULT_TEMPLATE = {"target_angles": {"knee_angle": 100}, "tolerance": 20}
+KNOWN_KEYS = {"exercise", "exercise_name", "target_angles", "tolerance", "ideal_pose_path", "rules"}
+
+ExerciseTemplate = collections.namedtuple("ExerciseTemplate", [
+    "key",              # file stem, the id used everywhere else ("bicep_curl")
+    "name",             # display name ("Bicep Curl")
+    "target_angles",    # read-only {angle name: degrees}
+    "tolerance",        # degrees
+    "ideal_pose",       # read-only memory-mapped array, or None
+    "ideal_pose_path",
+    "rules",            # read-only rule spec (see rules.RuleProgram), or None
+    "program",          # compiled RuleProgram
+    "path",
+    "mtime",
+    "warnings",         # tuple of non-fatal problems (unknown keys, missing pose file, ...)
+])
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def freeze(value):
+    """Read-only deep copy: dicts become mappingproxies and lists tuples."""
+    if isinstance(value, dict):
+        return types.MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_template(key, data, path=None, root=None, mtime=None):
+    """
+    Validates one template's JSON data and normalizes it into an ExerciseTemplate.
+    Both schemas in templates/ are accepted: {"exercise": "<key>"} and {"exercise_name": "<display name>"}.
+    Raises TemplateError listing every problem found.
+    """
+    errors, warnings = [], []
+    if not isinstance(data, dict):
+        raise TemplateError(f"{key}: template must be a JSON object")
+
+    exercise = data.get("exercise")
+    if exercise is not None and exercise != key:
+        errors.append(f"'exercise' is '{exercise}' but the file is named '{key}'")
+    name = data.get("exercise_name") or key.replace("_", " ").title()
+    if not isinstance(name, str):
+        errors.append("'exercise_name' must be a string")
+
+    target_angles = data.get("target_angles", {})
+    if not isinstance(target_angles, dict) or not all(_is_number(v) for v in target_angles.values()):
+        errors.append("'target_angles' must map angle names to numbers")
+        target_angles = {}
+    tolerance = data.get("tolerance", DEFAULT_TEMPLATE["tolerance"])
+    if not _is_number(tolerance) or tolerance <= 0:
+        errors.append("'tolerance' must be a positive number")
+
+    for unknown in sorted(set(data) - KNOWN_KEYS):
+        warnings.append(f"unknown key '{unknown}' ignored")
+
+    ideal_pose, pose_path = None, data.get("ideal_pose_path")
+    if pose_path is not None:
+        if not isinstance(pose_path, str):
+            errors.append("'ideal_pose_path' must be a string")
+        else:
+            # Paths are written relative to the project root ("templates/squat_ideal.npy")
+            full = pose_path if os.path.isabs(pose_path) else os.path.join(root or os.getcwd(), pose_path)
+            if not os.path.exists(full):
+                warnings.append(f"ideal pose '{pose_path}' not found")
+            else:
+                try:
+                    ideal_pose = np.load(full, mmap_mode="r")
+                except (OSError, ValueError) as e:
+                    errors.append(f"ideal pose '{pose_path}' is not a .npy array: {e}")
+                else:
+                    if ideal_pose.shape[-2:-1] != (33,) or ideal_pose.shape[-1] < 2 or ideal_pose.ndim not in (2, 3):
+                        errors.append(f"ideal pose '{pose_path}' has shape {ideal_pose.shape}, "
+                                      f"expected (33, k) or (frames, 33, k)")
+
+    rules = data.get("rules")
+    program = None
+    try:
+        program = RuleProgram(key, rules)
+    except (KeyError, TypeError, ValueError) as e:
+        errors.append(f"invalid rules: {e!r}")
+
+    if errors:
+        raise TemplateError(f"{path or key}: " + "; ".join(errors))
+    return ExerciseTemplate(key, name, freeze({k: float(v) for k, v in target_angles.items()}), float(tolerance),
+                            ideal_pose, pose_path, freeze(rules), program, path,
+                            mtime, tuple(warnings))
+
+
+def load_template_file(path, root=None):
+    key = os.path.splitext(os.path.basename(path))[0]
+    # Taken before reading, so a write racing the read shows up as a change on the next check
+    mtime = os.path.getmtime(path)
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except ValueError as e:
+        raise TemplateError(f"{path}: not valid JSON: {e}")
+    return parse_template(key, data, path, root, mtime)
+
+
+class TemplateRegistry:
+    """
+    Every exercise template, loaded, validated and compiled once. get() is a dictionary lookup,
+    so exercise switches never touch the disk.
+
+    watch() starts a daemon thread that re-reads a template when its file's mtime changes. A
+    valid new version replaces the old one (and its compiled rules); an invalid one is reported
+    and the previous version stays in use.
+    """
+    def __init__(self, template_dir=TEMPLATE_DIR, root=None, strict=True):
+        self.template_dir = template_dir
+        self.root = root or os.path.dirname(os.path.abspath(template_dir))
+        self._templates = {}
+        self._install_lock = threading.Lock()
+        self.errors = {}  # path -> (mtime, message) of files that failed to load
+        self.reloads = 0
+        self._watcher = None
+        self._stop = threading.Event()
+        for path in self._files():
+            try:
+                self._install(load_template_file(path, self.root))
+            except TemplateError as e:
+                if strict:
+                    raise
+                self.errors[path] = (os.path.getmtime(path), str(e))
+
+    def _files(self):
+        return sorted(os.path.join(self.template_dir, name) for name in os.listdir(self.template_dir)
+                      if name.endswith(".json"))
+
+    def _install(self, template):
+        # Swap the whole dict so readers on other threads never see it half-updated; the lock keeps
+        # two writers (the watcher and get() / check_for_changes() callers) from losing an install
+        with self._install_lock:
+            templates = dict(self._templates)
+            templates[template.key] = template
+            self._templates = templates
+            set_program(template.key, template.program, self.template_dir)
+
+    def get(self, key):
+        template = self._templates.get(key)
+        if template is None:
+            template = parse_template(key, DEFAULT_TEMPLATE)
+            self._install(template)
+        return template
+
+    def __contains__(self, key):
+        return key in self._templates
+
+    def keys(self):
+        return list(self._templates)
+
+    def warnings(self):
+        return {t.key: t.warnings for t in self._templates.values() if t.warnings}
+
+    def check_for_changes(self):
+        """Reloads templates whose file changed (or appeared). Returns the keys that were reloaded."""
+        known = {t.path: t for t in self._templates.values() if t.path}
+        reloaded = []
+        for path in self._files():
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            old = known.get(path)
+            if old is not None and old.mtime == mtime:
+                continue
+            if self.errors.get(path, (None,))[0] == mtime:
+                continue
+            try:
+                template = load_template_file(path, self.root)
+            except (OSError, TemplateError) as e:
+                self.errors[path] = (mtime, str(e))
+                print(f"Template not reloaded: {e}")
+                continue
+            self.errors.pop(path, None)
+            self._install(template)
+            self.reloads += 1
+            reloaded.append(template.key)
+        return reloaded
+
+    def watch(self, interval=1.0):
+        if self._watcher is None:
+            def loop():
+                while not self._stop.wait(interval):
+                    self.check_for_changes()
+            self._watcher = threading.Thread(target=loop, name="template-watch", daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+_default = None
+
+def default_registry():
+    """Registry over templates/ shared by the application (created on first use)."""
+    global _default
+    if _default is None:
+        _default = TemplateRegistry()
+    return _default
@@ -1,15 +1,73 @@
 import React, { useState, useEffect, useRef } from 'react';
 
 const exercises = [
-    "Squat", "Lunge", "Jumping Jacks", "High Knees",
-    "Bicep Curl", "Shoulder Press", "Calf Raises", "Torso Twist"
+    ["squat", "Squat"], ["lunge", "Lunge"], ["jumping_jacks", "Jumping Jacks"], ["high_knees", "High Knees"],
+    ["bicep_curl", "Bicep Curl"], ["shoulder_press", "Shoulder Press"], ["calf_raises", "Calf Raises"],
+    ["torso_twist", "Torso Twist"]
 ];
+const labels = Object.fromEntries(exercises);
+
+// Engine telemetry (python main.py --telemetry-port 8765)
+const TELEMETRY_URL = import.meta.env.VITE_TELEMETRY_URL || "ws://127.0.0.1:8765";
+const TELEMETRY_FPS = 30;
+
+// Deltas only carry changed keys; nested objects (counters) are merged the same way
+function merge(state, delta) {
+    const next = { ...state };
+    for (const [key, value] of Object.entries(delta)) {
+        next[key] = value && typeof value === 'object' && !Array.isArray(value)
+            ? merge(state[key] || {}, value)
+            : value;
+    }
+    return next;
+}
+
+function useTelemetry(url) {
+    const [engine, setEngine] = useState(null);
+    const socketRef = useRef(null);
+
+    useEffect(() => {
+        let closed = false;
+        let retry = null;
+
+        const connect = () => {
+            const ws = new WebSocket(url);
+            socketRef.current = ws;
+            ws.onopen = () => ws.send(JSON.stringify({ type: "hello", fps: TELEMETRY_FPS }));
+            ws.onmessage = (event) => {
+                const { type, ...data } = JSON.parse(event.data);
+                if (type === "state") setEngine(data);
+                else if (type === "delta") setEngine(prev => merge(prev || {}, data));
+            };
+            ws.onclose = () => {
+                setEngine(null);
+                if (!closed) retry = setTimeout(connect, 2000);
+            };
+        };
+        connect();
+
+        return () => {
+            closed = true;
+            clearTimeout(retry);
+            socketRef.current && socketRef.current.close();
+        };
+    }, [url]);
+
+    const send = (msg) => {
+        const ws = socketRef.current;
+        if (ws && ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify(msg));
+    };
+    return [engine, send];
+}
 
 function App() {
-    const [currentEx, setCurrentEx] = useState("Squat");
-    const [reps, setReps] = useState(0);
-    const [isCorrect, setIsCorrect] = useState(true);
-    const [depth, setDepth] = useState(0);
+    const [engine, send] = useTelemetry(TELEMETRY_URL);
+    const [selectedEx, setSelectedEx] = useState("squat");
+    const currentEx = engine ? engine.exercise : selectedEx;
+    const reps = engine ? engine.reps : 0;
+    const isCorrect = engine ? engine.form_ok : true;
+    const depth = engine ? Math.round(engine.depth * 100) : 0;
+    const repScore = engine ? engine.rep_score : null;
     const videoRef = useRef(null);
     const canvasRef = useRef(null);
 
@@ -30,16 +88,16 @@ function App() {
             {/* Sidebar */}
             <div className="sidebar">
                 <div className="brand">PHYSIO AI PRO</div>
-                {exercises.map(ex => (
+                {exercises.map(([ex, label]) => (
                     <button
                         key={ex}
                         className={`exercise-btn ${currentEx === ex ? 'active' : ''}`}
                         onClick={() => {
-                            setCurrentEx(ex);
-                            setReps(0);
+                            setSelectedEx(ex);
+                            send({ type: "select", exercise: ex });
                         }}
                     >
-                        {ex}
+                        {label}
                     </button>
                 ))}
             </div>
@@ -50,13 +108,20 @@ function App() {
                 <div className="header-hud">
                     <div>
                         <div style={{ color: '#a0a0a0', fontSize: '0.9rem' }}>CURRENT SESSION</div>
-                        <div style={{ fontSize: '1.4rem', fontWeight: 600 }}>{currentEx}</div>
+                        <div style={{ fontSize: '1.4rem', fontWeight: 600 }}>{labels[currentEx] || currentEx}</div>
                     </div>
 
                     <div className="rep-counter">
                         <div style={{ color: '#a0a0a0', fontSize: '0.9rem' }}>REPS COMPLETED</div>
                         <div className="rep-count">{reps}</div>
                     </div>
+
+                    {repScore != null && (
+                        <div className="rep-counter">
+                            <div style={{ color: '#a0a0a0', fontSize: '0.9rem' }}>LAST REP FORM</div>
+                            <div className="rep-count">{repScore}</div>
+                        </div>
+                    )}
                 </div>
 
                 {/* Video & Coach Console */}
@@ -72,7 +137,7 @@ function App() {
 
                         {!isCorrect && (
                             <div className="status-toast error">
-                                ADJUST FORM
+                                {engine && engine.feedback ? engine.feedback : "ADJUST FORM"}
                             </div>
                         )}
                         {isCorrect && (
@@ -100,7 +165,7 @@ function App() {
 
                 {/* Footer Info */}
                 <div style={{ color: '#666', fontSize: '0.8rem', textAlign: 'center' }}>
-                    ELITE TRACKING MODE ACTIVE • 93%+ ACCURACY GUARANTEED
+                    {engine ? "ENGINE CONNECTED" : "ENGINE OFFLINE"} • ELITE TRACKING MODE ACTIVE • 93%+ ACCURACY GUARANTEED
                 </div>
             </div>
         </div>
@@ -1,8 +1,121 @@
+from collections import OrderedDict
+
 import cv2
 import numpy as np
 
+FONT = cv2.FONT_HERSHEY_DUPLEX
+GAUGE_SIZE = (15, 200)
+# Widgets smaller than this (in pixels) are baked as a single patch, tint included;
+# larger ones keep the tint as an in-place pass and only bake the pixels with detail
+SPLIT_MIN_AREA = 100_000
+
+
+class HudPatch:
+    """
+    A small baked patch of widget detail (text, borders, shapes). Everything drawn there is affine
+    in the pixels underneath, so rendering it once over black ('base') and once over white fully
+    describes it: out = under * keep / 255 + base.
+    """
+    def __init__(self, x, y, base, keep):
+        self.x = x
+        self.y = y
+        self.base = base
+        self.keep = keep
+        self._scratch = np.empty_like(base)
+
+    @property
+    def nbytes(self):
+        return self.base.nbytes * 3
+
+    def composite(self, canvas):
+        h, w = self.base.shape[:2]
+        roi = canvas[self.y:self.y + h, self.x:self.x + w]
+        cv2.multiply(roi, self.keep, dst=self._scratch, scale=1 / 255)
+        cv2.add(self._scratch, self.base, dst=roi)
+
+
+class HudLayer:
+    """
+    A baked widget: glass tints applied in place over their rectangles (one pass, no allocation)
+    followed by the detail patches drawn on top of them.
+    """
+    def __init__(self, tints, patches):
+        self.tints = tints
+        self.patches = patches
+
+    @property
+    def nbytes(self):
+        return sum(p.nbytes for p in self.patches)
+
+    def composite(self, canvas):
+        for x1, y1, x2, y2, alpha, beta in self.tints:
+            roi = canvas[y1:y2, x1:x2]
+            cv2.convertScaleAbs(roi, dst=roi, alpha=alpha, beta=beta)
+        for patch in self.patches:
+            patch.composite(canvas)
+
+
+def _text_bounds(text, org, scale, thickness):
+    (tw, th), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+    x, y = org
+    pad = thickness + 1
+    return (x - pad, y - th - pad, x + tw + pad + 1, y + baseline + pad + 1)
+
+
+def _op_bounds(op):
+    """Rectangles covering every pixel an op touches; a panel border is four thin edge strips."""
+    kind = op[0]
+    if kind == "panel":
+        x1, y1, x2, y2 = op[1]
+        return [(x1 - 2, y1 - 2, x2 + 3, y1 + 3), (x1 - 2, y2 - 2, x2 + 3, y2 + 3),
+                (x1 - 2, y1 + 3, x1 + 3, y2 - 2), (x2 - 2, y1 + 3, x2 + 3, y2 - 2)]
+    if kind == "text":
+        _, text, org, scale, _, thickness, _ = op
+        return [_text_bounds(text, org, scale, thickness)]
+    if kind == "circle":
+        _, (cx, cy), r, _ = op
+        return [(cx - r - 1, cy - r - 1, cx + r + 2, cy + r + 2)]
+    _, (x1, y1), (x2, y2), _ = op
+    return [(min(x1, x2), min(y1, y2), max(x1, x2) + 1, max(y1, y2) + 1)]
+
+
+def _clip(rect, w, h):
+    x1, y1, x2, y2 = rect
+    return (max(x1, 0), max(y1, 0), min(x2, w), min(y2, h))
+
+
+def _merge_rects(rects):
+    """Merges overlapping rectangles so no canvas pixel is composited twice."""
+    rects = [r for r in rects if r[2] > r[0] and r[3] > r[1]]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
 class UIManager:
-    def __init__(self):
+    """
+    Renders the HUD. In retained mode (default) each widget is a small display list that is
+    baked into a HudLayer the first time its value is seen; per frame the HUD only composites
+    the cached layers. Apart from the full-width header band, whose glass tint has to be blended
+    with the live pixels under it every frame, its cost does not depend on the frame resolution.
+    """
+    def __init__(self, retained=True, max_layers=256):
+        self.retained = retained
+        self.max_layers = max_layers
+        self._layers = OrderedDict()
+        self.hits = 0
+        self.misses = 0
         # Premium Color Palette (BGR)
         self.colors = {
             "bg_dark": (30, 30, 30),
@@ -16,13 +129,9 @@ class UIManager:
     def draw_glass_panel(self, frame, rect, opacity=0.4):
         """Draws a semi-transparent 'glass' panel with rounded edges."""
         x1, y1, x2, y2 = rect
-        sub_img = frame[y1:y2, x1:x2]
-        
-        # Create white overlay
-        white_rect = np.ones(sub_img.shape, dtype=np.uint8) * 20
-        res = cv2.addWeighted(sub_img, 1 - opacity, white_rect, opacity, 0)
-        
-        frame[y1:y2, x1:x2] = res
+        sub_img = frame[max(y1, 0):y2, max(x1, 0):x2]
+        # Blend towards a dark tint in place (same rounding as addWeighted with a constant slab)
+        cv2.convertScaleAbs(sub_img, dst=sub_img, alpha=1 - opacity, beta=20 * opacity)
         # Draw sleek border
         cv2.rectangle(frame, (x1, y1), (x2, y2), (200, 200, 200), 1, cv2.LINE_AA)
 
@@ -37,56 +146,184 @@ class UIManager:
 
     def draw_stat_card(self, canvas, label, value, pos, size=(180, 80)):
         """Draws a modern stat card with a label and large value."""
-        x, y = pos
-        w, h = size
-        self.draw_glass_panel(canvas, (x, y, x + w, y + h), opacity=0.3)
-        
-        cv2.putText(canvas, label, (x + 15, y + 25), 
-                    cv2.FONT_HERSHEY_DUPLEX, 0.6, (180, 180, 180), 1, cv2.LINE_AA)
-        cv2.putText(canvas, str(value), (x + 15, y + 65), 
-                    cv2.FONT_HERSHEY_DUPLEX, 1.2, self.colors["text_white"], 2, cv2.LINE_AA)
+        self.draw_ops(canvas, self._stat_card_ops(label, value, pos, size))
 
     def draw_depth_gauge(self, canvas, pos, progress, color=(0, 255, 0)):
         """Draws a vertical depth/range-of-motion gauge."""
+        fill_h = int(GAUGE_SIZE[1] * progress)
+        self.draw_ops(canvas, self._gauge_ops(pos, fill_h, color) + self._gauge_label_ops(pos))
+
+    def _band_ops(self, w_total):
+        return [("panel", (0, 0, w_total, 80), 0.5)]
+
+    def _header_ops(self, w, exercise_name):
+        return self._title_ops() + self._mode_ops(w, exercise_name)
+
+    def _title_ops(self):
+        return [("text", "AI PHYSIO ASSISTANT", (30, 50), 1.2, self.colors["neon_cyan"], 2, cv2.LINE_AA)]
+
+    def _mode_ops(self, w, exercise_name):
+        return [("text", f"MODE: {exercise_name.upper()}", (w - 150, 50), 0.8, (200, 200, 200), 1, cv2.LINE_AA)]
+
+    def _stat_card_ops(self, label, value, pos, size=(180, 80)):
+        x, y = pos
+        w, h = size
+        return [
+            ("panel", (x, y, x + w, y + h), 0.3),
+            ("text", label, (x + 15, y + 25), 0.6, (180, 180, 180), 1, cv2.LINE_AA),
+            ("text", str(value), (x + 15, y + 65), 1.2, self.colors["text_white"], 2, cv2.LINE_AA),
+        ]
+
+    def _status_ops(self, h, is_correct):
+        status_text = "IDEAL FORM" if is_correct else "ADJUST POSE"
+        status_color = self.colors["emerald"] if is_correct else self.colors["warning"]
+        return [
+            ("panel", (30, h - 70, 250, h - 20), 0.4),
+            ("circle", (55, h - 45), 8, status_color),
+            ("text", status_text, (75, h - 38), 0.7, self.colors["text_white"], 1, cv2.LINE_AA),
+        ]
+
+    def _gauge_ops(self, pos, fill_h, color):
         x, y = pos
-        w, h = 15, 200
-        # Background
-        cv2.rectangle(canvas, (x, y), (x + w, y + h), (50, 50, 50), -1)
-        # Fill
-        fill_h = int(h * progress)
-        cv2.rectangle(canvas, (x, y + h - fill_h), (x + w, y + h), color, -1)
-        # Label
-        cv2.putText(canvas, "DEPTH", (x - 10, y + h + 20), 
-                    cv2.FONT_HERSHEY_DUPLEX, 0.5, (200, 200, 200), 1)
+        w, h = GAUGE_SIZE
+        return [
+            ("rect", (x, y), (x + w, y + h), (50, 50, 50)),
+            ("rect", (x, y + h - fill_h), (x + w, y + h), color),
+        ]
+
+    def _gauge_label_ops(self, pos):
+        x, y = pos
+        return [("text", "DEPTH", (x - 10, y + GAUGE_SIZE[1] + 20), 0.5, (200, 200, 200), 1, cv2.LINE_8)]
+
+    def draw_ops(self, img, ops, origin=(0, 0), tint=True):
+        """
+        Executes a widget display list; 'origin' is the canvas position of img's top-left pixel.
+        With tint=False glass panels only draw their border (the tint is applied separately).
+        """
+        ox, oy = origin
+        for op in ops:
+            kind = op[0]
+            if kind == "panel":
+                x1, y1, x2, y2 = op[1]
+                if tint:
+                    self.draw_glass_panel(img, (x1 - ox, y1 - oy, x2 - ox, y2 - oy), opacity=op[2])
+                else:
+                    cv2.rectangle(img, (x1 - ox, y1 - oy), (x2 - ox, y2 - oy), (200, 200, 200), 1, cv2.LINE_AA)
+            elif kind == "text":
+                _, text, (x, y), scale, color, thickness, line_type = op
+                cv2.putText(img, text, (x - ox, y - oy), FONT, scale, color, thickness, line_type)
+            elif kind == "circle":
+                _, (cx, cy), r, color = op
+                cv2.circle(img, (cx - ox, cy - oy), r, color, -1)
+            else:
+                _, (x1, y1), (x2, y2), color = op
+                cv2.rectangle(img, (x1 - ox, y1 - oy), (x2 - ox, y2 - oy), color, -1)
+
+    def _bake_patch(self, ops, rect, tint):
+        x1, y1, x2, y2 = rect
+        black = np.zeros((y2 - y1, x2 - x1, 3), dtype=np.uint8)
+        white = np.full_like(black, 255)
+        self.draw_ops(black, ops, (x1, y1), tint=tint)
+        self.draw_ops(white, ops, (x1, y1), tint=tint)
+        return HudPatch(x1, y1, black, cv2.subtract(white, black))
+
+    def bake_layer(self, ops, canvas_shape):
+        """
+        Turns a display list into a HudLayer. Small widgets become one patch. For large ones glass
+        tints become in-place scale/offset passes, and borders, text and shapes (which all come
+        after their panel in the list) are baked into patches covering only the pixels they touch.
+        """
+        h, w = canvas_shape[:2]
+        detail = [_clip(r, w, h) for op in ops for r in _op_bounds(op)]
+        panels = [_clip(op[1], w, h) for op in ops if op[0] == "panel"]
+        rects = [r for r in detail + panels if r[2] > r[0] and r[3] > r[1]]
+        if not rects:
+            return HudLayer([], [])
+        bx, by = min(r[0] for r in rects), min(r[1] for r in rects)
+        bw, bh = max(r[2] for r in rects) - bx, max(r[3] for r in rects) - by
+        if bw * bh < SPLIT_MIN_AREA:
+            return HudLayer([], [self._bake_patch(ops, (bx, by, bx + bw, by + bh), tint=True)])
+
+        opacities = [op[2] for op in ops if op[0] == "panel"]
+        tints = [(x1, y1, x2, y2, 1 - o, 20 * o) for (x1, y1, x2, y2), o in zip(panels, opacities)
+                 if x2 > x1 and y2 > y1]
+        # Render the detail once over the whole widget and cut the patches out of it, so clipping
+        # a patch never changes how a line end is anti-aliased
+        full = self._bake_patch(ops, (bx, by, bx + bw, by + bh), tint=False)
+        patches = []
+        for x1, y1, x2, y2 in _merge_rects(detail):
+            crop = (slice(y1 - by, y2 - by), slice(x1 - bx, x2 - bx))
+            patches.append(HudPatch(x1, y1, full.base[crop].copy(), full.keep[crop].copy()))
+        return HudLayer(tints, patches)
+
+    def _widgets(self, h, w_total, exercise_name, rep_count, is_correct, depth_val):
+        """(name, value key, display list builder) for every HUD widget, in draw order."""
+        w = w_total // 2
+        status_color = self.colors["emerald"] if is_correct else self.colors["warning"]
+        gauge_pos = (w - 7, h // 2 - 100)
+        fill_h = int(GAUGE_SIZE[1] * depth_val)
+        return [
+            # The band is its own layer: baked once per canvas size, and only its tint pass (which
+            # grows with the canvas width) runs per frame. The header texts sit at opposite ends of
+            # the band, so each gets a small layer of its own rather than one canvas-wide patch.
+            ("band", None, lambda: self._band_ops(w_total)),
+            ("title", None, self._title_ops),
+            ("mode", exercise_name, lambda: self._mode_ops(w, exercise_name)),
+            ("reps", rep_count, lambda: self._stat_card_ops("REPS", rep_count, (w_total - 210, 10))),
+            ("status", is_correct, lambda: self._status_ops(h, is_correct)),
+            ("gauge", (fill_h, status_color), lambda: self._gauge_ops(gauge_pos, fill_h, status_color)),
+            ("gauge_label", None, lambda: self._gauge_label_ops(gauge_pos)),
+        ]
+
+    def _get_layer(self, name, value, build_ops, canvas_shape):
+        key = (name, canvas_shape, value)
+        if key in self._layers:
+            self.hits += 1
+            self._layers.move_to_end(key)
+            return self._layers[key]
+        self.misses += 1
+        layer = self.bake_layer(build_ops(), canvas_shape)
+        self._layers[key] = layer
+        if len(self._layers) > self.max_layers:
+            self._layers.popitem(last=False)
+        return layer
 
     def render_hud(self, canvas, exercise_name, rep_count, is_correct, depth_val):
         h, w_total, _ = canvas.shape
-        w = w_total // 2
+        widgets = self._widgets(h, w_total, exercise_name, rep_count, is_correct, depth_val)
 
-        # 1. Header Bar
-        self.draw_glass_panel(canvas, (0, 0, w_total, 80), opacity=0.5)
-        cv2.putText(canvas, "AI PHYSIO ASSISTANT", (30, 50), 
-                    cv2.FONT_HERSHEY_DUPLEX, 1.2, self.colors["neon_cyan"], 2, cv2.LINE_AA)
-        
-        # 2. Exercise Info & Reps
-        cv2.putText(canvas, f"MODE: {exercise_name.upper()}", (w - 150, 50), 
-                    cv2.FONT_HERSHEY_DUPLEX, 0.8, (200, 200, 200), 1, cv2.LINE_AA)
-        
-        # 3. Floating Rep Counter (Large)
-        rep_color = self.colors["emerald"] if is_correct else self.colors["warning"]
-        self.draw_stat_card(canvas, "REPS", rep_count, (w_total - 210, 10))
-
-        # 4. Status Indicator (Bottom Left)
-        status_text = "IDEAL FORM" if is_correct else "ADJUST POSE"
-        status_color = self.colors["emerald"] if is_correct else self.colors["warning"]
-        self.draw_glass_panel(canvas, (30, h - 70, 250, h - 20), opacity=0.4)
-        cv2.circle(canvas, (55, h - 45), 8, status_color, -1)
-        cv2.putText(canvas, status_text, (75, h - 38), 
-                    cv2.FONT_HERSHEY_DUPLEX, 0.7, self.colors["text_white"], 1, cv2.LINE_AA)
+        if not self.retained:
+            for _, _, build_ops in widgets:
+                self.draw_ops(canvas, build_ops())
+            return canvas
 
-        # 5. Depth Gauge (On the line between frames)
-        self.draw_depth_gauge(canvas, (w - 7, h // 2 - 100), depth_val, color=status_color)
+        for name, value, build_ops in widgets:
+            self._get_layer(name, value, build_ops, canvas.shape).composite(canvas)
+        return canvas
 
+    def render_loading(self, canvas, status, elapsed):
+        """
+        HUD shown on the live camera while the pose engine loads: header, elapsed startup time and
+        the loader's current stage over the (empty) coach panel. Drawn immediate-mode; it only
+        lasts a few seconds.
+        """
+        h, w_total = canvas.shape[:2]
+        w = w_total // 2
+        dots = "." * (1 + int(elapsed * 3) % 3)
+        self.draw_ops(canvas, self._band_ops(w_total) + self._header_ops(w, "loading") +
+                      self._stat_card_ops("STARTING", f"{elapsed:.1f}s", (w_total - 210, 10)) + [
+            ("text", f"{status.upper()}{dots}", (w + 40, h // 2), 0.9, self.colors["neon_cyan"], 2, cv2.LINE_AA),
+            ("text", "Step into view - tracking starts in a moment", (w + 40, h // 2 + 40), 0.6,
+             (200, 200, 200), 1, cv2.LINE_AA),
+        ])
         return canvas
 
+    def stats(self):
+        return {
+            "layers": len(self._layers),
+            "bytes": sum(layer.nbytes for layer in self._layers.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
 ui = UIManager()
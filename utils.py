@@ -15,37 +15,78 @@ def alpha_blend(frame, overlay, alpha=0.5):
     """
     return cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0)
 
+# MediaPipe POSE_CONNECTIONS indices
+POSE_CONNECTIONS = [
+    (11, 12), (11, 13), (13, 15), (12, 14), (14, 16), # Upper Body
+    (11, 23), (12, 24), (23, 24), # Torso
+    (23, 25), (25, 27), (24, 26), (26, 28), # Legs
+    (15, 17), (17, 19), (19, 15), (16, 18), (18, 20), (20, 16), # Hands
+    (27, 29), (29, 31), (31, 27), (28, 30), (30, 32), (32, 28)  # Feet
+]
+
+def landmarks_to_pixels(landmarks, shape, offset=(0, 0)):
+    """
+    Converts normalized landmarks (N, >=2) to int32 pixel coordinates (N, 2) in one vectorized step.
+    Truncates like int(x * w) did.
+    """
+    h, w = shape[:2]
+    pts = np.asarray(landmarks)[:, :2] * (w, h)
+    pts = pts.astype(np.int32)
+    pts += np.asarray(offset, dtype=np.int32)
+    return pts
+
+def draw_segments(frame, pts, connections, color, thickness=2, joint_radius=0, skip_origin=None):
+    """
+    Draws every connection with a single cv2.polylines call, plus (optionally) filled joint dots
+    of 'joint_radius' at the segment ends with a second call (zero-length segments of thickness 2r
+    rasterize exactly like cv2.circle(..., r, -1)).
+    skip_origin: optional (N,) bool mask of points to treat as missing (their segments are skipped).
+    """
+    conn = np.asarray(connections, dtype=np.intp)
+    segs = pts[conn]
+    if skip_origin is not None:
+        segs = segs[~(skip_origin[conn[:, 0]] | skip_origin[conn[:, 1]])]
+    if len(segs) == 0:
+        return frame
+    segs = np.ascontiguousarray(segs, dtype=np.int32)
+    cv2.polylines(frame, segs, False, color, thickness)
+    if joint_radius > 0:
+        dots = np.repeat(segs.reshape(-1, 1, 2), 2, axis=1)
+        cv2.polylines(frame, dots, False, color, 2 * joint_radius)
+    return frame
+
+def draw_points(frame, pts, color, radius=3):
+    """
+    Draws filled dots at every point with one cv2.polylines call.
+    """
+    dots = np.repeat(np.ascontiguousarray(pts, dtype=np.int32).reshape(-1, 1, 2), 2, axis=1)
+    cv2.polylines(frame, dots, False, color, 2 * radius)
+    return frame
+
+def blend_roi(frame, pts, pad, draw_fn, alpha, bbox_mask=None):
+    """
+    Alpha-blends a drawing into 'frame' only inside the bounding box of 'pts' (+ pad pixels).
+    draw_fn(overlay, pts_in_roi) draws onto a copy of the region; cost is independent of frame size.
+    bbox_mask optionally restricts which points define the box (e.g. only the ones actually drawn).
+    """
+    h, w = frame.shape[:2]
+    box = pts if bbox_mask is None else pts[bbox_mask]
+    x0, y0 = np.maximum(box.min(axis=0) - pad, 0)
+    x1, y1 = np.minimum(box.max(axis=0) + pad + 1, (w, h))
+    if x0 >= x1 or y0 >= y1:
+        return frame
+    roi = frame[y0:y1, x0:x1]
+    overlay = roi.copy()
+    draw_fn(overlay, pts - (x0, y0))
+    cv2.addWeighted(overlay, alpha, roi, 1 - alpha, 0, roi)
+    return frame
+
 def draw_skeleton(frame, landmarks, connections, color=(255, 255, 255), thickness=2, offset=(0, 0)):
     """
     Manually draws a skeleton on a frame using normalized landmarks.
     """
-    h, w, _ = frame.shape
-    
-    # Scale and Shift context mapping if needed
-    for connection in connections:
-        start_idx = connection[0]
-        end_idx = connection[1]
-        
-        # Get coordinates
-        p1 = landmarks[start_idx]
-        p2 = landmarks[end_idx]
-        
-        # Map to pixel coordinates
-        x1, y1 = int(p1[0] * w), int(p1[1] * h)
-        x2, y2 = int(p2[0] * w), int(p2[1] * h)
-        
-        # Skip if either point is at (0,0) - prevents lines stretching to corner
-        if (x1 == 0 and y1 == 0) or (x2 == 0 and y2 == 0):
-            continue
-            
-        # Apply offset and draw
-        x1 += offset[0]
-        y1 += offset[1]
-        x2 += offset[0]
-        y2 += offset[1]
-        
-        cv2.line(frame, (x1, y1), (x2, y2), color, thickness)
-        cv2.circle(frame, (x1, y1), thickness + 1, color, -1)
-        cv2.circle(frame, (x2, y2), thickness + 1, color, -1)
-    
-    return frame
+    pts = landmarks_to_pixels(landmarks, frame.shape)
+    # Skip points mapped to (0,0) - prevents lines stretching to corner
+    at_origin = (pts == 0).all(axis=1)
+    pts += np.asarray(offset, dtype=np.int32)
+    return draw_segments(frame, pts, connections, color, thickness, joint_radius=thickness + 1, skip_origin=at_origin)